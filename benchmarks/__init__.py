@@ -0,0 +1,3 @@
+"""
+Benchmarks for mgit. Run them with `bin/bench`.
+"""
@@ -0,0 +1,101 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeTracker:
+    def __init__(self, latency: float = 0.0):
+        """
+        Local stand-in for the issue tracker API.
+
+        `GET /issues/<id>` returns `{"title": ...}` after waiting `latency`
+        seconds. Responses carry an ETag and conditional requests get a 304.
+
+        The pull request endpoints of the GitHub API are served under
+        `api_url`: `POST /repos/<owner>/<repo>/pulls` creates a pull request and
+        `PATCH /repos/<owner>/<repo>/issues/<number>` accepts its labels.
+
+        >>> with FakeTracker(latency=0.05) as tracker:
+        ...     tracker.url
+        http://127.0.0.1:54321/issues
+
+        :param latency: Seconds to wait before each response.
+        """
+        self.latency = latency
+        self.requests = 0
+        self.pulls = 0
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"{self.api_url}/issues"
+
+    @property
+    def api_url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        tracker = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                tracker.requests += 1
+                time.sleep(tracker.latency)
+
+                issue_id = self.path.rstrip("/").rsplit("/", 1)[-1]
+                etag = f'"{issue_id}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+
+                self._send_json(200, {"title": f"benchmark issue {issue_id}"}, etag)
+
+            def do_POST(self):
+                tracker.requests += 1
+                time.sleep(tracker.latency)
+                self._read_body()
+
+                if not self.path.endswith("/pulls"):
+                    self._send_json(404, {"message": "Not Found"})
+                    return
+                tracker.pulls += 1
+                number = tracker.pulls
+                url = f"{tracker.api_url}/pull/{number}"
+                self._send_json(201, {"number": number, "html_url": url})
+
+            def do_PATCH(self):
+                tracker.requests += 1
+                time.sleep(tracker.latency)
+                self._send_json(200, self._read_body())
+
+            def _read_body(self) -> dict:
+                length = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            def _send_json(self, status: int, data: dict, etag: str = ""):
+                body = json.dumps(data).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                if etag:
+                    self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
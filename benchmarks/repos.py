@@ -0,0 +1,96 @@
+import json
+import os
+import subprocess
+
+# Repo sizes to benchmark against.
+SIZES = {
+    "small": {"branches": 10, "depth": 10, "files": 10, "packed": False},
+    "medium": {"branches": 1000, "depth": 500, "files": 10000, "packed": True},
+    "large": {"branches": 20000, "depth": 5000, "files": 200000, "packed": True},
+}
+COMMITTER = "mgit bench <bench@example.com> 1700000000 +0000"
+# URL of the `origin` remote, so mgit finds a GitHub repo to open pull requests
+# in. Git rewrites it to the local bare repo.
+REMOTE_URL = "https://github.com/mgit-bench/repo.git"
+
+
+def make_repo(
+    path: str,
+    tracker_url: str,
+    branches: int = 10,
+    depth: int = 10,
+    files: int = 10,
+    packed=False,
+) -> str:
+    """
+    Create a throwaway Git repo with a bare `origin` remote and an mgit.json.
+    The remote's URL looks like a GitHub repo, see `REMOTE_URL`.
+
+    History and branches are written with `git fast-import` so large repos are
+    created in seconds.
+
+    :param path: Directory where the repo and its remote are created.
+    :param tracker_url: Issue tracker API URL written to mgit.json.
+    :param branches: Number of issue branches to create.
+    :param depth: Number of commits on the master branch.
+    :param files: Number of files in the working tree, besides README.md.
+    :param packed: Pack the refs into `packed-refs` instead of loose files.
+    :return: The path of the working repo.
+    """
+    repo = os.path.join(path, "repo")
+    origin = os.path.join(path, "origin.git")
+    os.makedirs(repo)
+
+    _git(repo, "init", "-q")
+    _git(repo, "symbolic-ref", "HEAD", "refs/heads/master")
+    _git(repo, "config", "user.name", "mgit bench")
+    _git(repo, "config", "user.email", "bench@example.com")
+    subprocess.run(
+        ["git", "fast-import", "--quiet"],
+        cwd=repo,
+        input=_fast_import_stream(branches, depth, files),
+        check=True,
+    )
+    _git(repo, "reset", "-q", "--hard", "master")
+    if packed:
+        _git(repo, "pack-refs", "--all")
+
+    subprocess.run(["git", "clone", "-q", "--bare", repo, origin], check=True)
+    _git(repo, "remote", "add", "origin", REMOTE_URL)
+    _git(repo, "config", f"url.{origin}.insteadOf", REMOTE_URL)
+    _git(repo, "fetch", "-q", "origin")
+    _git(repo, "branch", "-q", "--set-upstream-to", "origin/master", "master")
+
+    with open(os.path.join(repo, "mgit.json"), "w") as outfile:
+        json.dump({"issue_tracker_api": tracker_url}, outfile)
+    with open(os.path.join(repo, ".git", "info", "exclude"), "a") as outfile:
+        outfile.write("mgit.json\n")
+
+    return repo
+
+
+def _fast_import_stream(branches: int, depth: int, files: int) -> bytes:
+    # The files are added by the first commit, 1000 per directory.
+    blobs = "".join(
+        f"M 644 inline src/{index // 1000}/{index}.txt\ndata 6\nfile {index % 10}\n"
+        for index in range(files)
+    )
+    commands = []
+    for index in range(1, depth + 1):
+        message = f"Commit {index}"
+        content = f"Revision {index}\n"
+        commands.append(
+            f"commit refs/heads/master\nmark :{index}\n"
+            f"committer {COMMITTER}\ndata {len(message)}\n{message}\n"
+            + (f"from :{index - 1}\n" if index > 1 else "")
+            + f"M 644 inline README.md\ndata {len(content)}\n{content}\n"
+            + (blobs if index == 1 else "")
+        )
+    for index in range(1, branches + 1):
+        branch = f"refs/heads/jir-{index}-benchmark-branch"
+        commands.append(f"reset {branch}\nfrom :{depth}\n")
+    return "".join(commands).encode("utf-8")
+
+
+def _git(repo: str, *args):
+    subprocess.run(["git"] + list(args), cwd=repo, check=True)
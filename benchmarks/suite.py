@@ -0,0 +1,227 @@
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+from benchmarks import repos
+from benchmarks.fake_tracker import FakeTracker
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASE_BRANCH = "master"
+WORK_BRANCH = "jir-1-benchmark-branch"
+NEW_BRANCH = "jir-0-benchmark-issue-jir-0"
+
+
+def run(sizes: list, repeat: int = 5, latency: float = 0.05) -> dict:
+    """
+    Run every benchmark and return the results as a JSON serializable dict.
+
+    :param sizes: Names of the repo sizes in `repos.SIZES`.
+    :param repeat: Number of samples taken for each benchmark.
+    :param latency: Seconds the fake issue tracker waits before responding.
+    """
+    results = micro_benchmarks(repeat)
+    failures = []
+    with FakeTracker(latency) as tracker, tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            path = os.path.join(directory, size)
+            repo = repos.make_repo(path, tracker.url, **repos.SIZES[size])
+            results += cli_benchmarks(repo, size, repeat, tracker.api_url, failures)
+
+    return {
+        "commit": _mgit_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "latency": latency,
+        "results": results,
+        "failures": failures,
+    }
+
+
+def micro_benchmarks(repeat: int) -> list:
+    """ Time the hot functions of mgit in this process. """
+    sys.path.insert(0, ROOT)
+    from mgit import configs
+    from mgit import issues
+
+    results = []
+    number = 10000
+    cases = {
+        "issues.from_branch": lambda: issues.from_branch(
+            "jir-123-update-the-readme-file"
+        ),
+        "Issue.branch_name": lambda: issues.Issue(
+            "JIR-123", "update the readme file"
+        ).branch_name,
+    }
+    for name, function in cases.items():
+        samples = timeit.Timer(function).repeat(repeat, number)
+        results.append(_result(name, [sample / number for sample in samples]))
+
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, configs.FILENAME), "w") as outfile:
+            json.dump({"issue_tracker_api": "https://example.com/issues"}, outfile)
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            samples = timeit.Timer(configs.settings).repeat(
+                repeat, number // 10
+            )
+        finally:
+            os.chdir(cwd)
+        samples = [sample / (number // 10) for sample in samples]
+        results.append(_result("configs.settings", samples))
+
+    return results
+
+
+def cli_benchmarks(
+    repo: str, size: str, repeat: int, api_url: str, failures: list
+) -> list:
+    """
+    Time mgit commands end-to-end in a repo, excluding setup steps.
+
+    Every command is timed twice: run by `mgit.cli` in a new process, then
+    forwarded by `mgit.client` to a running daemon. Pull requests are created
+    with the GitHub API of the fake tracker.
+
+    :param api_url: GitHub API URL of the fake tracker.
+    :param failures: List the failed commands are added to. Their samples are
+        left out of the results.
+    """
+    cache_dir = os.path.join(os.path.dirname(repo), "cache")
+    env = dict(
+        os.environ,
+        PYTHONPATH=ROOT,
+        MGIT_CACHE_DIR=cache_dir,
+        MGIT_DAEMON_SOCKET=os.path.join(os.path.dirname(repo), "mgit-daemon.sock"),
+        MGIT_GITHUB_API=api_url,
+        MGIT_GITHUB_API_TOKEN="benchmark",
+        BROWSER="true",
+        GIT_EDITOR="true",
+    )
+    entry_points = {
+        "cli": [sys.executable, "-m", "mgit.cli"],
+        "daemon": [sys.executable, "-c", "from mgit.client import main; main()"],
+    }
+
+    def mgit(entry_point, *args):
+        return subprocess.run(
+            entry_points[entry_point] + list(args),
+            cwd=repo,
+            env=env if entry_point == "daemon" else dict(env, MGIT_NO_DAEMON="1"),
+            input=b"y\ny\n",
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+
+    def git(*args):
+        subprocess.run(
+            ["git"] + list(args),
+            cwd=repo,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def reset_new_branch():
+        git("checkout", "-q", BASE_BRANCH)
+        git("branch", "-q", "-D", NEW_BRANCH)
+
+    def clear_cache():
+        reset_new_branch()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    def change_file():
+        git("checkout", "-q", WORK_BRANCH)
+        with open(os.path.join(repo, "benchmark.txt"), "a") as outfile:
+            outfile.write("change\n")
+
+    cases = [
+        ("branch (cold cache)", clear_cache, ["branch", "JIR-0"]),
+        ("branch (warm cache)", reset_new_branch, ["branch", "JIR-0"]),
+        ("commit", change_file, ["commit"]),
+        ("open", lambda: git("checkout", "-q", WORK_BRANCH), ["open"]),
+        ("pr", change_file, ["pr", "--label", "benchmark"]),
+    ]
+
+    results = []
+    for entry_point in entry_points:
+        if entry_point == "daemon":
+            mgit("daemon", "daemon", "start").check_returncode()
+        try:
+            for name, setup, args in cases:
+                name = f"{entry_point}.{name}[{size}]"
+                samples = []
+                for _ in range(repeat):
+                    setup()
+                    start = time.perf_counter()
+                    process = mgit(entry_point, *args)
+                    samples.append(time.perf_counter() - start)
+                    if process.returncode:
+                        failures.append(_failure(name, process))
+                        break
+                else:
+                    results.append(_result(name, samples))
+        finally:
+            if entry_point == "daemon":
+                mgit("daemon", "daemon", "stop")
+    return results
+
+
+def compare(old: dict, new: dict) -> str:
+    """ Format a table comparing the median of each benchmark in two runs. """
+    old_results = {result["name"]: result for result in old["results"]}
+    lines = [f"{'Benchmark':<40} {'Old':>10} {'New':>10} {'Change':>8}"]
+    for result in new["results"]:
+        previous = old_results.get(result["name"])
+        if not previous:
+            continue
+        change = (result["median"] - previous["median"]) / previous["median"]
+        lines.append(
+            f"{result['name']:<40} {_format_seconds(previous['median']):>10} "
+            f"{_format_seconds(result['median']):>10} {change:>+8.1%}"
+        )
+    return "\n".join(lines)
+
+
+# Helpers
+
+
+def _result(name: str, samples: list) -> dict:
+    return {
+        "name": name,
+        "samples": samples,
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.mean(samples),
+    }
+
+
+def _failure(name: str, process) -> dict:
+    output = str(process.stdout, "utf-8", "replace")
+    print(f"{name} failed with exit code {process.returncode}", file=sys.stderr)
+    return {"name": name, "returncode": process.returncode, "output": output}
+
+
+def _format_seconds(seconds: float) -> str:
+    if seconds < 0.001:
+        return f"{seconds * 1_000_000:.1f}us"
+    if seconds < 1:
+        return f"{seconds * 1000:.1f}ms"
+    return f"{seconds:.2f}s"
+
+
+def _mgit_commit() -> str:
+    try:
+        output = subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL
+        )
+        return str(output, "utf-8").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
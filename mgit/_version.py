@@ -1,3 +1,19 @@
-from setuptools_scm import get_version
+"""
+Resolve the version of mgit without shelling out to Git.
 
-__version__ = get_version()
+The version is written to `mgit/version.py` by setuptools_scm at build time.
+Source checkouts that were never built fall back to the installed package
+metadata.
+"""
+try:
+    from mgit.version import version as __version__
+except ImportError:
+    try:
+        from importlib.metadata import version, PackageNotFoundError
+    except ImportError:  # Python < 3.8
+        __version__ = "unknown"
+    else:
+        try:
+            __version__ = version("mgit")
+        except PackageNotFoundError:
+            __version__ = "unknown"
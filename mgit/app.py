@@ -1,17 +1,19 @@
 import click  # https://click.palletsprojects.com/en/7.x/
+import os
 import subprocess
 import sys
-import requests
-import json
-import os
-import shlex
-import shutil
-import webbrowser
 
+from mgit import cache
+from mgit import complete
 from mgit import git
 from mgit import configs
+from mgit import github
 from mgit import translator
 from mgit import issues
+from mgit import outbox
+from mgit import pipeline
+from mgit import repos
+from mgit import trackers
 
 
 class App:
@@ -19,59 +21,149 @@ class App:
         self,
         log_file,
         verbose: bool,
-        config=configs.Config(),
+        config=None,
         translator=translator.Translator(),
+        issue_cache=None,
+        repo_paths=None,
+        repo_jobs: int = repos.DEFAULT_JOBS,
     ):
         """
         Initialize the app by validating the environment.
 
         :param log_file: The file where log output is sent.
         :param verbose: Determine if additional info should be logged.
-        :param config: mgit configuration object.
+        :param config: `configs.Settings` object. Resolved from the config files
+            and environment variables by default.
         :param translator: Translator object.
+        :param issue_cache: Issue cache object. Created from the config when needed.
+        :param repo_paths: Run `branch`, `commit` and `pr` in each of these repos
+            instead of the current directory.
+        :param repo_jobs: Maximum number of repos worked on at the same time.
         """
         self._log_file = log_file
         self._verbose = verbose
         self._config = config
         self._translator = translator
+        self._issue_cache = issue_cache
+        self._repo_paths = list(repo_paths or [])
+        self._repo_jobs = repo_jobs
+
+        # Gather a fresh snapshot of the repo for this invocation.
+        git.invalidate()
 
         # Validate there is a .git folder
-        if not git.initialized():
+        if not self._repo_paths and not git.initialized():
             self.abort(self._translator.invalid_git_directory())
 
         # Prompt the user for config values if the project mgit.json file does not exist.
-        if not configs.loaded():
+        if not config and not self._repo_paths and not configs.loaded():
             self._config_init()
 
-    def branch(self, issue_id: str, base_branch: str):
+        if not self._config:
+            try:
+                self._config = configs.settings()
+                if self._repo_paths and not self._config.issue_tracker_api:
+                    # Run from outside of the repos, so use the first repo's config.
+                    with repos.inside(self._repo_paths[0]):
+                        self._config = configs.settings()
+            except configs.ConfigError as e:
+                self.abort(e)
+
+    @property
+    def repo_paths(self) -> list:
+        """ Get the repos worked on in multi-repo mode, or an empty list. """
+        return self._repo_paths
+
+    def branch(self, issue_id: str, base_branch: str, switch: bool = True):
         """ Create a branch using issue ID and title. """
         # TODO: Validate Inputs
         #   - username present in os.getenv("MGIT_GITHUB_USERNAME") or similar
         #   - token present in os.getenv("MGIT_GITHUB_API_TOKEN") or similar
 
+        import requests
+
+        if self._repo_paths:
+            return self._branch_repos(issue_id, base_branch, switch)
+
         if not base_branch:
             base_branch = git.default_base_branch()
 
         try:
-            new_branch = issues.from_tracker(issue_id, self._config).branch_name
-        except (requests.exceptions.HTTPError, requests.exceptions.Timeout) as e:
+            new_branch = issues.from_tracker(
+                issue_id, self._config, self.issue_cache
+            ).branch_name
+        except (
+            requests.exceptions.HTTPError,
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+            trackers.IssueNotFound,
+        ) as e:
             self.abort(e)
 
         # TODO: Write a test for when the user says no.
+        self.log_tracker_stats()
         self.echo(self._translator.create_branch_warning(base_branch, new_branch))
         self.confirm(abort=True)
-        git.create_branch(base_branch, new_branch)
+        timings = git.create_branch(base_branch, new_branch, switch=switch)
+        self.log(self._translator.step_timings(timings))
+
+    def branch_many(self, issue_ids: list, base_branch: str, jobs: int):
+        """ Create a branch for each issue ID without checking them out. """
+        if not base_branch:
+            base_branch = git.default_base_branch()
+
+        results = issues.from_tracker_many(
+            issue_ids, self._config, self.issue_cache, jobs
+        )
+        new_branches = {
+            issue_id: result.branch_name
+            for issue_id, result in results.items()
+            if isinstance(result, issues.Issue)
+        }
+
+        if new_branches:
+            self.echo(
+                self._translator.create_branches_warning(
+                    base_branch, list(new_branches.values())
+                )
+            )
+            self.confirm(abort=True)
+            if git.fetch_base_branch(base_branch) == base_branch:
+                self.echo(self._translator.base_branch_not_fetched(base_branch))
+            created = git.create_branches(
+                base_branch, list(new_branches.values()), update=False
+            )
+        else:
+            created = {}
+        self.log_tracker_stats()
+
+        rows = []
+        for issue_id, result in results.items():
+            if issue_id in new_branches:
+                branch = new_branches[issue_id]
+                rows.append((issue_id, branch, created[branch], ""))
+            else:
+                rows.append((issue_id, "", False, str(result)))
+
+        self.echo(self._translator.branch_results(rows))
+        if not all(row[2] for row in rows):
+            sys.exit(1)
 
     def commit(self, message: str, issue_id: str):
         """ Create a commit and push to GitHub. """
+        import requests
+
+        if self._repo_paths:
+            return self._commit_repos(message, issue_id)
+
         if not message:
             try:
                 if issue_id:
-                    issue = issues.from_tracker(issue_id)
-                else:
-                    issue = issues.from_branch(
-                        git.current_branch(), config=self._config
+                    issue = issues.from_tracker(
+                        issue_id, self._config, self.issue_cache
                     )
+                else:
+                    issue = self._issue_from_branch()
 
                 message = str(issue)
                 if self._config.issue_tracker_is_github:
@@ -79,7 +171,12 @@ class App:
                     # message += self._translator.closes_issue_id(issue.id)
                     pass
 
-            except (requests.exceptions.HTTPError, requests.exceptions.Timeout) as e:
+            except (
+                requests.exceptions.HTTPError,
+                requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout,
+                trackers.IssueNotFound,
+            ) as e:
                 self.abort(e)
 
             except ValueError:
@@ -87,67 +184,462 @@ class App:
                     self._translator.branch_has_no_issue_id(git.current_branch())
                 )
 
+            self.log_tracker_stats()
+
         # TODO: Write a test for when the user says no.
-        self.echo(self._translator.commit_warning(message))
+        changes = git.status()
+        self.echo(self._translator.commit_warning(message, changes))
         self.confirm(abort=True)
-        git.commit_all(message)
-        git.push(git.current_branch())
+        git.commit_all(message, changes)
+        self.log(self._translator.push_summary(git.push(git.current_branch())))
+        self._queue_commit_updates(issue_id)
 
     def open(self):
         """ Open an issue in the user's default browser. """
         issue = issues.from_branch(git.current_branch(), config=self._config)
-        webbrowser.open(issue.url)
+        self._open_url(issue.url)
 
-    def pr(self, base_branch: str):
-        """ Create a GitHub Pull Request for the specified branch. """
-        if not git.hub_installed():
-            self.abort(translator.MESSAGES["hub_cli_missing"])
+    def pr(
+        self,
+        base_branch: str,
+        labels=(),
+        interactive: bool = False,
+        update_refs: bool = False,
+    ):
+        """
+        Create a GitHub Pull Request for the specified branch.
 
-        if not base_branch:
-            base_branch = git.default_base_branch()
+        The GitHub API is used when a token is set, `hub` otherwise.
+
+        :param interactive: Edit the commits when rebasing.
+        :param update_refs: Move stacked branches along when rebasing.
+        """
+        import requests
+
+        if self._repo_paths:
+            return self._pr_repos(base_branch, labels, update_refs)
 
-        # Create title and message from current branch info.
         try:
-            issue = issues.from_branch(git.current_branch())
-            title = message = issue.title
-            if self._config.issue_tracker_is_github:
-                message += f"\n\nCloses #{issue.id}"
-        except ValueError:
-            self.abort(self._translator.branch_has_no_issue_id(git.current_branch()))
+            plan = self._pull_request_plan(base_branch)
+        except repos.RepoError as e:
+            self.abort(e)
 
-        # Prompt user to commit all changes.
+        # Ask every question before any work starts so the steps can overlap.
         # TODO: Write a test for when the user says no.
-        self.echo(self._translator.pull_request_warning(message, base_branch, title))
+        self.echo(
+            self._translator.pull_request_warning(
+                plan["message"], plan["base_branch"], plan["title"]
+            )
+        )
         self.confirm(abort=True)
-        git.commit_all(message)
-
-        # Prompt user to update the current branch.
-        # TODO: Write a test for when the user says no.
-        self.echo(self._translator.update_base_branch_confirmation(base_branch))
-        if self.confirm():
-            git.rebase(base_branch)
-            git.push(git.current_branch())
+        self.echo(self._translator.update_base_branch_confirmation(plan["base_branch"]))
+        update_base_branch = self.confirm()
 
-        # Make the pull request and push the changes to the remote branch.
         try:
-            body = self._translator.pull_request_body(
-                title, self._config.issue_tracker, issue.id, issue.url
+            url = self._create_pull_request(
+                plan, labels, update_base_branch, interactive, update_refs
             )
-            git.push()
-            git.pull_request(base_branch, body)
+        except (
+            subprocess.CalledProcessError,
+            requests.exceptions.HTTPError,
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+            trackers.IssueNotFound,
+            repos.RepoError,
+        ) as e:
+            self.abort(e)
+
+        if url:
+            self.echo(self._translator.pull_request_created(url))
+            self._open_url(url)
+
+    def branches(self, with_issues: bool):
+        """ List the local and remote branches, optionally with their issue IDs. """
+        refs = git.refs()
+        if with_issues:
+            index = issues.branch_index(refs, self._config)
+            rows = sorted((issue_id, branch) for branch, issue_id in index.items())
+            self.echo(self._translator.branch_index(rows))
+            return
+
+        names = [
+            ref.split("/", 2)[2]
+            for ref in refs
+            if ref.startswith(tuple(issues.BRANCH_PREFIXES))
+            and not ref.endswith("/HEAD")
+        ]
+        self.echo("\n".join(sorted(names)))
+
+    def prefetch(self, jobs: int):
+        """ Cache the issues referenced by the local and remote branch names. """
+        refs = git.refs()
+        index = issues.branch_index(refs, self._config)
+        issue_ids = sorted(set(index.values()))
+        results = issues.from_tracker_many(
+            issue_ids, self._config, self.issue_cache, jobs
+        )
+        self.log_tracker_stats()
+
+        failed = {
+            issue_id: result
+            for issue_id, result in results.items()
+            if not isinstance(result, issues.Issue)
+        }
+        self.echo(self._translator.prefetch_results(len(results), failed))
+        complete.rebuild_index(refs, self._config)
+        if failed:
+            sys.exit(1)
+
+    def cache_stats(self):
+        """ Show the issue cache statistics. """
+        self.echo(self._translator.cache_stats(self.issue_cache.stats()))
+
+    def cache_clear(self):
+        """ Remove all entries from the issue cache. """
+        self.issue_cache.clear()
+        self.echo(self._translator.cache_cleared(self.issue_cache.path))
+
+    def hooks_install(self, force: bool = False):
+        """ Install the Git hook that fills the commit message with the issue. """
+        from mgit import hook
+
+        try:
+            path = hook.install(git.hooks_directory(), force)
+        except FileExistsError as e:
+            self.abort(self._translator.hook_exists(str(e)))
+        self.echo(self._translator.hook_installed(path))
+
+    def outbox_status(self):
+        """ Show the issue updates waiting to be sent to the issue tracker. """
+        self.echo(self._translator.outbox_status(outbox.stats(), outbox.updates()))
+
+    def outbox_flush(self):
+        """
+        Send the queued issue updates now, including the ones waiting for a
+        retry or given up on.
+        """
+        tracker = trackers.for_config(self._config, issues.client(self._config))
+        counts = outbox.flush(tracker, force=True, wait=True)
+        self.echo(self._translator.outbox_flushed(counts))
+        if counts["failed"]:
+            self.echo(self._translator.outbox_status(outbox.stats(), outbox.updates()))
+            sys.exit(1)
+
+    @property
+    def issue_cache(self):
+        """ Lazy load the issue cache. """
+        if self._issue_cache is None:
+            self._issue_cache = cache.IssueCache.from_config(self._config)
+        return self._issue_cache
+
+    # # Multi-repo mode
+
+    def _branch_repos(self, issue_id: str, base_branch: str, switch: bool):
+        """ Create the branch of the issue in every repo. The issue is fetched once. """
+        new_branch = self._shared_issue(issue_id).branch_name
+
+        def plan(path):
+            base = base_branch or git.default_base_branch()
+            if not base:
+                raise repos.RepoError(self._translator.no_base_branch())
+            return base
+
+        def create(path):
+            git.create_branch(plans[path], new_branch, switch=switch)
+            if not git.branch_exists(new_branch):
+                raise repos.RepoError(self._translator.branch_not_created(new_branch))
+            return new_branch
+
+        plans, failed = self._plan_repos(plan)
+        rows = [(self._repo_name(path), base) for path, base in plans.items()]
+        self.echo(self._translator.create_branch_repos_warning(new_branch, rows))
+        self.confirm(abort=True)
+        self._report_repos(self._run_repos(list(plans), create), failed)
+
+    def _commit_repos(self, message: str, issue_id: str):
+        """ Commit and push the changes of every repo. """
+        if not message and issue_id:
+            message = str(self._shared_issue(issue_id))
+
+        def plan(path):
+            branch = git.current_branch()
+            if message:
+                return branch, message
+            issue = self._issue_from_branch()
+            if not issue.id:
+                raise repos.RepoError(self._translator.branch_has_no_issue_id(branch))
+            return branch, str(issue)
 
-        except subprocess.CalledProcessError as e:
+        def commit(path):
+            branch, message = plans[path]
+            git.commit_all(message)
+            git.push(branch)
+            self._queue_commit_updates(issue_id)
+            return branch
+
+        plans, failed = self._plan_repos(plan)
+        rows = [(self._repo_name(path),) + plan for path, plan in plans.items()]
+        self.echo(self._translator.commit_repos_warning(rows))
+        self.confirm(abort=True)
+        self._report_repos(self._run_repos(list(plans), commit), failed)
+
+    def _pr_repos(self, base_branch: str, labels=(), update_refs: bool = False):
+        """ Create a pull request for the current branch of every repo. """
+        plans, failed = self._plan_repos(
+            lambda path: self._pull_request_plan(base_branch)
+        )
+        rows = [
+            (self._repo_name(path), plan["base_branch"], plan["title"])
+            for path, plan in plans.items()
+        ]
+        self.echo(self._translator.pull_request_repos_warning(rows))
+        self.confirm(abort=True)
+        self.echo(self._translator.update_base_branch_repos_confirmation())
+        update_base_branch = self.confirm()
+
+        def create(path):
+            return self._create_pull_request(
+                plans[path], labels, update_base_branch, False, update_refs
+            ) or plans[path]["branch"]
+
+        self._report_repos(self._run_repos(list(plans), create), failed)
+
+    def _shared_issue(self, issue_id: str) -> issues.Issue:
+        """ Fetch the issue once for every repo. """
+        import requests
+
+        try:
+            issue = issues.from_tracker(issue_id, self._config, self.issue_cache)
+        except (
+            requests.exceptions.HTTPError,
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+            trackers.IssueNotFound,
+        ) as e:
             self.abort(e)
+        self.log_tracker_stats()
+        return issue
+
+    def _run_repos(self, paths: list, function) -> dict:
+        # Load the issue cache here so every repo shares it.
+        self.issue_cache
+        return repos.run(paths, function, self._repo_jobs)
+
+    def _plan_repos(self, function):
+        """
+        Gather what each repo needs before asking for a single confirmation.
+
+        :return: The plan of each repo where it succeeded, and the result of
+            each repo where it failed.
+        """
+        plans, failed = {}, {}
+        results = self._run_repos(self._repo_paths, function)
+        for path, (result, seconds) in results.items():
+            if isinstance(result, BaseException):
+                failed[path] = (result, seconds)
+            else:
+                plans[path] = result
+        if not plans:
+            self._report_repos({}, failed)
+        return plans, failed
+
+    def _report_repos(self, results: dict, failed: dict):
+        """ Show the status and time of each repo, and exit with 1 if one failed. """
+        results = dict(failed, **results)
+        rows = []
+        for path in self._repo_paths:
+            if path in results:
+                result, seconds = results[path]
+                error = result if isinstance(result, BaseException) else None
+                detail = _error_message(error) if error else str(result or "")
+                rows.append((self._repo_name(path), seconds, error is None, detail))
+        self.echo(self._translator.repo_results(rows))
+        if not all(row[2] for row in rows):
+            sys.exit(1)
+
+    def _repo_name(self, path: str) -> str:
+        name = os.path.relpath(path)
+        return os.path.basename(path) if name.startswith("..") else name
 
     # # Helpers
 
     def _config_init(self):
         """ Initialize the config values for this Git repository. """
         self.echo(self._translator.init_issue_tracker_api())
-        self._config.issue_tracker_api = click.prompt(
+        issue_tracker_api = click.prompt(
             self._translator.issue_tracker_api_prompt(), type=str
         )
-        self._config.save()
+        try:
+            configs.save({"issue_tracker_api": issue_tracker_api})
+        except configs.ConfigError as e:
+            self.abort(e)
+
+    def _issue_from_branch(self):
+        """
+        Create the issue from the current branch name, using the title from
+        the issue cache when it was fetched before.
+        """
+        issue = issues.from_branch(git.current_branch(), config=self._config)
+        if issue.id:
+            cached = issues.from_cache(issue.id, self._config, self.issue_cache)
+            if cached:
+                return cached
+        return issue
+
+    def _pull_request_plan(self, base_branch: str) -> dict:
+        """
+        Gather the title, body and branches of the pull request for the
+        current branch.
+
+        :raises: repos.RepoError if it can't be created.
+        """
+        repo = github.repository(self._config, git.remote_url())
+        native = bool(github.token() and repo)
+        if not native and not git.hub_installed():
+            raise repos.RepoError(translator.MESSAGES["hub_cli_missing"])
+
+        if not base_branch:
+            base_branch = git.default_base_branch()
+
+        # Create title and message from current branch info.
+        try:
+            issue = self._issue_from_branch()
+            title = message = issue.title
+            if self._config.issue_tracker_is_github:
+                message += f"\n\nCloses #{issue.id}"
+        except ValueError:
+            raise repos.RepoError(
+                self._translator.branch_has_no_issue_id(git.current_branch())
+            )
+
+        body = self._translator.pull_request_body(
+            title, self._config.issue_tracker, issue.id, issue.url
+        )
+        return {
+            "repo": repo if native else "",
+            "issue_id": issue.id,
+            "base_branch": base_branch,
+            "branch": git.current_branch(),
+            "title": title,
+            "message": message,
+            "body": body,
+        }
+
+    def _create_pull_request(
+        self,
+        plan: dict,
+        labels=(),
+        update_base_branch: bool = True,
+        interactive: bool = False,
+        update_refs: bool = False,
+    ) -> str:
+        """
+        Commit, rebase and push the current branch, then create the pull request.
+
+        :param plan: Values from `_pull_request_plan`.
+        :return: The URL of the pull request, or empty string when `hub` made it.
+        """
+        base_branch = plan["base_branch"]
+        branch = plan["branch"]
+
+        # The base branch is fetched and the assignee is read while the
+        # commit is created. Only the rebase has to wait for both.
+        steps = pipeline.Pipeline()
+        steps.add("commit", lambda: git.commit_all(plan["message"]))
+        steps.add("assignee", git.assignee)
+        push_requires = ["commit"]
+        if update_base_branch:
+            steps.add("fetch", lambda: git.fetch_base_branch(base_branch))
+            steps.add(
+                "rebase",
+                lambda: self._rebase(base_branch, interactive, update_refs),
+                requires=["fetch", "commit"],
+            )
+            push_requires = ["rebase"]
+        steps.add("push", lambda: git.push(branch), requires=push_requires)
+        results = steps.run()
+        self.log(self._translator.push_summary(results["push"]))
+
+        # Make the pull request once the changes are on the remote branch.
+        if not plan["repo"]:
+            git.pull_request(
+                base_branch, plan["body"], results["assignee"], labels=labels
+            )
+            url = ""
+        else:
+            title, _, description = plan["body"].partition("\n")
+            pull = github.create_pull_request(
+                plan["repo"],
+                base_branch,
+                branch,
+                title,
+                description.strip("\n"),
+                assignees=[results["assignee"]],
+                labels=labels,
+                tracker_client=issues.client(self._config),
+            )
+            url = pull["html_url"]
+
+        comment = self._config.pr_issue_comment
+        if comment and url:
+            comment = comment.format(url=url, branch=branch, base_branch=base_branch)
+        self._queue_issue_updates(
+            plan["issue_id"], self._config.pr_issue_state, comment if url else None
+        )
+        return url
+
+    def _rebase(self, base_branch: str, interactive: bool, update_refs: bool):
+        """
+        Rebase onto the fetched base branch.
+
+        :raises: repos.RepoError if the rebase stopped, so nothing is pushed.
+        """
+        try:
+            git.rebase(
+                base_branch,
+                update=False,
+                interactive=interactive,
+                update_refs=update_refs,
+            )
+        except subprocess.CalledProcessError:
+            raise repos.RepoError(self._translator.rebase_failed(base_branch))
+
+    def _queue_commit_updates(self, issue_id: str = ""):
+        """ Queue the "commit_issue_state" transition of the committed issue. """
+        if not self._config.commit_issue_state:
+            return
+        if not issue_id:
+            issue_id = issues.from_branch(git.current_branch(), config=self._config).id
+        self._queue_issue_updates(issue_id, state=self._config.commit_issue_state)
+
+    def _queue_issue_updates(self, issue_id: str, state=None, comment=None):
+        """
+        Queue the updates of the issue in the outbox and start the worker that
+        sends them, so the command doesn't wait for the issue tracker.
+        """
+        if not issue_id or not (state or comment):
+            return
+        if comment:
+            outbox.enqueue("comment", issue_id, comment)
+        if state:
+            outbox.enqueue("transition", issue_id, state)
+        outbox.start_worker()
+        self.log(self._translator.issue_updates_queued(issue_id, outbox.path()))
+
+    def _open_url(self, url: str):
+        """ Open the URL in the user's default browser. """
+        import webbrowser
+
+        webbrowser.open(url)
+
+    def log(self, message: str):
+        """ Write a message to the log file in verbose mode. """
+        if self._verbose:
+            click.echo(message, file=self._log_file)
+
+    def log_tracker_stats(self):
+        """ Log the issue tracker request counters in verbose mode. """
+        self.log(self._translator.tracker_stats(issues.client(self._config).stats))
 
     def abort(self, message, code=1):
         self.echo(message)
@@ -162,3 +654,10 @@ class App:
     def confirm(self, message="Do you wish to continue?", abort=False) -> bool:
         """ Get user confirmation. """
         return click.confirm(message, abort=abort)
+
+
+def _error_message(error: BaseException) -> str:
+    """ Get a one line message for an error raised in a repo. """
+    if isinstance(error, SystemExit):
+        return f"exited with {error.code}"
+    return str(error).strip().split("\n")[0] or type(error).__name__
@@ -0,0 +1,327 @@
+import os
+import re
+import subprocess
+
+from mgit import profiler
+
+GIT_DIR = ".git"
+
+# Ref names that `git rev-parse` resolves with more than a file lookup.
+REVISION_SYNTAX = re.compile(r"[\^~:@{}\s\\*?\[]|\.\.")
+OBJECT_NAME = re.compile(r"^[0-9a-fA-F]{4,40}$")
+
+# Order in which `git rev-parse` looks up a short ref name.
+REF_RULES = [
+    "{}",
+    "refs/{}",
+    "refs/tags/{}",
+    "refs/heads/{}",
+    "refs/remotes/{}",
+    "refs/remotes/{}/HEAD",
+]
+
+
+class SubprocessBackend:
+    """ Answer read-only Git queries by running `git`. """
+
+    def __init__(self, directory: str = ""):
+        """
+        :param directory: Directory of the repo. Defaults to the working directory.
+        """
+        self._directory = directory or None
+
+    def current_branch(self) -> str:
+        """ Get current branch for the current Git repo. """
+        command = ["git", "rev-parse", "--abbrev-ref", "HEAD"]
+        output = _check_output(command, self._directory)
+        return str(output, "utf-8").strip("\n")
+
+    def ref_exists(self, ref: str) -> bool:
+        """ Check if the ref exists in the current Git repo. """
+        command = ["git", "rev-parse", "--quiet", "--verify", ref]
+        name = profiler.command_name(command)
+        with profiler.span(profiler.SUBPROCESS, name) as details:
+            try:
+                subprocess.check_call(
+                    command, stdout=subprocess.DEVNULL, cwd=self._directory
+                )
+                details["exit_code"] = 0
+                return True
+            except subprocess.CalledProcessError as e:
+                details["exit_code"] = e.returncode
+                return False
+
+    def config(self, key: str, scope: str = "") -> str:
+        """
+        Get a config value or empty string.
+
+        :param key: The config key, e.g. "user.handle".
+        :param scope: Either "global", "local" or empty for all config files.
+        """
+        command = ["git", "config"]
+        if scope:
+            command.append(f"--{scope}")
+        try:
+            output = _check_output(command + [key], self._directory)
+            return str(output, "utf-8").strip("\n")
+        except subprocess.CalledProcessError:
+            return ""
+
+    def refs(self) -> set:
+        """ Get the names of all refs with a single `git for-each-ref` call. """
+        command = ["git", "for-each-ref", "--format=%(refname)"]
+        output = _check_output(command, self._directory)
+        return set(str(output, "utf-8").split())
+
+    def config_list(self, scope: str = "") -> dict:
+        """ Get all config values with a single `git config --list` call. """
+        command = ["git", "config", "--list", "-z"]
+        if scope:
+            command.append(f"--{scope}")
+        try:
+            output = str(_check_output(command, self._directory), "utf-8")
+        except subprocess.CalledProcessError:
+            return {}
+
+        values = {}
+        for entry in output.split("\0"):
+            key, _, value = entry.partition("\n")
+            if key:
+                values[normalize_key(key)] = value
+        return values
+
+
+class FileBackend(SubprocessBackend):
+    """
+    Answer read-only Git queries by reading the files in the .git folder.
+
+    Loose refs, `packed-refs`, HEAD and config files are parsed directly so no
+    process is started. Anything these files can't answer, such as revision
+    expressions or config includes, falls back to `SubprocessBackend`.
+    """
+
+    def __init__(self, git_dir: str = GIT_DIR, common_dir=None, directory=None):
+        """
+        :param git_dir: Path to the .git folder, which holds HEAD.
+        :param common_dir: Path to the folder holding refs and config, which is
+            the main repo's .git folder for worktrees. Defaults to `git_dir`.
+        :param directory: Where `git` runs. Defaults to the parent of `git_dir`.
+        """
+        if directory is None:
+            directory = os.path.dirname(git_dir)
+        super().__init__(directory)
+        self._git_dir = git_dir
+        self._common_dir = common_dir or git_dir
+        self._packed_refs = None
+        self._packed_refs_mtime = None
+        self._configs = {}
+
+    def current_branch(self) -> str:
+        head = self._read(os.path.join(self._git_dir, "HEAD"))
+        if head is None:
+            return super().current_branch()
+
+        if head.startswith("ref: "):
+            ref = head[len("ref: ") :]
+            return ref[len("refs/heads/") :] if ref.startswith("refs/heads/") else ref
+
+        # Detached HEAD, matches `git rev-parse --abbrev-ref HEAD`.
+        return "HEAD"
+
+    def ref_exists(self, ref: str) -> bool:
+        if not os.path.isdir(self._common_dir) or not ref:
+            return super().ref_exists(ref)
+
+        if REVISION_SYNTAX.search(ref) or OBJECT_NAME.match(ref):
+            return super().ref_exists(ref)
+
+        if ref == "HEAD" or ref.endswith("_HEAD"):
+            return os.path.isfile(os.path.join(self._git_dir, ref))
+
+        packed_refs = self.packed_refs()
+        for rule in REF_RULES:
+            name = rule.format(ref)
+            if not name.startswith("refs/"):
+                continue
+            path = os.path.join(self._common_dir, name)
+            if os.path.isfile(path) or name in packed_refs:
+                return True
+
+        return False
+
+    def config(self, key: str, scope: str = "") -> str:
+        return self.config_list(scope).get(normalize_key(key), "")
+
+    def refs(self) -> set:
+        if not os.path.isdir(self._common_dir):
+            return super().refs()
+
+        refs = set(self.packed_refs())
+        for directory, _, files in os.walk(os.path.join(self._common_dir, "refs")):
+            relative = os.path.relpath(directory, self._common_dir).replace(os.sep, "/")
+            refs.update(f"{relative}/{name}" for name in files)
+        return refs
+
+    def config_list(self, scope: str = "") -> dict:
+        values = {}
+        for path in self._config_paths(scope):
+            parsed = self._parse_config(path)
+            if parsed is None:
+                return super().config_list(scope)
+            values.update(parsed)
+        return values
+
+    def packed_refs(self) -> set:
+        """ Get the ref names in `packed-refs`. Parsed again if the file changed. """
+        path = os.path.join(self._common_dir, "packed-refs")
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return set()
+
+        if mtime != self._packed_refs_mtime:
+            refs = set()
+            with open(path) as infile:
+                for line in infile:
+                    if line.startswith(("#", "^")):
+                        continue
+                    parts = line.split()
+                    if len(parts) == 2:
+                        refs.add(parts[1])
+            self._packed_refs = refs
+            self._packed_refs_mtime = mtime
+
+        return self._packed_refs
+
+    # Helpers
+
+    def _config_paths(self, scope: str) -> list:
+        """ Get the config files for the scope, lowest priority first. """
+        xdg_config_home = os.getenv("XDG_CONFIG_HOME") or os.path.expanduser(
+            "~/.config"
+        )
+        global_paths = [
+            os.path.join(xdg_config_home, "git", "config"),
+            os.path.expanduser("~/.gitconfig"),
+        ]
+        local_paths = [os.path.join(self._common_dir, "config")]
+
+        if scope == "global":
+            return global_paths
+        if scope == "local":
+            return local_paths
+        return ["/etc/gitconfig"] + global_paths + local_paths
+
+    def _parse_config(self, path: str):
+        """
+        Parse a config file into a dict of normalized keys and values.
+
+        Returns None when the file uses features that require Git itself.
+        """
+        if os.getenv("GIT_CONFIG_COUNT") or os.getenv("GIT_CONFIG_PARAMETERS"):
+            return None
+
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return {}
+
+        cached = self._configs.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        with open(path) as infile:
+            values = parse_config(infile.read())
+
+        self._configs[path] = (mtime, values)
+        return values
+
+    def _read(self, path: str):
+        try:
+            with open(path) as infile:
+                return infile.read().strip()
+        except OSError:
+            return None
+
+
+def _check_output(command: list, directory=None) -> bytes:
+    """ Run `subprocess.check_output`, recording the command when profiling. """
+    name = profiler.command_name(command)
+    with profiler.span(profiler.SUBPROCESS, name) as details:
+        try:
+            output = subprocess.check_output(command, cwd=directory)
+        except subprocess.CalledProcessError as e:
+            details["exit_code"] = e.returncode
+            raise
+        details["exit_code"] = 0
+        details["bytes"] = len(output)
+        return output
+
+
+def parse_config(text: str):
+    """
+    Parse the contents of a Git config file. Uses O(n) time and space.
+
+    Returns None if the file includes other files.
+
+    >>> parse_config('[branch "main"]\\n\\tremote = origin')
+    {'branch.main.remote': 'origin'}
+    """
+    values = {}
+    section = ""
+    lines = iter(text.splitlines())
+    for line in lines:
+        # Join continuation lines.
+        while line.endswith("\\") and not line.endswith("\\\\"):
+            line = line[:-1] + next(lines, "")
+
+        line = line.strip()
+        if not line or line.startswith(("#", ";")):
+            continue
+
+        if line.startswith("["):
+            header, _, line = line[1:].partition("]")
+            name, _, subsection = header.strip().partition(" ")
+            if name.lower() in ("include", "includeif"):
+                return None
+            if subsection:
+                subsection = subsection.strip().strip('"')
+                section = f"{name.lower()}.{subsection}"
+            else:
+                section = header.strip().lower()
+            line = line.strip()
+            if not line:
+                continue
+
+        key, equals, value = line.partition("=")
+        key = f"{section}.{key.strip().lower()}"
+        values[key] = _parse_value(value) if equals else "true"
+
+    return values
+
+
+def _parse_value(value: str) -> str:
+    """ Parse a config value, handling quotes, escapes and comments. """
+    result = []
+    quoted = False
+    chars = iter(value.strip())
+    for char in chars:
+        if char == '"':
+            quoted = not quoted
+        elif char == "\\":
+            escaped = next(chars, "")
+            result.append({"n": "\n", "t": "\t", "b": "\b"}.get(escaped, escaped))
+        elif char in "#;" and not quoted:
+            break
+        else:
+            result.append(char)
+    return "".join(result).strip()
+
+
+def normalize_key(key: str) -> str:
+    """ Section and variable names are case insensitive, subsections are not. """
+    section, _, rest = key.partition(".")
+    subsection, _, name = rest.rpartition(".")
+    if subsection:
+        return f"{section.lower()}.{subsection}.{name.lower()}"
+    return f"{section.lower()}.{name.lower()}"
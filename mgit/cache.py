@@ -0,0 +1,228 @@
+import json
+import os
+import threading
+import time
+
+from mgit import repos
+
+FILENAME = "issues.json"
+DEFAULT_TTL = 60 * 60
+DEFAULT_MAX_ENTRIES = 500
+STATS = ["hits", "revalidated", "misses", "evictions"]
+
+# Caches reused by long running processes, keyed by path.
+_instances = {}
+
+
+def directory() -> str:
+    """
+    Get the directory where mgit caches data.
+
+    Uses `MGIT_CACHE_DIR` if set, then the `.git/mgit` folder of the current
+    Git repo, shared by its worktrees, and finally the XDG cache directory.
+    """
+    if os.getenv("MGIT_CACHE_DIR"):
+        return os.getenv("MGIT_CACHE_DIR")
+
+    location = repos.locate()
+    if location:
+        return os.path.join(location.common_dir, "mgit")
+
+    xdg_cache_home = os.getenv("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(xdg_cache_home, "mgit")
+
+
+class IssueCache:
+    def __init__(self, path=None, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        Persistent cache of issues fetched from the issue tracker.
+
+        Entries are keyed by the issue URL and evicted least recently used first.
+        The cache is safe to share between threads.
+
+        :param path: The JSON file where the cache is stored.
+        :param ttl: Seconds an entry is used without revalidating it.
+        :param max_entries: Maximum number of entries to keep.
+        """
+        self._path = path or os.path.join(directory(), FILENAME)
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._data = None
+        self._mtime = None
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Get the cache for the current directory using the TTL and size values
+        from the mgit config. Caches are reused within the same process.
+        """
+        path = os.path.abspath(os.path.join(directory(), FILENAME))
+        issue_cache = _instances.get(path)
+        if issue_cache is None:
+            issue_cache = _instances[path] = cls(path)
+        issue_cache._ttl = int(config.cache_ttl or DEFAULT_TTL)
+        issue_cache._max_entries = int(config.cache_max_entries or DEFAULT_MAX_ENTRIES)
+        return issue_cache
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def get(self, key: str):
+        """ Get the entry for the key or None. """
+        with self._lock:
+            return self._load()["entries"].get(key)
+
+    def fresh(self, entry: dict) -> bool:
+        """ Determine if the entry can be used without revalidating it. """
+        return time.time() - entry["fetched_at"] < self._ttl
+
+    def validators(self, entry: dict) -> dict:
+        """ Get the conditional request headers for revalidating the entry. """
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def hit(self, key: str):
+        """ Record that the entry was used without a request. """
+        self.hit_many([key])
+
+    def hit_many(self, keys: list):
+        """
+        Record that the entries were used without a request, with a single
+        write. Keys removed by another process in the meantime are ignored.
+        """
+        with self._lock:
+            entries = self._load()["entries"]
+            used = [self._use(entries, key, "hits") for key in keys]
+            if any(used):
+                self.save()
+
+    def revalidated(self, key: str):
+        """ Record that the tracker confirmed the entry is unchanged. """
+        with self._lock:
+            entries = self._load()["entries"]
+            if self._use(entries, key, "revalidated"):
+                entries[key]["fetched_at"] = time.time()
+                self.save()
+
+    def store(self, key: str, summary: str, headers=None):
+        """ Store a freshly fetched issue and evict the oldest entries. """
+        with self._lock:
+            self._store(key, summary, headers)
+            self._count("misses")
+            self._evict()
+            self.save()
+
+    def store_many(self, summaries: dict):
+        """
+        Store many issues fetched in bulk, e.g. by `mgit prefetch`, with a
+        single write. They don't count as misses.
+
+        :param summaries: Summary for each key.
+        """
+        with self._lock:
+            for key, summary in summaries.items():
+                self._store(key, summary)
+            self._evict()
+            self.save()
+
+    def summaries(self) -> dict:
+        """ Get the summary for each key, without counting them as hits. """
+        with self._lock:
+            entries = self._load()["entries"]
+            return {key: entry["summary"] for key, entry in entries.items()}
+
+    def stats(self) -> dict:
+        """ Get the number of entries, the counters and the hit rate. """
+        with self._lock:
+            data = self._load()
+            stats = dict(data["stats"])
+            stats["entries"] = len(data["entries"])
+        lookups = stats["hits"] + stats["revalidated"] + stats["misses"]
+        stats["hit_rate"] = (
+            (stats["hits"] + stats["revalidated"]) / lookups if lookups else 0.0
+        )
+        stats["size"] = os.path.getsize(self._path) if os.path.isfile(self._path) else 0
+        return stats
+
+    def clear(self):
+        """ Remove all entries and counters. """
+        with self._lock:
+            self._data = self._empty()
+            if os.path.isfile(self._path):
+                os.remove(self._path)
+
+    def save(self):
+        """ Atomically write the cache to disk. """
+        os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+        temp_path = f"{self._path}.{os.getpid()}.tmp"
+        with self._lock:
+            with open(temp_path, "w") as outfile:
+                json.dump(self._load(), outfile)
+            os.replace(temp_path, self._path)
+            self._mtime = os.stat(self._path).st_mtime_ns
+
+    # Helpers
+
+    def _store(self, key: str, summary: str, headers=None):
+        headers = headers or {}
+        now = time.time()
+        self._load()["entries"][key] = {
+            "summary": summary,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "fetched_at": now,
+            "used_at": now,
+        }
+
+    def _evict(self):
+        """ Remove the least recently used entries over the maximum. """
+        entries = self._load()["entries"]
+        excess = len(entries) - self._max_entries
+        if excess > 0:
+            for key in sorted(entries, key=lambda k: entries[k]["used_at"])[:excess]:
+                del entries[key]
+                self._count("evictions")
+
+    def _use(self, entries: dict, key: str, stat: str) -> bool:
+        """ Mark the entry as used, or return False if it is gone. """
+        entry = entries.get(key)
+        if entry is None:
+            return False
+        entry["used_at"] = time.time()
+        self._count(stat)
+        return True
+
+    def _count(self, stat: str):
+        stats = self._load()["stats"]
+        stats[stat] = stats.get(stat, 0) + 1
+
+    def _load(self) -> dict:
+        """
+        Lazy load data from the JSON file. The file is read again when another
+        process changed it. Unreadable files are ignored.
+        """
+        try:
+            mtime = os.stat(self._path).st_mtime_ns
+        except OSError:
+            mtime = None
+
+        if self._data is None or (mtime and mtime != self._mtime):
+            self._data = self._empty()
+            self._mtime = mtime
+            try:
+                with open(self._path) as infile:
+                    data = json.load(infile)
+                self._data["entries"].update(data.get("entries", {}))
+                self._data["stats"].update(data.get("stats", {}))
+            except (OSError, ValueError):
+                pass
+        return self._data
+
+    def _empty(self) -> dict:
+        return {"entries": {}, "stats": {stat: 0 for stat in STATS}}
@@ -1,8 +1,26 @@
 import click  # https://click.palletsprojects.com/en/7.x/
 import sys
 
+from . import issues
+from . import profiler
+from . import repos
 from .app import App
-from ._version import __version__
+
+
+# Commands that can run in many repos with --repos.
+MULTI_REPO_COMMANDS = ["branch", "commit", "pr"]
+
+
+def print_version(ctx, param, value):
+    """ Print the version. It is imported here so it is not resolved on every run. """
+    if not value or ctx.resilient_parsing:
+        return
+
+    from ._version import __version__
+
+    click.echo(f"{ctx.find_root().info_name} version {__version__}")
+    ctx.exit()
+
 
 # TODO: rename function to mgit
 @click.group(name="mgit", context_settings={"help_option_names": ["-h", "--help"]})
@@ -15,25 +33,123 @@ from ._version import __version__
     help="File to log errors and warnings.",
 )
 @click.option("--verbose", "-v", is_flag=True, help="Enable verbose mode.")
-@click.version_option(version=__version__, message="%(prog)s version %(version)s")
+@click.option(
+    "--version",
+    is_flag=True,
+    callback=print_version,
+    expose_value=False,
+    is_eager=True,
+    help="Show the version and exit.",
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    envvar="MGIT_PROFILE",
+    help="Print the time spent in Git commands and HTTP requests.",
+)
+@click.option(
+    "--profile-output",
+    type=click.Path(dir_okay=False, writable=True),
+    envvar="MGIT_PROFILE_OUTPUT",
+    help="Write a Chrome trace of the run to this file.",
+)
+@click.option(
+    "--repos",
+    "repos_spec",
+    metavar="GLOB|MANIFEST",
+    help="Run branch, commit or pr in every Git repo matching the glob pattern "
+    "or listed in the manifest file, one per line.",
+)
+@click.option(
+    "--repos-jobs",
+    type=int,
+    default=repos.DEFAULT_JOBS,
+    show_default=True,
+    help="Maximum number of repos worked on at the same time.",
+)
 @click.pass_context
-def cli(ctx, log_file, verbose):
+def cli(ctx, log_file, verbose, profile, profile_output, repos_spec, repos_jobs):
     """
     Run Git work flows for GitHub with issue tracking ticket numbers.
+
+    \b
+    EXAMPLES
+        $ mgit --repos 'services/*' branch JIR-123
+        $ mgit --repos services.txt pr
     """
-    ctx.obj = App(log_file=log_file, verbose=verbose)
+    profiler.enable(profile or bool(profile_output))
+    if profiler.enabled():
+        ctx.call_on_close(lambda: report_profile(log_file, profile_output))
+
+    # Daemon and completion commands don't depend on the current Git repo.
+    if ctx.invoked_subcommand in ("daemon", "completion"):
+        return
+
+    repo_paths = []
+    if repos_spec:
+        if ctx.invoked_subcommand not in MULTI_REPO_COMMANDS:
+            raise click.UsageError(
+                f"--repos only works with {', '.join(MULTI_REPO_COMMANDS)}."
+            )
+        try:
+            repo_paths = repos.find(repos_spec)
+        except repos.RepoError as e:
+            raise click.BadParameter(str(e), param_hint="--repos")
+
+    ctx.obj = App(
+        log_file=log_file,
+        verbose=verbose,
+        repo_paths=repo_paths,
+        repo_jobs=repos_jobs,
+    )
+
+
+def report_profile(log_file, profile_output):
+    """ Print the profile summary and write the trace file if requested. """
+    from .translator import Translator
 
+    translator = Translator()
+    summary = translator.profile_summary(profiler.summary(), profiler.totals())
+    click.echo(summary, file=log_file)
+    if profile_output:
+        profiler.write_trace(profile_output)
+        click.echo(translator.profile_written(profile_output), file=log_file)
 
-@click.argument("issue_id")
+
+@click.argument("issue_ids", nargs=-1, metavar="ISSUE_ID...")
 @click.option("-b", "--base-branch", help="The base branch to perform this action on.")
+@click.option(
+    "-f",
+    "--from-file",
+    type=click.File("r"),
+    help="Read issue IDs from a file, one per line.",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    type=int,
+    default=issues.DEFAULT_JOBS,
+    show_default=True,
+    help="Maximum number of concurrent issue tracker requests.",
+)
+@click.option(
+    "--switch/--no-switch",
+    default=True,
+    help="Check out the new branch. Ignored when creating many branches.",
+)
 @cli.command()
 @click.pass_obj
-def branch(app, issue_id: str, base_branch: str):
+def branch(app, issue_ids: tuple, base_branch: str, from_file, jobs: int, switch):
     """
     Create a branch using issue ID and title.
 
     The new branch name is taken from the title of the issue found.
-    The new branch is created off of the --base-branch or the default base branch.
+    The new branch is created off of the --base-branch or the default base branch
+    on origin. Only that branch is fetched.
+
+    When more than one issue ID is given, the issues are fetched concurrently,
+    the base branch is fetched once and the branches are created without
+    checking them out.
 
     \b
     NOTE
@@ -43,8 +159,51 @@ def branch(app, issue_id: str, base_branch: str):
     EXAMPLES
         $ mgit branch JIR-123
         $ mgit branch JIR-123 --base-branch develop
+        $ mgit branch JIR-123 --no-switch
+        $ mgit branch JIR-123 JIR-124 JIR-125
+        $ mgit branch --from-file sprint.txt
     """
-    app.branch(issue_id, base_branch)
+    issue_ids = list(issue_ids)
+    if from_file:
+        for line in from_file:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                issue_ids.append(line)
+
+    # Remove duplicates while keeping the order.
+    issue_ids = list(dict.fromkeys(issue_ids))
+
+    if not issue_ids:
+        raise click.UsageError('Missing argument "ISSUE_ID".')
+
+    if app.repo_paths and (len(issue_ids) > 1 or from_file):
+        raise click.UsageError("--repos only works with a single ISSUE_ID.")
+
+    if len(issue_ids) == 1 and not from_file:
+        app.branch(issue_ids[0], base_branch, switch)
+    else:
+        app.branch_many(issue_ids, base_branch, jobs)
+
+
+@click.option(
+    "--issues", "with_issues", is_flag=True, help="Show the issue ID of each branch."
+)
+@cli.command()
+@click.pass_obj
+def branches(app, with_issues: bool):
+    """
+    List the local and remote branches.
+
+    With --issues, only the branches that contain an issue ID are listed, next
+    to that ID. The issue ID format can be set with "issue_key_pattern" in
+    mgit.json, e.g. "jira", "github" or a regular expression.
+
+    \b
+    EXAMPLES
+        $ mgit branches
+        $ mgit branches --issues
+    """
+    app.branches(with_issues)
 
 
 @click.option("-m", "--message", help="The commit message.")
@@ -71,6 +230,188 @@ def commit(app, message: str, issue_id: str):
     app.commit(message, issue_id)
 
 
+@click.option(
+    "-j",
+    "--jobs",
+    type=int,
+    default=issues.DEFAULT_JOBS,
+    show_default=True,
+    help="Maximum number of concurrent issue tracker requests.",
+)
+@cli.command()
+@click.pass_obj
+def prefetch(app, jobs: int):
+    """
+    Cache the issues referenced by branch names for offline use.
+
+    The issue IDs are taken from the local and remote branch names. GitHub
+    issues are fetched in pages of 100. Cached issues are used by commit, pr
+    and open when the issue tracker can't be reached.
+
+    \b
+    EXAMPLES
+        $ git fetch && mgit prefetch
+    """
+    app.prefetch(jobs)
+
+
+@cli.group()
+def cache():
+    """
+    Manage the local issue cache.
+
+    Issues fetched from the issue tracker are cached in the .git/mgit folder.
+    Set "cache_ttl" (seconds) and "cache_max_entries" in mgit.json to tune it.
+    """
+
+
+@cache.command()
+@click.pass_obj
+def stats(app):
+    """ Show the issue cache hit rate and size. """
+    app.cache_stats()
+
+
+@cache.command()
+@click.pass_obj
+def clear(app):
+    """ Remove all entries from the issue cache. """
+    app.cache_clear()
+
+
+@cli.group()
+def outbox():
+    """
+    Manage the issue updates waiting to be sent.
+
+    Set "commit_issue_state", "pr_issue_state" and "pr_issue_comment" in
+    mgit.json to update the issue on commit and pr. The updates are queued in
+    the .git/mgit folder and sent by a background worker, so the commands
+    don't wait for the issue tracker.
+
+    \b
+    EXAMPLES
+        $ mgit outbox status
+        $ mgit outbox flush
+    """
+
+
+@outbox.command(name="status")
+@click.pass_obj
+def outbox_status(app):
+    """ Show the queued issue updates and their errors. """
+    app.outbox_status()
+
+
+@outbox.command()
+@click.pass_obj
+def flush(app):
+    """ Send the queued issue updates now, retrying the failed ones. """
+    app.outbox_flush()
+
+
+@cli.group()
+def hooks():
+    """
+    Manage the Git hooks of the repo.
+
+    The prepare-commit-msg hook starts the message of commits made with
+    `git commit` or an IDE with the issue ID and title of the branch. It only
+    uses cached titles and never reaches the issue tracker.
+
+    \b
+    EXAMPLES
+        $ mgit hooks install
+    """
+
+
+@hooks.command()
+@click.option("--force", is_flag=True, help="Replace a hook not installed by mgit.")
+@click.pass_obj
+def install(app, force: bool):
+    """ Install the prepare-commit-msg hook. """
+    app.hooks_install(force)
+
+
+@cli.group(name="daemon")
+def daemon_group():
+    """
+    Run mgit in a background process.
+
+    While the daemon is running, mgit commands are forwarded to it over a Unix
+    domain socket so they skip startup and reuse warm connections and caches.
+    Commands run in this process when the daemon is not running.
+
+    \b
+    EXAMPLES
+        $ mgit daemon start
+        $ mgit daemon status
+        $ mgit daemon stop
+    """
+
+
+@daemon_group.command()
+@click.option("--foreground", is_flag=True, help="Run the daemon in this process.")
+def start(foreground: bool):
+    """ Start the mgit daemon. """
+    from . import client
+    from . import daemon
+    from .translator import Translator
+
+    path = client.socket_path()
+    if foreground:
+        click.echo(Translator().daemon_started(path))
+        daemon.serve(path)
+    elif daemon.start(path):
+        click.echo(Translator().daemon_started(path))
+    else:
+        click.echo(Translator().daemon_failed_to_start(path))
+        sys.exit(1)
+
+
+@daemon_group.command()
+def stop():
+    """ Stop the mgit daemon. """
+    from . import daemon
+    from .translator import Translator
+
+    click.echo(Translator().daemon_stopped(daemon.stop()))
+
+
+@daemon_group.command()
+def status():
+    """ Show whether the mgit daemon is running. """
+    from . import client
+    from . import daemon
+    from .translator import Translator
+
+    path = client.socket_path()
+    running = daemon.running(path)
+    click.echo(Translator().daemon_status(running, path))
+    sys.exit(0 if running else 1)
+
+
+@cli.command()
+@click.argument("shell", type=click.Choice(["bash", "zsh", "fish"]))
+def completion(shell: str):
+    """
+    Print the shell completion script.
+
+    Commands, issue IDs and branch names are completed from an index in the
+    .git/mgit folder, which is rebuilt in the background when branches or
+    cached issues change.
+
+    \b
+    EXAMPLES
+        $ eval "$(mgit completion bash)"
+        $ mgit completion zsh > "${fpath[1]}/_mgit"
+        $ mgit completion fish > ~/.config/fish/completions/mgit.fish
+    """
+    from . import complete
+
+    click.echo(complete.SCRIPTS[shell], nl=False)
+
+
 @cli.command()
 @click.pass_obj
 def open(app):
@@ -80,11 +421,27 @@ def open(app):
 
 @cli.command()
 @click.option("-b", "--base-branch", help="The base branch to perform this action on.")
+@click.option(
+    "--label", "labels", multiple=True, help="Add a label. Can be used many times."
+)
+@click.option(
+    "-i", "--interactive", is_flag=True, help="Edit the commits when rebasing."
+)
+@click.option(
+    "--update-refs",
+    is_flag=True,
+    help="Move branches stacked on the rebased commits along (Git 2.38+).",
+)
 @click.pass_obj
-def pr(app, base_branch=None):
+def pr(app, base_branch=None, labels=(), interactive=False, update_refs=False):
     """
     Create a GitHub Pull Request for the specified branch.
 
+    The current branch is rebased onto the base branch on origin without
+    switching branches. The pull request is created with the GitHub API when
+    MGIT_GITHUB_API_TOKEN or GITHUB_TOKEN is set, and with GitHub's `hub`
+    command otherwise.
+
     \b
     NOTE
         User confirmation is required before the pull request is created.
@@ -93,8 +450,12 @@ def pr(app, base_branch=None):
     EXAMPLES
         $ mgit pull-request
         $ mgit pull-request --base-branch develop
+        $ mgit pull-request --label bug --label urgent
+        $ mgit pull-request --interactive
     """
-    app.pr(base_branch)
+    if app.repo_paths and interactive:
+        raise click.UsageError("--interactive can't be used with --repos.")
+    app.pr(base_branch, list(labels), interactive, update_refs)
 
 
 if __name__ == "__main__":
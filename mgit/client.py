@@ -0,0 +1,157 @@
+"""
+Thin `mgit` entry point that forwards commands to a running mgit daemon.
+
+This module only imports the standard library so forwarding a command does not
+pay for importing click, requests or the rest of mgit. The client's stdin,
+stdout and stderr file descriptors are passed to the daemon, so prompts, colors
+and the output of Git commands behave exactly as if mgit ran in this process.
+When no daemon is running, or the daemon refuses the command, it is executed in
+this process instead.
+Shell completion, `mgit __complete`, is always answered by this process.
+"""
+import array
+import json
+import os
+import socket
+import struct
+import sys
+
+# Frame types sent by the client.
+REQUEST = b"r"
+PING = b"p"
+SHUTDOWN = b"q"
+
+# Frame types sent by the daemon.
+EXIT = b"x"
+LOCAL = b"l"
+
+HEADER = struct.Struct(">cI")
+STDIO = [0, 1, 2]
+# Commands that always run in the client, see `daemon.subcommand`.
+LOCAL_COMMANDS = ["daemon"]
+
+
+def socket_path() -> str:
+    """ Get the path of the daemon's Unix domain socket. """
+    if os.getenv("MGIT_DAEMON_SOCKET"):
+        return os.getenv("MGIT_DAEMON_SOCKET")
+
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR") or os.path.join(
+        os.getenv("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "mgit"
+    )
+    return os.path.join(runtime_dir, "mgit-daemon.sock")
+
+
+def send_frame(sock, kind: bytes, payload: bytes = b"", fds=None):
+    """
+    Send a frame made of a type byte, a payload length and the payload.
+
+    :param fds: File descriptors to pass to the peer along with the frame.
+    """
+    data = HEADER.pack(kind, len(payload)) + payload
+    if fds:
+        rights = array.array("i", fds).tobytes()
+        sock.sendmsg([data], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, rights)])
+    else:
+        sock.sendall(data)
+
+
+def recv_frame(sock):
+    """
+    Receive a frame and any file descriptors passed with it.
+
+    :return: The frame type, payload and file descriptors, or None values if
+        the peer hung up.
+    """
+    fds = array.array("i")
+    header, ancdata, _, _ = sock.recvmsg(
+        HEADER.size, socket.CMSG_LEN(len(STDIO) * fds.itemsize)
+    )
+    for level, kind, data in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(data[: len(data) - (len(data) % fds.itemsize)])
+
+    if len(header) < HEADER.size:
+        rest = _recv_exactly(sock, HEADER.size - len(header)) if header else None
+        if rest is None:
+            return None, b"", list(fds)
+        header += rest
+
+    kind, length = HEADER.unpack(header)
+    payload = _recv_exactly(sock, length) if length else b""
+    return kind, payload or b"", list(fds)
+
+
+def connect(path=None):
+    """ Connect to the daemon, or return None if it is not running. """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path or socket_path())
+        return sock
+    except OSError:
+        sock.close()
+        return None
+
+
+def forward(argv: list, path=None):
+    """
+    Run the command in the daemon using this process' stdin, stdout and stderr.
+
+    :return: The exit code, or None if no daemon is running or the daemon
+        refused the command.
+    """
+    sock = connect(path)
+    if sock is None:
+        return None
+
+    with sock:
+        request = {"argv": argv, "cwd": os.getcwd(), "env": dict(os.environ)}
+        payload = json.dumps(request).encode("utf-8")
+        try:
+            send_frame(sock, REQUEST, payload, fds=STDIO)
+            kind, payload, _ = recv_frame(sock)
+        except OSError:
+            kind = None
+
+        if kind == LOCAL:
+            return None
+        if kind != EXIT:
+            # The daemon stopped while running the command.
+            return 1
+        return int(payload)
+
+
+def main():
+    """ Entry point for the `mgit` command. """
+    argv = sys.argv[1:]
+    # Shell completion runs on every TAB, so it only imports `mgit.complete`.
+    if argv[:1] == ["__complete"]:
+        from mgit import complete
+
+        complete.main(argv[1:])
+        return
+
+    # The daemon refuses the local commands that follow options.
+    local = bool(argv) and argv[0] in LOCAL_COMMANDS
+    if not local and not os.getenv("MGIT_NO_DAEMON"):
+        code = forward(argv)
+        if code is not None:
+            sys.exit(code)
+
+    from mgit.cli import cli
+
+    cli(prog_name="mgit")
+
+
+# Helpers
+
+
+def _recv_exactly(sock, size: int):
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
@@ -0,0 +1,274 @@
+"""
+Shell completion for bash, zsh and fish.
+
+Completions are read from an index of issue IDs, issue titles and branch
+names in the cache directory, so pressing TAB only imports this module and
+the standard library: no click, no requests and no request to the issue
+tracker. The index is rebuilt by a detached `python -m mgit.complete` when
+the refs or the issue cache changed, and the shell gets the previous index
+in the meantime.
+
+>>> candidates(["commit", "--issue-id", "JIR-1"])
+[('JIR-12', 'Update Readme File'), ('JIR-13', 'Add Login Page')]
+"""
+import os
+import time
+
+from mgit import cache
+from mgit import repos
+
+FILENAME = "completion.tsv"
+# Seconds after which the index is rebuilt even if no ref changed, e.g. for
+# branches in nested folders, whose changes are not noticed.
+MAX_AGE = 10 * 60
+
+# Commands of `mgit.cli`, and the subcommands of its groups.
+COMMANDS = [
+    "branch",
+    "branches",
+    "cache",
+    "commit",
+    "completion",
+    "daemon",
+    "hooks",
+    "open",
+    "outbox",
+    "pr",
+    "prefetch",
+]
+SUBCOMMANDS = {
+    "cache": ["clear", "stats"],
+    "completion": ["bash", "fish", "zsh"],
+    "daemon": ["start", "status", "stop"],
+    "hooks": ["install"],
+    "outbox": ["flush", "status"],
+}
+ISSUE_OPTIONS = ["--issue-id", "--id"]
+BRANCH_OPTIONS = ["-b", "--base-branch"]
+
+SCRIPTS = {
+    "bash": """_mgit_completion() {
+    local IFS=$'\\n'
+    COMPREPLY=($(mgit __complete bash -- "${COMP_WORDS[@]:1:COMP_CWORD}"))
+}
+complete -o default -F _mgit_completion mgit
+""",
+    "zsh": """#compdef mgit
+_mgit() {
+    local -a completions
+    completions=("${(@f)$(mgit __complete zsh -- "${(@)words[2,CURRENT]}")}")
+    _describe 'mgit' completions
+}
+compdef _mgit mgit
+""",
+    "fish": """function __mgit_complete
+    set -l tokens (commandline -opc) (commandline -ct)
+    mgit __complete fish -- $tokens[2..-1]
+end
+complete -c mgit -f -a '(__mgit_complete)'
+""",
+}
+
+
+def path() -> str:
+    """ Get the path of the index of the current repo. """
+    return os.path.join(cache.directory(), FILENAME)
+
+
+def main(argv: list):
+    """
+    Print the completions of the command line, one per line, in the format of
+    the shell.
+
+    :param argv: The shell, "--", then the words up to the cursor, e.g.
+        ["bash", "--", "commit", "--issue-id", "JIR"].
+    """
+    shell, words = argv[0], argv[2:]
+    for value, description in candidates(words):
+        if shell == "zsh" and description:
+            value = f"{value}:{description}"
+        elif shell == "fish" and description:
+            value += f"\t{description}"
+        print(value)
+
+
+def candidates(words: list) -> list:
+    """
+    Get the values that complete the last word, with their descriptions.
+
+    :param words: The words after `mgit`, the last one being completed.
+    :return: (value, description) tuples.
+    """
+    words = words or [""]
+    current, previous = words[-1], words[:-1]
+    arguments = [word for word in previous if not word.startswith("-")]
+
+    kind = None
+    if not arguments:
+        values = [(command, "") for command in COMMANDS]
+    elif previous[-1] in ISSUE_OPTIONS:
+        kind = "issue"
+    elif previous[-1] in BRANCH_OPTIONS:
+        kind = "branch"
+    elif arguments[0] in SUBCOMMANDS and len(arguments) == 1:
+        values = [(command, "") for command in SUBCOMMANDS[arguments[0]]]
+    elif arguments[0] == "branch" and not current.startswith("-"):
+        kind = "issue"
+    else:
+        values = []
+
+    if kind:
+        values = load_index().get(kind, [])
+    # Issue IDs are upper case, but typing them in lower case is common.
+    prefixes = (current, current.upper()) if kind == "issue" else (current,)
+    return [(value, desc) for value, desc in values if value.startswith(prefixes)]
+
+
+def load_index() -> dict:
+    """
+    Get the (value, description) tuples of each kind, "issue" and "branch".
+
+    The index is read once per process. A rebuild is started in the
+    background when it is missing or stale.
+    """
+    global _index
+    if _index is not None:
+        return _index
+
+    index_path = path()
+    if stale(index_path):
+        start_rebuild()
+
+    _index = {}
+    try:
+        with open(index_path) as infile:
+            for line in infile:
+                kind, _, rest = line.rstrip("\n").partition("\t")
+                value, _, description = rest.partition("\t")
+                _index.setdefault(kind, []).append((value, description))
+    except OSError:
+        pass
+    return _index
+
+
+def stale(index_path: str) -> bool:
+    """ Determine if refs or issues changed since the index was written. """
+    try:
+        written = os.stat(index_path).st_mtime
+    except OSError:
+        return True
+    if time.time() - written > MAX_AGE:
+        return True
+
+    location = repos.locate()
+    sources = [os.path.join(cache.directory(), cache.FILENAME)]
+    if location:
+        sources += [
+            os.path.join(location.common_dir, name)
+            for name in ("packed-refs", "refs/heads", "refs/remotes/origin")
+        ]
+    for source in sources:
+        try:
+            if os.stat(source).st_mtime > written:
+                return True
+        except OSError:
+            continue
+    return False
+
+
+def rebuild_index(refs=None, config=None):
+    """
+    Write the index of the current repo from the branch names, parsed with
+    `issues.from_branch`, and the issues in the cache. Issues are described by
+    their title and branches by their commit message.
+
+    Imports the rest of mgit, so it runs in a background process or after a
+    command that already loaded it.
+
+    :param refs: Ref names, e.g. "refs/heads/jir-123-update-readme-file".
+        Defaults to `git.refs()`.
+    :param config: `configs.Settings` object. Defaults to the current settings.
+    """
+    from mgit import configs
+    from mgit import git
+    from mgit import issues
+    from mgit import trackers
+
+    config = config or configs.settings()
+    refs = git.refs() if refs is None else refs
+    issue_cache = cache.IssueCache.from_config(config)
+
+    branches = [
+        ref[len(prefix) :]
+        for ref in refs
+        for prefix in issues.BRANCH_PREFIXES
+        if ref.startswith(prefix) and not ref.endswith("/HEAD")
+    ]
+    index = issues.branch_index(refs, config)
+    titles = {}
+    for branch, issue_id in index.items():
+        titles.setdefault(issue_id, issues.from_branch(branch, config).title)
+
+    # Cached titles are the real ones, the titles from branch names are guesses.
+    url_prefix = trackers.for_config(config).issue_url("")
+    for url, summary in issue_cache.summaries().items():
+        if url.startswith(url_prefix) and url != url_prefix:
+            issue_id = url[len(url_prefix) :].upper()
+            titles[issue_id] = issues.Issue(issue_id, summary, config).title
+
+    lines = [f"issue\t{key}\t{title}\n" for key, title in sorted(titles.items())]
+    # Branches are described by their commit message, see `mgit.hook`.
+    for branch in sorted(set(branches)):
+        issue_id = index.get(branch)
+        message = f"{issue_id}: {titles[issue_id]}" if issue_id else ""
+        lines.append(f"branch\t{branch}\t{message}\n")
+    write_index(lines)
+
+
+def write_index(lines: list):
+    """ Atomically replace the index with the lines. """
+    index_path = path()
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    temp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as outfile:
+        outfile.write("".join(line.replace("\r", " ") for line in lines))
+    os.replace(temp_path, index_path)
+
+
+def start_rebuild():
+    """
+    Rebuild the index in a detached process. The index is touched first so
+    the next key presses don't start more rebuilds.
+    """
+    # Imported here, most key presses don't need a rebuild.
+    import subprocess
+    import sys
+
+    index_path = path()
+    try:
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        with open(index_path, "a"):
+            os.utime(index_path)
+    except OSError:
+        return
+
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    python_path = os.pathsep.join(filter(None, [package_root, os.getenv("PYTHONPATH")]))
+    subprocess.Popen(
+        [sys.executable, "-m", "mgit.complete"],
+        cwd=repos.directory() or None,
+        env=dict(os.environ, PYTHONPATH=python_path),
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+# Helpers
+
+_index = None
+
+
+if __name__ == "__main__":
+    rebuild_index()
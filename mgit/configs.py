@@ -1,66 +1,306 @@
 import json
 import os
+import re
+
+from mgit import repos
 
 FILENAME = "mgit.json"
-ALLOWED_ATTRIBUTES = ["issue_tracker_api"]
+USER_FILENAME = "config.json"
+ALLOWED_ATTRIBUTES = [
+    "issue_tracker_api",
+    "cache_ttl",
+    "cache_max_entries",
+    "connect_timeout",
+    "read_timeout",
+    "max_retries",
+    "issue_key_pattern",
+    "issue_tracker_type",
+    "commit_issue_state",
+    "pr_issue_state",
+    "pr_issue_comment",
+]
 
+# Issue trackers supported by `mgit.trackers` and their display names.
+ISSUE_TRACKERS = {
+    "github": "GitHub",
+    "gitlab": "GitLab",
+    "jira": "Jira",
+    "file": "File",
+}
 
-class Config(dict):
-    def __getattr__(self, key):
-        """ Load the JSON file and get the value. """
-        if key not in ALLOWED_ATTRIBUTES:
-            raise KeyError(f"'{key}' is not an allowed attribute")
+# Settings that update issues, which only the trackers above support.
+ISSUE_UPDATE_ATTRIBUTES = ["commit_issue_state", "pr_issue_state", "pr_issue_comment"]
 
-        self.load()
-        return self.get(key)
+# Issue key formats that can be used by name as the "issue_key_pattern".
+ISSUE_KEY_PATTERNS = {
+    "github": r"\d+",
+    "jira": r"[A-Z][A-Z0-9_]*-\d+",
+    "default": r"[A-Z][A-Z0-9_]*-\d+|\d+",
+}
 
-    def __setattr__(self, key, value):
+# Type and minimum of the numeric values.
+NUMBERS = {
+    "cache_ttl": (int, 0),
+    "cache_max_entries": (int, 1),
+    "connect_timeout": (float, 0.01),
+    "read_timeout": (float, 0.01),
+    "max_retries": (int, 0),
+}
+
+# Settings resolved by this process, reused until a file or variable changes.
+_resolved = {}
+
+
+class ConfigError(ValueError):
+    """ Raised when a config value is missing the expected type or range. """
+
+
+class Settings:
+    __slots__ = ALLOWED_ATTRIBUTES
+
+    def __init__(self, **values):
         """
-        Set the value and save to the JSON file.
+        Immutable mgit settings. Values are validated when the object is created.
+
+        >>> Settings(issue_tracker_api="http://example.com/").issue_tracker_api
+        http://example.com
 
-        This also removes the trailing slash from URL values.
+        :raises: ConfigError if a value is invalid or the key is not allowed.
         """
-        if key not in ALLOWED_ATTRIBUTES:
-            raise KeyError(f"'{key}' is not an allowed attribute")
+        for key, value in values.items():
+            if key not in ALLOWED_ATTRIBUTES:
+                raise ConfigError(f"'{key}' is not an allowed attribute")
+        for key in ALLOWED_ATTRIBUTES:
+            object.__setattr__(self, key, _validate(key, values.get(key)))
 
-        if "http://" in value or "https://" in value:
-            value = value.strip("/")
+        updates = [key for key in ISSUE_UPDATE_ATTRIBUTES if getattr(self, key)]
+        if updates and self.issue_tracker_kind not in ISSUE_TRACKERS:
+            names = ", ".join(ISSUE_TRACKERS.values())
+            raise ConfigError(
+                f"{', '.join(updates)} can only be used with these issue trackers: "
+                f"{names}. Set issue_tracker_type if the API URL doesn't show it."
+            )
+
+    def __setattr__(self, key, value):
+        raise AttributeError("Settings are read-only, use configs.save instead")
 
-        self[key] = value
-        self.save()
+    def __delattr__(self, key):
+        raise AttributeError("Settings are read-only, use configs.save instead")
 
-    def load(self, force=False):
-        """ Lazy load data from the JSON file. """
-        if not self.get("issue_tracker_api") or force:
-            with open(FILENAME) as infile:
-                data = json.load(infile)
-                for key in ALLOWED_ATTRIBUTES:
-                    self[key] = data[key]
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Settings) and self.as_dict() == other.as_dict()
 
-    def save(self):
-        """ Save data to the JSON file. """
-        with open(FILENAME, "w") as outfile:
-            json.dump(self, outfile)
+    def __repr__(self) -> str:
+        return f"Settings({self.as_dict()})"
+
+    def as_dict(self) -> dict:
+        """ Get the values that are set. """
+        return {
+            key: getattr(self, key)
+            for key in ALLOWED_ATTRIBUTES
+            if getattr(self, key) is not None
+        }
 
     # Issue tracker values
 
     @property
     def issue_tracker(self) -> str:
         """ Get the name of the issue tracker provider. """
-        if self.issue_tracker_is_github:
-            return "GitHub"
+        return ISSUE_TRACKERS.get(self.issue_tracker_kind, "")
 
+    @property
+    def issue_tracker_kind(self) -> str:
+        """
+        Get the type of issue tracker, e.g. "jira", from the "issue_tracker_type"
+        setting or the API URL. Empty string if it is unknown.
+        """
+        if self.issue_tracker_type:
+            return self.issue_tracker_type
+
+        url = self.issue_tracker_api or ""
+        if url.startswith("file://"):
+            return "file"
+        if "github" in url or "/repos/" in url:
+            return "github"
+        if "gitlab" in url or "/api/v4/projects/" in url:
+            return "gitlab"
+        if "atlassian.net" in url or "/rest/api/" in url:
+            return "jira"
         return ""
 
     @property
     def issue_tracker_is_github(self) -> bool:
-        return "github.com" in self.issue_tracker_api
+        return self.issue_tracker_kind == "github"
+
+    @property
+    def issue_key_format(self) -> str:
+        """ Get the regular expression matching issue IDs in branch names. """
+        pattern = self.issue_key_pattern or "default"
+        return ISSUE_KEY_PATTERNS.get(pattern, pattern)
+
+
+def settings() -> Settings:
+    """
+    Get the settings for the current directory.
+
+    Values are layered from lowest to highest priority:
+
+    1. The user file, `$XDG_CONFIG_HOME/mgit/config.json` or `MGIT_CONFIG`.
+    2. The repo file, `mgit.json` at the top level of the repo.
+    3. Environment variables named after the key, e.g. `MGIT_CACHE_TTL`.
+
+    The files are parsed once per process and again only when their
+    modification time changes.
+
+    :raises: ConfigError if a file can't be parsed or a value is invalid.
+    """
+    paths = (user_path(), os.path.abspath(project_path()))
+    env = tuple(os.getenv(_env_name(key)) for key in ALLOWED_ATTRIBUTES)
+    key = (paths, tuple(_mtime(path) for path in paths), env)
+
+    resolved = _resolved.get(paths)
+    if resolved is None or resolved[0] != key:
+        values = {}
+        for path in paths:
+            values.update(load(path))
+        for name, value in zip(ALLOWED_ATTRIBUTES, env):
+            if value is not None:
+                values[name] = _checked(_env_name(name), name, value)
+        resolved = _resolved[paths] = (key, Settings(**values))
+    return resolved[1]
+
+
+def load(path: str) -> dict:
+    """
+    Get the allowed values from a JSON file, or an empty dict if it is missing.
 
-    # TODO: Determine if necessary.
-    # @property
-    # def issue_tracker_api(self) -> str:
-    #     return self["issue_tracker_api"]
+    :raises: ConfigError if the file is not a JSON object or a value is invalid.
+    """
+    try:
+        with open(path) as infile:
+            data = json.load(infile)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        raise ConfigError(f"{path} could not be read: {e}")
+
+    if not isinstance(data, dict):
+        raise ConfigError(f"{path} must contain a JSON object")
+    return {
+        key: _checked(path, key, data[key]) for key in ALLOWED_ATTRIBUTES if key in data
+    }
+
+
+def save(values: dict, path: str = None):
+    """
+    Validate the values and atomically write them to the JSON file in one go.
+    Keys already in the file are kept.
+
+    :param path: Defaults to the repo's `mgit.json`.
+    :raises: ConfigError if a value is invalid.
+    """
+    path = path or project_path()
+    values = Settings(**values).as_dict()
+    try:
+        with open(path) as infile:
+            data = json.load(infile)
+    except (OSError, ValueError):
+        data = {}
+    data.update(values)
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as outfile:
+        json.dump(data, outfile)
+    os.replace(temp_path, path)
+
+
+def project_path() -> str:
+    """ Get the path of the `mgit.json` file at the top level of the current repo. """
+    return os.path.join(repos.root(), FILENAME)
+
+
+def user_path() -> str:
+    """ Get the path of the user-level config file. """
+    if os.getenv("MGIT_CONFIG"):
+        return os.path.abspath(os.getenv("MGIT_CONFIG"))
+
+    xdg_config_home = os.getenv("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+    return os.path.join(xdg_config_home, "mgit", USER_FILENAME)
 
 
 def loaded() -> bool:
-    return os.path.isfile(FILENAME)
+    return os.path.isfile(project_path())
+
+
+# Helpers
+
+
+def _validate(key: str, value):
+    """ Convert the value to the type of the key and check its range. """
+    if value is None:
+        return None
+
+    if key == "issue_tracker_api":
+        schemes = ("http://", "https://", "file://")
+        if not isinstance(value, str) or not value.startswith(schemes):
+            raise ConfigError(f"{key} must be an http://, https:// or file:// URL")
+        return value if value.startswith("file://") else value.strip("/")
+
+    if key == "issue_tracker_type":
+        if value not in ISSUE_TRACKERS:
+            raise ConfigError(f"{key} must be one of {', '.join(ISSUE_TRACKERS)}")
+        return value
+
+    if key in ("commit_issue_state", "pr_issue_state"):
+        if not isinstance(value, str):
+            raise ConfigError(f"{key} must be a string")
+        return value
+
+    if key == "pr_issue_comment":
+        try:
+            value.format(url="", branch="", base_branch="")
+        except (AttributeError, IndexError, KeyError, ValueError):
+            raise ConfigError(
+                f"{key} must be a string using only {{url}}, {{branch}} and "
+                "{base_branch}"
+            )
+        return value
+
+    if key == "issue_key_pattern":
+        if not isinstance(value, str):
+            raise ConfigError(f"{key} must be a string")
+        try:
+            re.compile(ISSUE_KEY_PATTERNS.get(value, value))
+        except re.error as e:
+            raise ConfigError(f"{key} is not a valid regular expression: {e}")
+        return value
+
+    convert, minimum = NUMBERS[key]
+    try:
+        if isinstance(value, bool):
+            raise ValueError()
+        converted = convert(value)
+    except (TypeError, ValueError):
+        raise ConfigError(f"{key} must be a number, not {value!r}")
+    if converted < minimum:
+        raise ConfigError(f"{key} must be at least {minimum}")
+    return converted
+
+
+def _checked(source: str, key: str, value):
+    """ Validate the value and name its source in the error message. """
+    try:
+        return _validate(key, value)
+    except ConfigError as e:
+        raise ConfigError(f"{source}: {e}")
+
+
+def _env_name(key: str) -> str:
+    return f"MGIT_{key.upper()}"
+
+
+def _mtime(path: str):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
@@ -0,0 +1,311 @@
+"""
+Long running mgit process that executes commands forwarded by `mgit.client`.
+
+Modules, the HTTP connection pool and the issue cache stay loaded between
+commands. Commands run one at a time in the main thread because each one
+changes the working directory, the environment and the standard streams of
+this process. A listener thread answers `status` and `stop` meanwhile, and
+sends the other commands back to their client, which runs them itself. The
+running command is interrupted like with Ctrl-C when its client hangs up.
+"""
+import json
+import os
+import queue
+import select
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import traceback
+
+from mgit import client
+
+START_TIMEOUT = 5
+
+
+def serve(path=None):
+    """
+    Listen on the Unix domain socket and run commands until asked to stop.
+
+    :raises: RuntimeError if a daemon is already listening on the socket.
+    """
+    # Warm up the modules used by every command.
+    from mgit import cli  # noqa: F401
+
+    path = path or client.socket_path()
+    if running(path):
+        raise RuntimeError(f"An mgit daemon is already listening on {path}")
+    if os.path.exists(path):
+        os.remove(path)
+
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    commands = queue.Queue()
+    signal.signal(signal.SIGINT, _interrupt)
+    try:
+        server.bind(path)
+        os.chmod(path, 0o600)
+        server.listen()
+        listener = threading.Thread(
+            target=_listen, args=(server, path, commands), daemon=True
+        )
+        listener.start()
+
+        # None is queued when the daemon is asked to stop.
+        for conn, request, fds in iter(commands.get, None):
+            with conn:
+                done = threading.Event()
+                watcher = threading.Thread(
+                    target=_watch, args=(conn, done), daemon=True
+                )
+                watcher.start()
+                try:
+                    code = run(request, fds)
+                finally:
+                    done.set()
+                    watcher.join()
+                    for fd in fds:
+                        os.close(fd)
+                    _busy.release()
+                if code is None:
+                    _send(conn, client.LOCAL)
+                else:
+                    _send(conn, client.EXIT, str(code).encode("utf-8"))
+    finally:
+        server.close()
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def run(request: dict, fds: list) -> int:
+    """
+    Run a command in this process using the client's directory, environment
+    and standard streams.
+
+    :param request: The argv, cwd and env of the client.
+    :param fds: The client's stdin, stdout and stderr file descriptors.
+    :return: The exit code, or None for the commands the client has to run
+        itself, e.g. `mgit daemon status` would wait for this daemon.
+    """
+    from mgit.cli import cli
+
+    if subcommand(request["argv"]) in client.LOCAL_COMMANDS:
+        return None
+
+    saved_cwd = os.getcwd()
+    saved_env = dict(os.environ)
+    saved_stdin = sys.stdin
+    saved_fds = [os.dup(fd) for fd in client.STDIO]
+    for fd, target in zip(fds, client.STDIO):
+        os.dup2(fd, target)
+
+    # Don't reuse input read ahead for a previous client.
+    sys.stdin = open(0, "r", closefd=False)
+
+    code = 0
+    try:
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+        _running.set()
+        try:
+            cli.main(args=request["argv"], prog_name="mgit")
+        finally:
+            _running.clear()
+    except SystemExit as e:
+        if isinstance(e.code, str):
+            sys.stderr.write(f"{e.code}\n")
+            code = 1
+        else:
+            code = e.code or 0
+    except KeyboardInterrupt:
+        code = 130
+    except Exception:
+        traceback.print_exc()
+        code = 1
+    finally:
+        # The client may be gone, see `_watch`.
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except OSError:
+                pass
+        sys.stdin = saved_stdin
+        for fd, target in zip(saved_fds, client.STDIO):
+            os.dup2(fd, target)
+            os.close(fd)
+        os.environ.clear()
+        os.environ.update(saved_env)
+        os.chdir(saved_cwd)
+
+    return code
+
+
+def subcommand(argv: list) -> str:
+    """
+    Get the command given to `mgit`, skipping the options of the `mgit` group
+    and their values.
+
+    >>> subcommand(["--repos-jobs", "2", "daemon", "status"])
+    'daemon'
+    """
+    import click
+    from mgit.cli import cli
+
+    value_options = {
+        name
+        for param in cli.params
+        if isinstance(param, click.Option) and not param.is_flag and not param.count
+        for name in param.opts + param.secondary_opts
+    }
+    arguments = iter(argv)
+    for argument in arguments:
+        if argument in value_options:
+            next(arguments, None)
+        elif argument == "--":
+            return next(arguments, "")
+        elif not argument.startswith("-"):
+            return argument
+    return ""
+
+
+def start(path=None) -> bool:
+    """ Start a detached daemon and wait until it accepts connections. """
+    path = path or client.socket_path()
+    if running(path):
+        return True
+
+    env = dict(os.environ, MGIT_DAEMON_SOCKET=path)
+    subprocess.Popen(
+        [sys.executable, "-m", "mgit.daemon"],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+        env=env,
+    )
+
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        if running(path):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def stop(path=None) -> bool:
+    """ Stop the daemon. Returns False if it was not running. """
+    sock = client.connect(path)
+    if sock is None:
+        return False
+    with sock:
+        client.send_frame(sock, client.SHUTDOWN)
+        client.recv_frame(sock)
+    return True
+
+
+def running(path=None) -> bool:
+    """ Determine if a daemon is listening on the socket. """
+    sock = client.connect(path)
+    if sock is None:
+        return False
+    with sock:
+        try:
+            client.send_frame(sock, client.PING)
+            kind, _, _ = client.recv_frame(sock)
+            return kind == client.EXIT
+        except OSError:
+            return False
+
+
+# Helpers
+
+# Held while a command is queued or running.
+_busy = threading.Lock()
+# Set while `run` is in the command, so an interrupt can't hit the cleanup.
+_running = threading.Event()
+# Set when the running command is interrupted by `_cancel`, not by Ctrl-C.
+_cancelled = threading.Event()
+
+
+def _listen(server, path: str, commands: queue.Queue):
+    """
+    Answer the clients in a thread, so `status` and `stop` get a reply while
+    a command runs, and queue the commands for the main thread.
+    """
+    while True:
+        try:
+            conn, _ = server.accept()
+        except OSError:
+            return
+
+        kind, payload, fds = client.recv_frame(conn)
+        if kind == client.SHUTDOWN:
+            # Stop listening before replying so the socket is gone once
+            # `stop` returns.
+            server.close()
+            os.remove(path)
+            _cancel()
+            commands.put(None)
+            _send(conn, client.EXIT, b"0")
+        elif kind == client.PING:
+            _send(conn, client.EXIT, b"0")
+        elif kind == client.REQUEST and len(fds) == len(client.STDIO):
+            if _busy.acquire(blocking=False):
+                commands.put((conn, json.loads(payload), fds))
+                continue
+            # The client runs the command itself rather than wait.
+            _send(conn, client.LOCAL)
+
+        for fd in fds:
+            os.close(fd)
+        conn.close()
+
+
+def _watch(conn, done: threading.Event):
+    """ Interrupt the running command when its client hangs up, e.g. on Ctrl-C. """
+    poller = select.poll()
+    poller.register(conn, select.POLLIN | select.POLLHUP)
+    while not done.is_set():
+        if not poller.poll(100):
+            continue
+        # Clients send nothing while they wait, so this is the end of file.
+        try:
+            hung_up = not conn.recv(1, socket.MSG_PEEK)
+        except OSError:
+            hung_up = True
+        if hung_up:
+            _cancel()
+        return
+
+
+def _cancel():
+    """ Interrupt the command running in the main thread, if any. """
+    _cancelled.set()
+    signal.pthread_kill(threading.main_thread().ident, signal.SIGINT)
+
+
+def _interrupt(signum, frame):
+    """
+    Raise KeyboardInterrupt in the running command when it is cancelled, and
+    stop the daemon on Ctrl-C.
+    """
+    if not _cancelled.is_set():
+        raise KeyboardInterrupt
+    _cancelled.clear()
+    if _running.is_set():
+        raise KeyboardInterrupt
+
+
+def _send(conn, kind: bytes, payload: bytes = b""):
+    try:
+        client.send_frame(conn, kind, payload)
+    except OSError:
+        # The client went away, e.g. after Ctrl-C.
+        pass
+
+
+if __name__ == "__main__":
+    serve()
@@ -2,42 +2,229 @@ import subprocess
 import click
 import sys
 import os
-import shlex
+import time
 
+from mgit import profiler
+from mgit import repos
 
-def call(command, abort=True, shell=False, verbose=False):
-    """ Execute `subprocess.call`.
+# Exit code reported for commands killed after their timeout, like `timeout(1)`.
+TIMEOUT_EXIT_CODE = 124
+
+# Lines or chunks of output buffered between the pipes and the reader of `stream`.
+MAX_QUEUED_LINES = 1000
+# Bytes read at a time by `stream` for output that isn't split into lines.
+CHUNK_SIZE = 16 * 1024
+
+
+def default_timeout():
+    """ Get the seconds after which commands are killed, from `MGIT_COMMAND_TIMEOUT`.
+
+    Commands have no timeout by default.
+    """
+    value = os.getenv("MGIT_COMMAND_TIMEOUT")
+    return float(value) if value else None
+
+
+def call(
+    command, abort=True, shell=False, verbose=False, timeout=None, input=None
+) -> int:
+    """ Execute the command with the output going straight to the terminal.
+
+    Nothing is buffered, so long running commands like `git push` show their
+    progress as it happens.
+
+    :param command: List of arguments. Strings are only allowed with `shell`.
+    :param timeout: Seconds after which the command is killed. Defaults to
+        `default_timeout()`.
+    :param input: Text written to the standard input of the command, e.g. a
+        commit message for `git commit -F -`.
+    :return: The exit code, or `TIMEOUT_EXIT_CODE` if the command timed out.
 
     Raises
     ------
-    subprocess.CalledProcessError
-        If the commands fail and `abort` is True.
+    SystemExit
+        With the exit code if the command fails and `abort` is True.
+    """
+    timeout = default_timeout() if timeout is None else timeout
+    name = profiler.command_name(command)
+    if verbose:
+        click.echo(name)
+
+    start = time.monotonic()
+    with profiler.span(profiler.SUBPROCESS, name) as details:
+        options = {"shell": shell, "timeout": timeout, "cwd": repos.directory() or None}
+        try:
+            if input is None:
+                code = subprocess.call(command, **options)
+            else:
+                process = subprocess.run(command, input=input.encode(), **options)
+                code = process.returncode
+        except subprocess.TimeoutExpired as e:
+            click.echo(e, err=True)
+            code = TIMEOUT_EXIT_CODE
+        details["exit_code"] = code
+
+    _report(name, code, start, verbose)
+    if code and abort:
+        click.echo(subprocess.CalledProcessError(code, command), err=True)
+        sys.exit(code)
+    return code
+
+
+def output(command, abort=True, shell=False, verbose=False, timeout=None) -> str:
+    """ Execute the command and return its standard output.
+
+    The standard error goes straight to the terminal.
+
+    Raises
+    ------
+    SystemExit
+        With the exit code if the command fails and `abort` is True. Otherwise
+        an empty string is returned.
     """
+    start = time.monotonic()
+    name = profiler.command_name(command)
+    if verbose:
+        click.echo(name)
+
+    lines = []
+    code = 0
     try:
-        if verbose:
-            click.echo(command)
-        subprocess.call(command, shell=shell)
+        for stream_name, line in stream(command, shell=shell, timeout=timeout):
+            if stream_name == "stderr":
+                sys.stderr.write(line)
+            else:
+                lines.append(line)
     except subprocess.CalledProcessError as e:
-        if abort:
-            click.echo(e)
-            sys.exit(e.returncode)
+        code = e.returncode
+    except subprocess.TimeoutExpired as e:
+        click.echo(e, err=True)
+        code = TIMEOUT_EXIT_CODE
+
+    _report(name, code, start, verbose)
+    if code and abort:
+        click.echo(subprocess.CalledProcessError(code, command), err=True)
+        sys.exit(code)
+    return "" if code else "".join(lines)
+
+
+def stream(command, shell=False, timeout=None, chunked=False):
+    """ Execute the command and yield its output line by line as it is written.
+
+    At most `MAX_QUEUED_LINES` lines are held in memory, so the output of a
+    command can be processed while it runs, whatever its size. The command is
+    killed when the generator is closed early.
 
+    >>> for stream_name, line in stream(["git", "log", "--oneline"]):
+    ...     print(stream_name, line, end="")
+    stdout 4974477 Rebase onto origin/<base> without switching branches
 
-def output(command, abort=True, shell=False, verbose=False) -> str:
-    """ Execute `subprocess.call`.
+    :param timeout: Seconds after which the command is killed. Defaults to
+        `default_timeout()`.
+    :param chunked: Yield the output as it arrives, in chunks of at most
+        `CHUNK_SIZE` bytes, instead of lines. Use this for output without
+        newlines, e.g. `git status -z`.
+    :return: Generator of ("stdout" or "stderr", line or chunk) tuples.
 
     Raises
     ------
     subprocess.CalledProcessError
-        If the commands fail and `abort` is True.
+        Once the output was read, if the command failed.
+    subprocess.TimeoutExpired
+        If the command ran longer than the timeout.
     """
-    try:
-        if verbose:
-            click.echo(command)
-        return subprocess.check_output(command).decode("utf-8")
-    except subprocess.CalledProcessError as e:
-        if abort:
-            click.echo(e)
-            sys.exit(e.returncode)
-        else:
-            return ""
+    import codecs
+    import queue
+    import threading
+
+    timeout = default_timeout() if timeout is None else timeout
+    deadline = None if timeout is None else time.monotonic() + timeout
+    name = profiler.command_name(command)
+    with profiler.span(profiler.SUBPROCESS, name) as details:
+        process = subprocess.Popen(
+            command,
+            shell=shell,
+            cwd=repos.directory() or None,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        lines = queue.Queue(maxsize=MAX_QUEUED_LINES)
+        pipes = [(process.stdout, "stdout"), (process.stderr, "stderr")]
+        readers = [
+            threading.Thread(
+                target=_read, args=(pipe, stream_name, lines, chunked), daemon=True
+            )
+            for pipe, stream_name in pipes
+        ]
+        # Chunks can end in the middle of a character.
+        decoders = {
+            stream_name: codecs.getincrementaldecoder("utf-8")(errors="replace")
+            for _, stream_name in pipes
+        }
+        for reader in readers:
+            reader.start()
+
+        size = 0
+        try:
+            open_pipes = len(readers)
+            while open_pipes:
+                stream_name, line = lines.get(timeout=_remaining(deadline))
+                if line is None:
+                    open_pipes -= 1
+                    line, final = b"", True
+                else:
+                    final = False
+                if stream_name == "stdout":
+                    size += len(line)
+                text = decoders[stream_name].decode(line, final=final)
+                if text:
+                    yield stream_name, text
+            code = process.wait(timeout=_remaining(deadline))
+        except (queue.Empty, subprocess.TimeoutExpired):
+            details["exit_code"] = TIMEOUT_EXIT_CODE
+            raise subprocess.TimeoutExpired(command, timeout) from None
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            # Unblock the readers so they see the end of the pipes and exit. A
+            # process started by the command can keep the pipes open, so don't
+            # wait for long.
+            drain_deadline = time.monotonic() + 1
+            while any(reader.is_alive() for reader in readers):
+                if time.monotonic() > drain_deadline:
+                    break
+                try:
+                    lines.get(timeout=0.01)
+                except queue.Empty:
+                    pass
+            else:
+                process.stdout.close()
+                process.stderr.close()
+            details["bytes"] = size
+
+        details["exit_code"] = code
+        if code:
+            raise subprocess.CalledProcessError(code, command)
+
+
+# Helpers
+
+
+def _read(pipe, stream_name: str, lines, chunked: bool = False):
+    """ Queue the lines or chunks of the pipe, then None once it is closed. """
+    read = (lambda: pipe.read1(CHUNK_SIZE)) if chunked else pipe.readline
+    for line in iter(read, b""):
+        lines.put((stream_name, line))
+    lines.put((stream_name, None))
+
+
+def _remaining(deadline):
+    return None if deadline is None else max(deadline - time.monotonic(), 0)
+
+
+def _report(name: str, code: int, start: float, verbose: bool):
+    if verbose:
+        seconds = time.monotonic() - start
+        click.echo(f"{name} exited with {code} in {seconds:.2f}s")
@@ -1,24 +1,108 @@
-import subprocess
 import os
 import click
+import collections
+import re
 import sys
 import shutil
+import subprocess
+import time
 
+from mgit import backends
 from mgit import execute
+from mgit import profiler
+from mgit import repos
+from mgit import state as repo_state
 from mgit import translator
 
 DEFAULT_BASE_BRANCHES = ["dev", "develop", "development", "master"]
+BACKENDS = {"files": backends.FileBackend, "subprocess": backends.SubprocessBackend}
+DEFAULT_BACKEND = "files"
+
+# Fields before the path in the records of `git status --porcelain=v2`, after
+# the first one: ordinary, renamed or copied, and unmerged.
+STATUS_FIELDS = {"1": 7, "2": 8, "u": 9}
+# Paths given to each `git add` when Git can't read them from its input.
+ADD_BATCH_SIZE = 1000
+
+# Flags of `git push --porcelain` for refs that are on the remote afterwards:
+# fast-forward, forced update, new ref and up to date.
+PUSHED_FLAGS = (" ", "+", "*", "=")
+# Size written by `git push --progress`, e.g. "Writing objects: 100% (3/3), 1.20 KiB".
+PUSHED_BYTES = re.compile(r"Writing objects: [^\r\n]*?, ([\d.]+) (bytes|KiB|MiB|GiB)")
+BYTE_UNITS = {"bytes": 1, "KiB": 1024, "MiB": 1024 ** 2, "GiB": 1024 ** 3}
+
+# Backend of each repo, keyed by the directory and the repo found from it.
+_backends = {}
+# Snapshot of each repo worked on, keyed by `repos.directory()`.
+_states = {}
+_version = None
+
+Change = collections.namedtuple("Change", ["code", "path", "original_path", "size"])
+Change.__doc__ = """
+A changed or untracked file, as reported by `git status`.
+
+- `code`: The status in the index and in the working tree, e.g. ".M" or "R.",
+  or "??" for untracked files.
+- `path`: Path relative to the top level of the repo.
+- `original_path`: The path before a rename or copy, or empty string.
+- `size`: Size in bytes in the working tree, 0 when deleted.
+"""
+
+
+def backend():
+    """
+    Get the backend used for read-only queries.
+
+    Set the `MGIT_GIT_BACKEND` environment variable to "subprocess" to always
+    run `git` instead of reading the .git folder.
+    """
+    directory = repos.directory()
+    location = repos.locate()
+    key = (directory, location)
+    if key not in _backends:
+        name = os.getenv("MGIT_GIT_BACKEND") or DEFAULT_BACKEND
+        if name != "files":
+            _backends[key] = BACKENDS[name](directory)
+        elif location:
+            _backends[key] = backends.FileBackend(
+                location.git_dir, location.common_dir, directory
+            )
+        else:
+            _backends[key] = backends.FileBackend(repos.path(backends.GIT_DIR))
+    return _backends[key]
+
+
+def state() -> repo_state.RepoState:
+    """ Get the snapshot of the current repo, shared by this invocation. """
+    directory = repos.directory()
+    if directory not in _states:
+        _states[directory] = repo_state.RepoState(backend())
+    return _states[directory]
+
+
+def invalidate():
+    """ Discard the repo snapshot after running a mutating Git command. """
+    _states.pop(repos.directory(), None)
+
+
+def version() -> tuple:
+    """ Get the version of Git, e.g. (2, 39, 5). """
+    global _version
+    if _version is None:
+        output = execute.output(["git", "--version"], abort=False) or ""
+        match = re.search(r"(\d+)\.(\d+)(?:\.(\d+))?", output)
+        _version = tuple(int(part or 0) for part in match.groups()) if match else ()
+    return _version
 
 
 def initialized() -> bool:
-    """ Determine if current directory is a Git repo. """
-    return os.path.isdir(".git")
+    """ Determine if the current directory is in a Git repo, at any depth. """
+    return repos.locate() is not None
 
 
 def current_branch() -> str:
     """ Get current branch for the current Git repo. """
-    output = subprocess.check_output(["git", "rev-parse", "--abbrev-ref", "HEAD"])
-    return str(output, "utf-8").strip("\n")
+    return state().current_branch
 
 
 def default_base_branch() -> str:
@@ -28,51 +112,265 @@ def default_base_branch() -> str:
             return branch
 
 
+def refs() -> set:
+    """ Get the names of all refs, e.g. "refs/heads/master". """
+    return state().refs
+
+
 def branch_exists(branch: str) -> bool:
     """ Check if the branch exists in the current Git repo. """
+    return state().ref_exists(branch)
+
+
+@profiler.profiled("git.create_branch")
+def create_branch(base_branch: str, new_branch: str, switch: bool = True) -> dict:
+    """
+    Create a new branch off the base branch on origin.
+
+    Only the base branch is fetched and the working tree is updated at most
+    once. The local base branch is used when it can't be fetched.
+
+    :param switch: Check out the new branch.
+    :return: The seconds spent on each step, e.g. {"fetch": 0.4, "checkout": 1.2}.
+    """
+    timings = {}
+    start = time.perf_counter()
+    start_point = fetch_base_branch(base_branch)
+    timings["fetch"] = time.perf_counter() - start
+
+    # Don't track the base branch, so pushing sets the upstream of the new branch.
+    start = time.perf_counter()
+    if switch:
+        command = ["git", "checkout", "--no-track", "-b", new_branch, start_point]
+    else:
+        command = ["git", "branch", "--no-track", new_branch, start_point]
+    execute.call(command, abort=False)
+    timings["checkout" if switch else "branch"] = time.perf_counter() - start
+
+    invalidate()
+    return timings
+
+
+@profiler.profiled("git.create_branches")
+def create_branches(base_branch: str, new_branches: list, update: bool = True) -> dict:
+    """
+    Create many branches off the base branch on origin without checking them
+    out, like `create_branch` with `switch=False`.
+
+    :param update: Fetch the base branch first. Pass False if
+        `fetch_base_branch` was already called.
+    :return: Whether each branch was created.
+    """
+    start_point = _start_point(base_branch, update)
+    results = {}
+    for new_branch in new_branches:
+        command = ["git", "branch", "--no-track", new_branch, start_point]
+        results[new_branch] = execute.call(command, abort=False) == 0
+
+    invalidate()
+    return results
+
+
+def fetch_base_branch(base_branch: str) -> str:
+    """
+    Fetch only the base branch from origin. Ignores errors.
+
+    :return: "origin/<base_branch>", or the local base branch if it can't be fetched.
+    """
+    if execute.call(["git", "fetch", "origin", base_branch], abort=False) == 0:
+        invalidate()
+        return f"origin/{base_branch}"
+    return base_branch
+
+
+@profiler.profiled("git.rebase")
+def rebase(
+    base_branch: str,
+    update: bool = True,
+    interactive: bool = False,
+    autostash: bool = True,
+    update_refs: bool = False,
+):
+    """
+    Rebase the current branch onto the base branch on origin, without
+    switching branches.
+
+    :param update: Fetch the base branch first. Pass False if
+        `fetch_base_branch` was already called.
+    :param interactive: Let the user edit the list of commits.
+    :param autostash: Stash local changes before and restore them after.
+    :param update_refs: Also move branches pointing at the rebased commits.
+        Ignored before Git 2.38.
+    :raises: subprocess.CalledProcessError if the rebase failed, e.g. on a
+        conflict. The repo is left mid-rebase for the user to resolve.
+    """
+    upstream = _start_point(base_branch, update)
+    command = ["git", "rebase"]
+    if interactive:
+        command.append("--interactive")
+    if autostash:
+        command.append("--autostash")
+    if update_refs and version() >= (2, 38):
+        command.append("--update-refs")
+    command.append(upstream)
+    code = execute.call(command, abort=False)
+    invalidate()
+    if code:
+        raise subprocess.CalledProcessError(code, command)
+
+
+@profiler.profiled("git.status")
+def status() -> list:
+    """
+    Get the changed and untracked files with one `git status`. Ignores errors.
+
+    The output is parsed while it is streamed, so the status of a large
+    working tree is never held twice in memory.
+
+    >>> status()
+    [Change(code='.M', path='README.md', original_path='', size=5120)]
+
+    :return: `Change` for each path.
+    """
+    command = ["git", "status", "--porcelain=v2", "-z", "--untracked-files=all"]
+    root = repos.root()
+    changes = []
+    records = _records(execute.stream(command, chunked=True))
     try:
-        subprocess.check_call(
-            ["git", "rev-parse", "--quiet", "--verify", branch],
-            stdout=subprocess.DEVNULL,
-        )
-        return True
-    except subprocess.CalledProcessError:
+        for record in records:
+            kind, _, rest = record.partition(" ")
+            if kind == "?":
+                code, path, original_path = "??", rest, ""
+            elif kind in STATUS_FIELDS:
+                fields = rest.split(" ", STATUS_FIELDS[kind])
+                code, path = fields[0], fields[-1]
+                original_path = next(records, "") if kind == "2" else ""
+            else:
+                continue
+            size = _file_size(os.path.join(root, path))
+            changes.append(Change(code, path, original_path, size))
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+        click.echo(e, err=True)
+    return changes
+
+
+def stage(paths: list):
+    """
+    Stage the paths, including deleted files. Ignores errors.
+
+    The paths are read by Git from its standard input, or passed in batches
+    of `ADD_BATCH_SIZE` before Git 2.26. They are relative to the current
+    directory and are never treated as patterns.
+    """
+    command = ["git", "--literal-pathspecs", "add", "--all"]
+    if version() >= (2, 26):
+        command += ["--pathspec-from-file=-", "--pathspec-file-nul"]
+        execute.call(command, abort=False, input="\0".join(paths))
+        return
+
+    for start in range(0, len(paths), ADD_BATCH_SIZE):
+        batch = paths[start : start + ADD_BATCH_SIZE]
+        execute.call(command + ["--"] + batch, abort=False)
+
+
+@profiler.profiled("git.commit_all")
+def commit_all(message: str, changes=None) -> bool:
+    """
+    Stage the changed files and commit them. Ignores errors.
+
+    Only the paths changed in the working tree are staged, so Git doesn't look
+    at the rest of it, and nothing runs when the repo is clean. The
+    message is passed on the standard input, so quotes are kept as they are.
+
+    :param changes: Result of `status`, if it was already called.
+    :return: Whether a commit was created.
+    """
+    if changes is None:
+        changes = status()
+    if not changes:
         return False
 
+    # Changes that are only in the index, like renames, are already staged.
+    paths = [change.path for change in changes if change.code[1] != "."]
+    with repos.inside(repos.root()):
+        if paths:
+            stage(paths)
+        command = ["git", "commit", "--file", "-"]
+        code = execute.call(command, abort=False, input=message)
+    invalidate()
+    return code == 0
+
 
-def create_branch(base_branch: str, new_branch: str):
-    """ Create a new branch off a base branch. """
-    subprocess.call(["git", "checkout", base_branch])
-    subprocess.call(["git", "pull"])
-    subprocess.call(["git", "checkout", "-b", new_branch])
+@profiler.profiled("git.push")
+def push(*branches, remote: str = "origin") -> dict:
+    """
+    Push the branches to the remote with a single `git push`. Ignores errors.
 
+    Branches are pushed with `--force-with-lease`, so a rebased branch is
+    updated but commits someone else pushed since the last fetch are not
+    overwritten. `--set-upstream` is only passed when a branch has no upstream
+    yet, which is read from the local config without contacting the remote.
 
-def rebase(base_branch: str):
-    """ Rebase off a base branch. """
-    subprocess.call(["git", "checkout", base_branch])
-    subprocess.call(["git", "pull"])
-    subprocess.call(["git", "checkout", "-"])
-    subprocess.call(["git", "rebase", "-i", base_branch])
+    >>> push("jir-1", "jir-2")
+    {'branches': {'jir-1': True, 'jir-2': False}, 'bytes': 1843, 'seconds': 0.82}
 
+    :param branches: Defaults to the current branch.
+    :return: Whether each branch was pushed, the bytes written and the seconds
+        spent.
+    """
+    branches = branches or (current_branch(),)
+    command = ["git", "push", "--porcelain", "--progress", "--force-with-lease"]
+    if not all(has_upstream(branch) for branch in branches):
+        command.append("--set-upstream")
+    command += [remote] + [f"{branch}:refs/heads/{branch}" for branch in branches]
 
-def commit_all(message: str):
-    """ Add all files and commit. Ignores errors. """
-    execute.call(["git", "add", "."], abort=False)
-    execute.call(f'git commit -m "{message}"', abort=False, shell=True)
+    start = time.perf_counter()
+    pushed = set()
+    size = 0
+    try:
+        for stream_name, line in execute.stream(command):
+            if stream_name == "stderr":
+                # Progress arrives one line per phase, so show its final state.
+                sys.stderr.write(line.rsplit("\r", 1)[-1])
+                size = _pushed_bytes(line, size)
+                continue
+            flag, _, refspec = line.partition("\t")
+            if flag in PUSHED_FLAGS and refspec:
+                pushed.add(refspec.partition(":")[2].split("\t")[0])
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+        click.echo(e, err=True)
+    invalidate()
+
+    return {
+        "branches": {branch: f"refs/heads/{branch}" in pushed for branch in branches},
+        "bytes": size,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def has_upstream(branch: str) -> bool:
+    """ Determine if the branch tracks a remote branch, from the local config. """
+    config = state().config
+    return bool(config(f"branch.{branch}.remote") and config(f"branch.{branch}.merge"))
 
 
-def push(branch=None):
-    """ Push the changes to the remote branch. Ignores errors. """
-    if not branch:
-        branch = default_base_branch()
+def hooks_directory() -> str:
+    """ Get the folder of the repo's hooks, `core.hooksPath` or `.git/hooks`. """
+    location = repos.locate()
+    hooks_path = state().config("core.hooksPath")
+    if hooks_path:
+        return os.path.join(location.top_level, os.path.expanduser(hooks_path))
+    return os.path.join(location.common_dir, "hooks")
 
-    execute.call(["git", "push", "-f"], abort=False)
-    execute.call(["git", "push", "--set-upstream", "origin", branch], abort=False)
+
+def remote_url(remote: str = "origin") -> str:
+    """ Get the URL of the remote or empty string. """
+    return state().config(f"remote.{remote}.url")
 
 
 def assignee() -> str:
     """ Get the assignee or empty string. """
-    return execute.output(["git", "config", "--global", "user.handle"], abort=False)
+    return state().config("user.handle", scope="global")
 
 
 # GitHub
@@ -83,10 +381,68 @@ def hub_installed() -> bool:
     return shutil.which("hub")
 
 
-def pull_request(base_branch: str, body: str):
-    """ Create a pull request on GitHub """
-    execute.call(
-        f'hub pull-request -fpo -b {base_branch} -m "{body}" -a {assignee()}',
-        shell=True,
-    )
+@profiler.profiled("git.pull_request")
+def pull_request(base_branch: str, body: str, assignee_handle=None, labels=()):
+    """
+    Create a pull request on GitHub
+
+    :param assignee_handle: The GitHub handle to assign. Defaults to `assignee()`.
+    :param labels: Names of the labels to add.
+    """
+    if assignee_handle is None:
+        assignee_handle = assignee()
+    command = ["hub", "pull-request", "-fpo", "-b", base_branch, "-m", body]
+    command += ["-a", assignee_handle]
+    if labels:
+        command += ["-l", ",".join(labels)]
+    execute.call(command)
+
+
+# Helpers
 
+
+def _start_point(base_branch: str, fetch: bool) -> str:
+    """ Get "origin/<base_branch>", or the local base branch if it is missing. """
+    if fetch:
+        return fetch_base_branch(base_branch)
+    if branch_exists(f"origin/{base_branch}"):
+        return f"origin/{base_branch}"
+    return base_branch
+
+
+def _pushed_bytes(line: str, default: int) -> int:
+    """ Get the size from the last progress update in the line, or the default. """
+    matches = PUSHED_BYTES.findall(line)
+    if not matches:
+        return default
+    number, unit = matches[-1]
+    return int(float(number) * BYTE_UNITS[unit])
+
+
+def _records(chunks):
+    """
+    Split the chunks of `-z` output into NUL terminated records. The record
+    at the end of a chunk is completed by the next ones.
+    """
+    pending = ""
+    for stream_name, chunk in chunks:
+        if stream_name == "stderr":
+            sys.stderr.write(chunk)
+            continue
+        start = 0
+        end = chunk.find("\0")
+        while end != -1:
+            yield pending + chunk[start:end]
+            pending = ""
+            start = end + 1
+            end = chunk.find("\0", start)
+        pending += chunk[start:]
+    if pending:
+        yield pending
+
+
+def _file_size(path: str) -> int:
+    try:
+        return os.lstat(path).st_size
+    except OSError:
+        return 0
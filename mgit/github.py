@@ -0,0 +1,111 @@
+import os
+import re
+
+from mgit import issues
+
+DEFAULT_API = "https://api.github.com"
+
+# "owner/repo" in GitHub API and remote URLs.
+API_REPOSITORY = re.compile(r"/repos/(?P<repo>[^/]+/[^/]+)")
+REMOTE_REPOSITORY = re.compile(r"github\.com[:/](?P<repo>[^/]+/[^/]+?)(?:\.git)?/?$")
+
+
+def api_url() -> str:
+    """ Get the GitHub API URL. Set `MGIT_GITHUB_API` for GitHub Enterprise. """
+    return (os.getenv("MGIT_GITHUB_API") or DEFAULT_API).rstrip("/")
+
+
+def token() -> str:
+    """ Get the GitHub API token or empty string. """
+    return os.getenv("MGIT_GITHUB_API_TOKEN") or os.getenv("GITHUB_TOKEN") or ""
+
+
+def repository(config, remote_url: str = "") -> str:
+    """
+    Get the "owner/repo" name of the GitHub repo or empty string.
+
+    The name is taken from the issue tracker API URL when GitHub tracks the
+    issues, and from the remote URL otherwise.
+
+    >>> repository(config, "git@github.com:greganswer/mgit.git")
+    greganswer/mgit
+    """
+    if config.issue_tracker_is_github:
+        match = API_REPOSITORY.search(config.issue_tracker_api)
+        if match:
+            return match.group("repo")
+
+    match = REMOTE_REPOSITORY.search(remote_url or "")
+    return match.group("repo") if match else ""
+
+
+def create_pull_request(
+    repo: str,
+    base_branch: str,
+    branch: str,
+    title: str,
+    body: str = "",
+    assignees=(),
+    labels=(),
+    tracker_client=None,
+) -> dict:
+    """
+    Create a pull request, then set its assignees and labels in one more request.
+
+    :param repo: The "owner/repo" name.
+    :param tracker_client: `issues.IssueTrackerClient` object. Defaults to the
+        shared one, so the connection to GitHub is reused.
+    :return: The pull request from the GitHub API, e.g. its "number" and "html_url".
+    :raises: requests.exceptions.HTTPError, requests.exceptions.Timeout
+    """
+    tracker_client = tracker_client or issues.client()
+    url = f"{api_url()}/repos/{repo}"
+    headers = {
+        "Accept": "application/vnd.github+json",
+        "Authorization": f"token {token()}",
+    }
+
+    res = tracker_client.request(
+        "POST",
+        f"{url}/pulls",
+        json={"title": title, "head": branch, "base": base_branch, "body": body},
+        headers=headers,
+    )
+    _raise_for_status(res)
+    pull = res.json()
+
+    values = {}
+    assignees = [assignee for assignee in assignees if assignee]
+    if assignees:
+        values["assignees"] = assignees
+    if labels:
+        values["labels"] = list(labels)
+    if values:
+        res = tracker_client.request(
+            "PATCH", f"{url}/issues/{pull['number']}", json=values, headers=headers
+        )
+        _raise_for_status(res)
+
+    return pull
+
+
+# Helpers
+
+
+def _raise_for_status(res):
+    """ Raise an HTTPError that includes GitHub's explanation, if any. """
+    import requests
+
+    try:
+        res.raise_for_status()
+    except requests.exceptions.HTTPError as e:
+        try:
+            data = res.json()
+        except ValueError:
+            raise e
+        messages = [data.get("message", "")] + [
+            error.get("message", "") if isinstance(error, dict) else str(error)
+            for error in data.get("errors", [])
+        ]
+        details = "; ".join(message for message in messages if message)
+        raise requests.exceptions.HTTPError(f"{e}: {details}", response=res) from None
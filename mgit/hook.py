@@ -0,0 +1,178 @@
+"""
+`prepare-commit-msg` Git hook that starts the commit message with the issue ID
+and title of the current branch, e.g. "JIR-123: Update Readme File".
+
+Git runs the hook on every commit, including the ones made by IDEs, so the
+hook only imports `os` and `sys` and runs Python without the site module. The
+branch is read from the HEAD file and the message from the completion index
+in the cache directory, see `mgit.complete`. Nothing is fetched: when the
+branch isn't in the index yet, the title is taken from the issue cache or the
+branch name, and the index is rebuilt in the background.
+
+>>> install("/srv/app/.git/hooks")
+'/srv/app/.git/hooks/prepare-commit-msg'
+"""
+import os
+import sys
+
+NAME = "prepare-commit-msg"
+# Marks the hooks written by `install`, which can be overwritten.
+MARKER = "# Installed by `mgit hooks install`."
+# The module is run as a file, `python -m` takes a few milliseconds more.
+SCRIPT = """#!/bin/sh
+{marker}
+exec "{python}" -S "{module}" "$@"
+"""
+# Messages given with -m, -F, -c or by merges and squashes are left alone.
+FILLED_SOURCES = ["", "template"]
+
+
+def install(directory: str, force: bool = False) -> str:
+    """
+    Write the hook to the hooks folder of the repo.
+
+    :param directory: The hooks folder, see `git.hooks_directory`.
+    :param force: Replace a hook that was not installed by mgit.
+    :return: The path of the hook.
+    :raises: FileExistsError if another hook is installed.
+    """
+    hook_path = os.path.join(directory, NAME)
+    try:
+        with open(hook_path) as infile:
+            installed = infile.read()
+    except OSError:
+        installed = ""
+    if installed and MARKER not in installed and not force:
+        raise FileExistsError(hook_path)
+
+    module = os.path.abspath(__file__)
+    script = SCRIPT.format(marker=MARKER, python=sys.executable, module=module)
+    os.makedirs(directory, exist_ok=True)
+    with open(hook_path, "w") as outfile:
+        outfile.write(script)
+    os.chmod(hook_path, 0o755)
+    return hook_path
+
+
+def main(argv: list) -> int:
+    """
+    Fill the commit message file when Git didn't get a message.
+
+    :param argv: The arguments Git passes to the hook: the message file, then
+        the source of the message and a commit hash when there are any.
+    :return: The exit code, always 0 so the hook never blocks a commit.
+    """
+    message_path, source = argv[0], argv[1] if len(argv) > 1 else ""
+    if source not in FILLED_SOURCES:
+        return 0
+
+    try:
+        with open(message_path) as infile:
+            lines = infile.read().splitlines(keepends=True)
+        written = [line for line in lines if line.strip() and line[0] != "#"]
+        if written and source != "template":
+            return 0
+
+        git_dir, common_dir = _git_dirs()
+        message = branch_message(current_branch(git_dir), common_dir)
+        if message:
+            with open(message_path, "w") as outfile:
+                outfile.write("".join([f"{message}\n"] + lines))
+    except Exception as e:
+        print(f"mgit: {NAME} hook failed: {e}", file=sys.stderr)
+    return 0
+
+
+def current_branch(git_dir: str) -> str:
+    """ Get the branch checked out in the Git folder, or empty string. """
+    with open(os.path.join(git_dir, "HEAD")) as infile:
+        head = infile.read().strip()
+    prefix = "ref: refs/heads/"
+    return head[len(prefix) :] if head.startswith(prefix) else ""
+
+
+def branch_message(branch: str, common_dir: str) -> str:
+    """
+    Get the message for the branch, e.g. "JIR-123: Update Readme File", or
+    empty string if its name has no issue ID.
+    """
+    if not branch:
+        return ""
+
+    cache_dir = os.getenv("MGIT_CACHE_DIR") or os.path.join(common_dir, "mgit")
+    index_path = os.path.join(cache_dir, "completion.tsv")
+    if _mtime(index_path) >= _mtime(os.path.join(cache_dir, "issues.json")):
+        prefix = f"branch\t{branch}\t"
+        try:
+            with open(index_path) as infile:
+                for line in infile:
+                    if line.startswith(prefix):
+                        return line[len(prefix) :].rstrip("\n")
+        except OSError:
+            pass
+    return _uncached_message(branch)
+
+
+# Helpers
+
+
+def _git_dirs():
+    """
+    Get the Git folder and the one shared by the worktrees. Git runs hooks at
+    the top level of the worktree and exports GIT_DIR in some cases.
+    """
+    git_dir = os.getenv("GIT_DIR") or ".git"
+    if os.path.isfile(git_dir):
+        with open(git_dir) as infile:
+            content = infile.read().strip()
+        if content.startswith("gitdir: "):
+            linked_dir = content[len("gitdir: ") :]
+            git_dir = os.path.join(os.path.dirname(git_dir), linked_dir)
+    git_dir = os.path.abspath(git_dir)
+
+    try:
+        with open(os.path.join(git_dir, "commondir")) as infile:
+            common_dir = os.path.join(git_dir, infile.read().strip())
+    except OSError:
+        common_dir = git_dir
+    return git_dir, os.path.normpath(common_dir)
+
+
+def _uncached_message(branch: str) -> str:
+    """
+    Get the message of a branch that isn't in the completion index, and
+    rebuild the index so the next commit finds it.
+    """
+    # The hook runs with `python -S`; add site-packages back for inflection.
+    if sys.flags.no_site:
+        import site
+
+        site.main()
+
+    from mgit import cache
+    from mgit import complete
+    from mgit import configs
+    from mgit import issues
+
+    complete.start_rebuild()
+    config = configs.settings()
+    issue = issues.from_branch(branch, config)
+    if not issue.id:
+        return ""
+
+    issue_cache = cache.IssueCache.from_config(config)
+    return str(issues.from_cache(issue.id, config, issue_cache) or issue)
+
+
+def _mtime(path: str) -> float:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return 0
+
+
+if __name__ == "__main__":
+    # Import mgit from the folder above, not the modules next to this file.
+    if sys.path[0] == os.path.dirname(os.path.abspath(__file__)):
+        sys.path[0] = os.path.dirname(sys.path[0])
+    sys.exit(main(sys.argv[1:]))
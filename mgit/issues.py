@@ -1,19 +1,47 @@
+import functools
 import inflection
-import requests
-import os
+import re
+import threading
+import time
 
 from mgit import configs
+from mgit import profiler
+from mgit import trackers
+
+# Maximum number of concurrent requests to the issue tracker.
+DEFAULT_JOBS = 8
+
+# Seconds to wait for a connection and for a response from the issue tracker.
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 10
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+MAX_RETRY_DELAY = 30
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+
+# Issue ID after an optional prefix like "feature/", then the summary.
+BRANCH_FORMAT = r"(?:^|[-/_])(?P<id>{key})(?:-(?P<summary>.*))?$"
+BRANCH_PREFIXES = ["refs/heads/", "refs/remotes/"]
+
+# Requests that can be sent again after a failure without side effects.
+IDEMPOTENT_METHODS = ["GET", "HEAD", "OPTIONS", "PUT", "DELETE"]
+
+# Clients shared by this process, one per (timeout, retries) settings.
+_clients = {}
 
 
 class Issue:
-    def __init__(self, id: str = "", summary: str = "", config=configs.Config()):
+    def __init__(self, id: str = "", summary: str = "", config=None):
         """
         :param id: Issue ID.
         :param summary: Issue summary.
+        :param config: `configs.Settings` object. Defaults to the current settings.
         """
         self._id = id.upper()
         self._summary = summary
         self._config = config
+        self._branch_name = None
+        self._title = None
 
     def __str__(self) -> str:
         """
@@ -38,7 +66,9 @@ class Issue:
         >>> Issue(id='jir-123', summary='Update readme.md file').branch_name()
         jir-123-update-readme-file
         """
-        return inflection.parameterize(f"{self._id} {self._summary}")
+        if self._branch_name is None:
+            self._branch_name = inflection.parameterize(f"{self._id} {self._summary}")
+        return self._branch_name
 
     @property
     def title(self) -> str:
@@ -48,60 +78,385 @@ class Issue:
         >>> Issue(summary='Update readme.md file')
         Update Readme.Md File
         """
-        return inflection.titleize(self._summary)
+        if self._title is None:
+            self._title = inflection.titleize(self._summary)
+        return self._title
 
     @property
     def url(self) -> str:
         """
         Return the URL for this issue
 
-        >>> config = configs.Config({"issue_tracker_api": "http://example.com/"})
+        >>> config = configs.Settings(issue_tracker_api="http://example.com/")
         >>> Issue(id=7, config=config).url
         http://example.com/7
         """
-        return f"{self._config.issue_tracker_api}/{self._id}"
+        config = self._config or configs.settings()
+        return f"{config.issue_tracker_api}/{self._id}"
+
+
+class IssueTrackerClient:
+    def __init__(
+        self,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff: float = DEFAULT_BACKOFF,
+        pool_size: int = DEFAULT_JOBS,
+    ):
+        """
+        HTTP client for the issue tracker API.
+
+        Connections are kept alive in a pool shared by every request. Failed
+        connections and rate limited or unavailable responses are retried with
+        exponential backoff, honoring the `Retry-After` and GitHub's
+        `X-RateLimit-*` headers.
+
+        :param connect_timeout: Seconds to wait for a connection.
+        :param read_timeout: Seconds to wait for a response.
+        :param max_retries: Number of times a request is retried.
+        :param backoff: Seconds to wait before the first retry, doubled each time.
+        :param pool_size: Number of connections kept alive per host.
+        """
+        self._timeout = (connect_timeout, read_timeout)
+        self._max_retries = max_retries
+        self._backoff = backoff
+        self._pool_size = pool_size
+        self._session = None
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "retries": 0, "seconds": 0.0}
+
+    @classmethod
+    def from_config(cls, config):
+        """ Create a client using the timeout and retry values from the mgit config. """
+        return cls(**_client_options(config))
+
+    @property
+    def session(self):
+        """ Lazy load the `requests.Session` and its connection pool. """
+        if self._session is None:
+            import requests
+
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=1, pool_maxsize=self._pool_size
+            )
+            self._session = requests.Session()
+            self._session.mount("https://", adapter)
+            self._session.mount("http://", adapter)
+        return self._session
+
+    @property
+    def stats(self) -> dict:
+        """ Get the number of requests and retries and the time spent on them. """
+        with self._lock:
+            return dict(self._stats)
+
+    def get(self, url: str, **kwargs):
+        """
+        Make a GET request, retrying connection errors and retryable responses.
 
+        :raises: requests.exceptions.ConnectionError, requests.exceptions.Timeout
+        """
+        return self.request("GET", url, **kwargs)
 
-def from_branch(name: str, config=configs.Config()) -> Issue:
+    def request(self, method: str, url: str, **kwargs):
+        """
+        Make a request over the pooled session.
+
+        Requests that are not idempotent, e.g. POST, are only retried when the
+        response says they were rate limited, so they are never applied twice.
+
+        :raises: requests.exceptions.ConnectionError, requests.exceptions.Timeout
+        """
+        import requests
+
+        method = method.upper()
+        send = getattr(self.session, method.lower())
+        for attempt in range(self._max_retries + 1):
+            start = time.monotonic()
+            try:
+                with profiler.span(profiler.HTTP, f"{method} {url}") as details:
+                    details["attempt"] = attempt + 1
+                    res = send(url, timeout=self._timeout, **kwargs)
+                    if profiler.enabled():
+                        details["status"] = res.status_code
+                        details["bytes"] = _content_length(res)
+            except requests.exceptions.ConnectionError:
+                if attempt == self._max_retries or method not in IDEMPOTENT_METHODS:
+                    raise
+                delay = self._backoff * 2 ** attempt
+            else:
+                delay = self._retry_delay(res, attempt, method)
+                if delay is None or attempt == self._max_retries:
+                    return res
+            finally:
+                self._count("requests", 1)
+                self._count("seconds", time.monotonic() - start)
+
+            self._count("retries", 1)
+            time.sleep(delay)
+
+    # Helpers
+
+    def _retry_delay(self, res, attempt: int, method: str = "GET"):
+        """ Get the seconds to wait before retrying the response, or None. """
+        headers = res.headers or {}
+        rate_limited = res.status_code in (403, 429) and (
+            headers.get("X-RateLimit-Remaining") == "0"
+        )
+        if res.status_code not in RETRY_STATUS_CODES and not rate_limited:
+            return None
+        throttled = rate_limited or res.status_code == 429
+        if method not in IDEMPOTENT_METHODS and not throttled:
+            return None
+
+        delay = self._backoff * 2 ** attempt
+        try:
+            if headers.get("Retry-After"):
+                delay = _seconds_until(headers["Retry-After"])
+            elif rate_limited and headers.get("X-RateLimit-Reset"):
+                delay = float(headers["X-RateLimit-Reset"]) - time.time()
+        except (TypeError, ValueError):
+            # A malformed header, keep the exponential backoff.
+            pass
+
+        # Don't block the CLI for long, let the error surface instead.
+        if delay > MAX_RETRY_DELAY:
+            return None
+        return max(delay, 0)
+
+    def _count(self, stat: str, value):
+        with self._lock:
+            self._stats[stat] += value
+
+
+def client(config=None) -> IssueTrackerClient:
+    """
+    Get the client shared by the requests of this process that use the same
+    timeout and retry settings, e.g. those of every repo in the daemon.
     """
-    Create an issue from the branch name. Uses O(n) time and space.
+    options = _client_options(config or configs.settings())
+    key = tuple(sorted(options.items()))
+    if key not in _clients:
+        _clients[key] = IssueTrackerClient(**options)
+    return _clients[key]
 
-    :raises: ValueError if branch name does not contain an ID.
+
+def from_branch(name: str, config=None) -> Issue:
+    """
+    Create an issue from the branch name using the configured issue key format.
 
     >>> from_branch('jir-123-update-readme-file')
     JIR-123: Update Readme File
+    >>> from_branch('feature/2fa-jir-123-update-readme-file')
+    JIR-123: Update Readme File
+    """
+    config = config or configs.settings()
+    match = branch_pattern(config.issue_key_format).search(name)
+    if not match:
+        return Issue(config=config)
+
+    summary = (match.group("summary") or "").replace("-", " ")
+    return Issue(id=match.group("id"), summary=summary, config=config)
+
+
+@functools.lru_cache(maxsize=None)
+def branch_pattern(key_format: str):
+    """ Compile the pattern matching branch names for the issue key format. """
+    return re.compile(BRANCH_FORMAT.format(key=f"(?:{key_format})"), re.IGNORECASE)
+
+
+def branch_index(refs, config=None) -> dict:
     """
-    parts = name.split("-")
-    for index, part in enumerate(parts):
-        if part.isdigit():
-            id = "-".join(parts[: index + 1])
-            summary = " ".join(parts[index + 1 :])
-            return Issue(id=id, summary=summary, config=config)
+    Map every local and remote branch to the issue ID in its name.
 
-    return Issue(config=config)
+    :param refs: Ref names, e.g. "refs/heads/jir-123-update-readme-file".
+    :return: Issue ID for each short branch name, e.g. "origin/jir-123-update".
+        Branches without an issue ID are left out.
+    """
+    config = config or configs.settings()
+    search = branch_pattern(config.issue_key_format).search
+    index = {}
+    for ref in refs:
+        for prefix in BRANCH_PREFIXES:
+            if ref.startswith(prefix):
+                branch = ref[len(prefix) :]
+                match = search(branch)
+                if match and not branch.endswith("/HEAD"):
+                    index[branch] = match.group("id").upper()
+                break
+    return index
 
 
-def from_tracker(issue_id: str, config=configs.Config()) -> Issue:
+@profiler.profiled("issues.from_tracker")
+def from_tracker(issue_id: str, config=None, cache=None, tracker_client=None) -> Issue:
     """ Create an issue by making an HTTP request to the issue tracker API.
-    
-    :raises: requests.exceptions.HTTPError
+
+    When a cache is given, fresh entries are used without a request and stale
+    entries are revalidated with a conditional request. A 304 response counts
+    as a cache hit. Stale entries are also used when the tracker can't be
+    reached, so cached issues work offline. Local trackers are never cached.
+
+    :param issue_id: Issue ID.
+    :param config: `configs.Settings` object. Defaults to the current settings.
+    :param cache: Optional `cache.IssueCache` object.
+    :param tracker_client: `IssueTrackerClient` object. Defaults to the shared one.
+    :raises: requests.exceptions.HTTPError, requests.exceptions.Timeout,
+        trackers.IssueNotFound
     """
-    res = requests.get(
-        f"{config.issue_tracker_api.strip('/')}/{issue_id}",
-        auth=_auth_values(config),
-        headers={"content-type": "application/json"},
-    )
+    import requests
+
+    config = config or configs.settings()
+    tracker = trackers.for_config(config, tracker_client or client(config))
+    if not tracker.remote:
+        return Issue(issue_id, tracker.get(issue_id), config)
+
+    url = _cache_key(tracker, issue_id)
+    entry = cache.get(url) if cache else None
+    headers = {}
+    if entry:
+        if cache.fresh(entry):
+            cache.hit(url)
+            return Issue(issue_id, entry["summary"], config)
+        headers.update(cache.validators(entry))
+
+    try:
+        res = tracker.fetch(issue_id, headers=headers)
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+        if not entry:
+            raise
+        cache.hit(url)
+        return Issue(issue_id, entry["summary"], config)
+
+    if entry and res.status_code == 304:
+        cache.revalidated(url)
+        return Issue(issue_id, entry["summary"], config)
 
     res.raise_for_status()
-    summary = res.json().get("title", "")
+    summary = tracker.summary(res.json())
+    if cache:
+        cache.store(url, summary, res.headers)
 
-    return Issue(issue_id, summary)
+    return Issue(issue_id, summary, config)
 
 
-def _auth_values(config):
-    if config.issue_tracker_is_github and os.getenv("MGIT_GITHUB_USERNAME"):
-        return (
-            os.getenv("MGIT_GITHUB_USERNAME"),
-            os.getenv("MGIT_GITHUB_API_TOKEN"),
-        )
-    return None
+def from_cache(issue_id: str, config=None, cache=None):
+    """ Get the issue from the cache regardless of its age, or None. """
+    config = config or configs.settings()
+    tracker = trackers.for_config(config)
+    entry = cache.get(_cache_key(tracker, issue_id)) if cache else None
+    if entry is None:
+        return None
+    return Issue(issue_id, entry["summary"], config)
+
+
+def from_tracker_many(
+    issue_ids: list, config=None, cache=None, jobs: int = DEFAULT_JOBS
+) -> dict:
+    """
+    Create many issues with as few requests to the issue tracker as possible.
+
+    Fresh cache entries are used first. The other issues are requested with
+    the tracker's batch lookup, e.g. one GraphQL query or JQL search per 100
+    issues, and stored with a single cache write. Issues the batch didn't
+    return, or all of them if the batch failed, are then requested one by
+    one, concurrently, with `from_tracker`.
+
+    :param issue_ids: Issue IDs.
+    :param config: `configs.Settings` object. Defaults to the current settings.
+    :param cache: Optional `cache.IssueCache` object.
+    :param jobs: Maximum number of concurrent requests.
+    :return: Issue or exception for each issue ID, in the given order.
+    """
+    import requests
+    from concurrent.futures import ThreadPoolExecutor
+
+    # Resolve the config and the client before they are shared between threads.
+    config = config or configs.settings()
+    tracker_client = client(config)
+    tracker = trackers.for_config(config, tracker_client)
+
+    results = {}
+    if cache and tracker.remote:
+        hits = []
+        for issue_id in issue_ids:
+            url = _cache_key(tracker, issue_id)
+            entry = cache.get(url)
+            if entry and cache.fresh(entry):
+                hits.append(url)
+                results[issue_id] = Issue(issue_id, entry["summary"], config)
+        if hits:
+            cache.hit_many(hits)
+
+    remaining = [issue_id for issue_id in issue_ids if issue_id not in results]
+    if len(remaining) > 1:
+        try:
+            with profiler.span(profiler.STEP, "issues.get_many") as details:
+                summaries = tracker.get_many(remaining)
+                details["issues"] = len(summaries)
+        except (requests.exceptions.RequestException, trackers.IssueNotFound):
+            summaries = {}
+
+        found = {}
+        for issue_id in remaining:
+            summary = summaries.get(issue_id, summaries.get(issue_id.upper()))
+            if summary is not None:
+                found[_cache_key(tracker, issue_id)] = summary
+                results[issue_id] = Issue(issue_id, summary, config)
+        if cache and tracker.remote:
+            cache.store_many(found)
+
+    remaining = [issue_id for issue_id in issue_ids if issue_id not in results]
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        futures = {
+            issue_id: executor.submit(
+                from_tracker, issue_id, config, cache, tracker_client
+            )
+            for issue_id in remaining
+        }
+
+    for issue_id, future in futures.items():
+        try:
+            results[issue_id] = future.result()
+        except (requests.exceptions.RequestException, trackers.IssueNotFound) as e:
+            results[issue_id] = e
+    return {issue_id: results[issue_id] for issue_id in issue_ids}
+
+
+def _client_options(config) -> dict:
+    max_retries = config.max_retries
+    return {
+        "connect_timeout": float(config.connect_timeout or DEFAULT_CONNECT_TIMEOUT),
+        "read_timeout": float(config.read_timeout or DEFAULT_READ_TIMEOUT),
+        "max_retries": DEFAULT_MAX_RETRIES if max_retries is None else int(max_retries),
+    }
+
+
+def _cache_key(tracker, issue_id: str) -> str:
+    """
+    Get the cache key of the issue. IDs are upper cased, so "jir-123" and
+    "JIR-123" share an entry.
+    """
+    return tracker.issue_url(issue_id.upper())
+
+
+def _content_length(res) -> int:
+    """ Get the size of the response body without reading streamed bodies. """
+    headers = res.headers or {}
+    if headers.get("Content-Length"):
+        return int(headers["Content-Length"])
+    return len(res.content or b"")
+
+
+def _seconds_until(retry_after: str) -> float:
+    """
+    Parse a `Retry-After` header, which is either seconds or an HTTP date.
+
+    :raises: ValueError or TypeError if it is neither.
+    """
+    try:
+        return float(retry_after)
+    except ValueError:
+        from email.utils import parsedate_to_datetime
+
+        return parsedate_to_datetime(retry_after).timestamp() - time.time()
@@ -0,0 +1,328 @@
+"""
+Durable queue of issue tracker updates, e.g. comments and transitions.
+
+Commands append updates to a journal and return right away. A detached worker
+sends them to the tracker in the background, so `mgit commit` and `mgit pr`
+take as long with a slow or unreachable tracker as with a fast one.
+
+The journal is `outbox.jsonl` in the cache directory, `.git/mgit` by default.
+It is only appended to, one event per line:
+
+- {"event": "queued", "key": "…", "action": "transition", "issue_id": "JIR-1",
+  "value": "In Review", "at": 1700000000.0}
+- {"event": "failed", "key": "…", "error": "…", "attempt": 1, "retry_at": …}
+- {"event": "sent", "key": "…", "at": …}
+
+Every update has a unique key and is marked as sent as soon as the tracker
+accepts it. If the worker stops in between, the update is sent again: a
+transition to the state the issue is in changes nothing, and comments carry
+their key, hidden, so the trackers skip a comment that was already posted.
+The journal is compacted once the updates in it were sent.
+
+>>> enqueue("transition", "JIR-1", "In Review")
+'5b0f0c6e4a1d4ce0a0a4e2d5c7b3f9e1'
+>>> start_worker()
+"""
+import contextlib
+import fcntl
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+from mgit import cache
+from mgit import repos
+
+FILENAME = "outbox.jsonl"
+LOCK_FILENAME = "outbox.lock"
+WORKER_LOCK_FILENAME = "outbox.worker.lock"
+ACTIONS = ["comment", "transition"]
+
+# Attempts made before an update is left for `mgit outbox flush`.
+MAX_ATTEMPTS = 5
+# Seconds before the first retry, doubled after every failed attempt.
+BACKOFF = 15
+# Seconds a worker keeps waiting for retries before it exits. The next command
+# that queues an update starts a new one.
+MAX_WORKER_SECONDS = 10 * 60
+
+
+def path() -> str:
+    """ Get the path of the journal of the current repo. """
+    return os.path.join(cache.directory(), FILENAME)
+
+
+def enqueue(action: str, issue_id: str, value: str) -> str:
+    """
+    Add an update to the journal. Nothing is sent to the tracker.
+
+    :param action: One of `ACTIONS`.
+    :param value: The body of the comment or the name of the state.
+    :return: The key of the update.
+    :raises: ValueError if the action is unknown.
+    """
+    if action not in ACTIONS:
+        raise ValueError(f"Unknown issue update: {action}")
+
+    key = uuid.uuid4().hex
+    event = {"event": "queued", "key": key, "action": action}
+    event.update(issue_id=issue_id, value=value, at=time.time())
+    _append([event])
+    return key
+
+
+def updates() -> list:
+    """
+    Get the updates that were not sent yet, oldest first.
+
+    Each update is the "queued" event with the number of `attempts` made, the
+    last `error` and when it can be retried, `retry_at`.
+    """
+    pending = {}
+    for event in _events():
+        key = event.get("key")
+        if event.get("event") == "queued":
+            pending[key] = dict(event, attempts=0, error="", retry_at=0)
+        elif key in pending and event.get("event") == "sent":
+            del pending[key]
+        elif key in pending and event.get("event") == "failed":
+            pending[key].update(
+                attempts=event["attempt"],
+                error=event.get("error", ""),
+                retry_at=event.get("retry_at", 0),
+            )
+    return list(pending.values())
+
+
+def due(update: dict, now=None) -> bool:
+    """ Determine if the worker should send the update now. """
+    now = time.time() if now is None else now
+    return update["attempts"] < MAX_ATTEMPTS and update["retry_at"] <= now
+
+
+def stats() -> dict:
+    """ Get the number of updates waiting and given up on, and the oldest one. """
+    pending = updates()
+    failed = [update for update in pending if update["attempts"] >= MAX_ATTEMPTS]
+    oldest = min((update["at"] for update in pending), default=None)
+    return {
+        "path": path(),
+        "pending": len(pending) - len(failed),
+        "failed": len(failed),
+        "oldest": None if oldest is None else time.time() - oldest,
+        "worker": worker_running(),
+    }
+
+
+def flush(tracker, force: bool = False, wait: bool = False):
+    """
+    Send the updates that are due to the tracker, oldest first.
+
+    Only the last transition queued for an issue is sent; the earlier ones are
+    marked as sent. Updates that fail are retried later with exponential
+    backoff, or given up on if the tracker rejected them.
+
+    :param tracker: `trackers.Tracker` of the repo.
+    :param force: Also send updates that are waiting for a retry or were given
+        up on.
+    :param wait: Wait for a running worker instead of returning None.
+    :return: The number of updates "sent" and "failed", or None if another
+        process is sending them.
+    """
+    with _lock(WORKER_LOCK_FILENAME, blocking=wait) as locked:
+        if not locked:
+            return None
+
+        counts = {"sent": 0, "failed": 0}
+        pending = [update for update in updates() if force or due(update)]
+        last_transitions = {
+            update["issue_id"].upper(): update["key"]
+            for update in pending
+            if update["action"] == "transition"
+        }
+        for update in pending:
+            superseded = (
+                update["action"] == "transition"
+                and last_transitions[update["issue_id"].upper()] != update["key"]
+            )
+            if superseded:
+                _append([{"event": "sent", "key": update["key"], "at": time.time()}])
+                continue
+
+            event = _send(tracker, update)
+            _append([event])
+            counts[event["event"]] += 1
+
+        _compact()
+        return counts
+
+
+def next_retry():
+    """ Get the seconds until an update is due, or None if none will be. """
+    now = time.time()
+    retries = [
+        max(update["retry_at"] - now, 0)
+        for update in updates()
+        if update["attempts"] < MAX_ATTEMPTS
+    ]
+    return min(retries, default=None)
+
+
+def work(max_seconds: float = MAX_WORKER_SECONDS):
+    """
+    Send the updates of the current repo until none are left or due soon.
+
+    Returns right away if another worker is running. It picks up the updates
+    queued while it works.
+    """
+    from mgit import configs
+    from mgit import issues
+    from mgit import trackers
+
+    config = configs.settings()
+    tracker = trackers.for_config(config, issues.client(config))
+    deadline = time.monotonic() + max_seconds
+    while time.monotonic() < deadline:
+        if flush(tracker) is None:
+            return
+        # Look again once the lock is released, in case a worker started in
+        # the meantime gave up because this one was running.
+        delay = next_retry()
+        if delay is None:
+            return
+        time.sleep(min(max(delay, 0.1), max(deadline - time.monotonic(), 0)))
+
+
+def start_worker():
+    """ Start a detached process that sends the updates of the current repo. """
+    # The worker runs in the repo, so make sure this copy of mgit is imported.
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    python_path = os.pathsep.join(filter(None, [package_root, os.getenv("PYTHONPATH")]))
+    subprocess.Popen(
+        [sys.executable, "-m", "mgit.outbox"],
+        cwd=repos.directory() or None,
+        env=dict(os.environ, PYTHONPATH=python_path),
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def worker_running() -> bool:
+    """ Determine if a worker is sending the updates of the current repo. """
+    with _lock(WORKER_LOCK_FILENAME, blocking=False) as locked:
+        return not locked
+
+
+# Helpers
+
+
+def _send(tracker, update: dict) -> dict:
+    """ Send the update and get the "sent" or "failed" event to record. """
+    import requests
+
+    send = getattr(tracker, update["action"], None)
+    if send is None:
+        # The settings reject updates for such trackers, but the issue tracker
+        # may have been changed since the update was queued.
+        error = f"{type(tracker).__name__} doesn't support {update['action']} updates"
+        return _failed(update, error, MAX_ATTEMPTS)
+
+    try:
+        send(update["issue_id"], update["value"], key=update["key"])
+    except (
+        requests.exceptions.RequestException,
+        LookupError,
+        OSError,
+        ValueError,
+    ) as e:
+        attempt = update["attempts"] + 1
+        if _permanent(e):
+            attempt = max(attempt, MAX_ATTEMPTS)
+        return _failed(update, str(e), attempt)
+    return {"event": "sent", "key": update["key"], "at": time.time()}
+
+
+def _permanent(error) -> bool:
+    """ Determine if retrying the update can't help, e.g. 404 Not Found. """
+    response = getattr(error, "response", None)
+    if response is not None:
+        return 400 <= response.status_code < 500 and response.status_code != 429
+    return isinstance(error, LookupError)
+
+
+def _failed(update: dict, error: str, attempt: int) -> dict:
+    """ Get the "failed" event of an attempt, with the time of the next one. """
+    return {
+        "event": "failed",
+        "key": update["key"],
+        "error": error,
+        "attempt": attempt,
+        "retry_at": time.time() + BACKOFF * 2 ** (attempt - 1),
+    }
+
+
+def _events():
+    try:
+        with open(path()) as infile:
+            lines = list(infile)
+    except FileNotFoundError:
+        return
+    for line in lines:
+        try:
+            yield json.loads(line)
+        except ValueError:
+            # A line cut short by a crash.
+            continue
+
+
+def _append(events: list):
+    """ Append the events with a single write. """
+    os.makedirs(cache.directory(), exist_ok=True)
+    data = "".join(json.dumps(event) + "\n" for event in events).encode("utf-8")
+    with _lock(LOCK_FILENAME):
+        with open(path(), "ab+") as outfile:
+            # Don't glue the events to a line cut short by a crash.
+            if outfile.seek(0, os.SEEK_END):
+                outfile.seek(-1, os.SEEK_END)
+                if outfile.read(1) != b"\n":
+                    data = b"\n" + data
+            outfile.write(data)
+
+
+def _compact():
+    """ Rewrite the journal without the updates that were sent. """
+    with _lock(LOCK_FILENAME):
+        pending = {update["key"] for update in updates()}
+        kept = [event for event in _events() if event.get("key") in pending]
+        if not kept and not os.path.exists(path()):
+            return
+
+        temp_path = f"{path()}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as outfile:
+            outfile.write("".join(json.dumps(event) + "\n" for event in kept))
+        os.replace(temp_path, path())
+
+
+@contextlib.contextmanager
+def _lock(filename: str, blocking: bool = True):
+    """ Hold an exclusive lock on the file. Yields whether it was acquired. """
+    os.makedirs(cache.directory(), exist_ok=True)
+    with open(os.path.join(cache.directory(), filename), "a") as lockfile:
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(lockfile, flags)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lockfile, fcntl.LOCK_UN)
+
+
+if __name__ == "__main__":
+    work()
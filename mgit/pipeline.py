@@ -0,0 +1,96 @@
+"""
+Run the steps of a workflow concurrently while respecting their dependencies.
+
+>>> pipeline = Pipeline()
+>>> pipeline.add("fetch", lambda: git.fetch_base_branch("master"))
+>>> pipeline.add("commit", lambda: git.commit_all("JIR-123: Update Readme"))
+>>> pipeline.add("rebase", lambda: git.rebase("master"), requires=["fetch", "commit"])
+>>> pipeline.run()
+"""
+from mgit import profiler
+
+DEFAULT_JOBS = 4
+
+
+class Pipeline:
+    def __init__(self, jobs: int = DEFAULT_JOBS):
+        """
+        Dependency graph of workflow steps.
+
+        A step starts as soon as every step it requires has finished. When a
+        step fails, the steps already running are allowed to finish, nothing
+        else is started and the error is raised by `run`.
+
+        :param jobs: Maximum number of steps running at the same time.
+        """
+        self._jobs = max(1, jobs)
+        self._steps = {}
+
+    def add(self, name: str, function, requires=()):
+        """
+        Add a step. Steps must be added after the steps they require, which
+        keeps the graph free of cycles.
+
+        :param name: Unique name of the step, used in profiles and results.
+        :param function: Callable taking no arguments.
+        :param requires: Names of the steps that must finish first.
+        :raises: ValueError if the name is taken or a required step is unknown.
+        """
+        if name in self._steps:
+            raise ValueError(f"The '{name}' step was already added")
+        for required in requires:
+            if required not in self._steps:
+                raise ValueError(f"The '{name}' step requires unknown '{required}'")
+
+        self._steps[name] = (function, tuple(requires))
+        return self
+
+    def run(self) -> dict:
+        """
+        Run every step.
+
+        :return: The value returned by each step.
+        :raises: The first exception raised by a step.
+        """
+        import contextvars
+        from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+        results = {}
+        pending = dict(self._steps)
+        running = {}
+        error = None
+        with ThreadPoolExecutor(max_workers=self._jobs) as executor:
+            while pending or running:
+                if error is None:
+                    for name, (function, requires) in list(pending.items()):
+                        if all(required in results for required in requires):
+                            del pending[name]
+                            # Steps run in the repo of the caller's context.
+                            context = contextvars.copy_context()
+                            future = executor.submit(
+                                context.run, _run_step, name, function
+                            )
+                            running[future] = name
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except BaseException as e:
+                        error = error or e
+
+        if error is not None:
+            raise error
+        return results
+
+
+# Helpers
+
+
+def _run_step(name: str, function):
+    with profiler.span(profiler.STEP, f"pipeline.{name}"):
+        return function()
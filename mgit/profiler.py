@@ -0,0 +1,146 @@
+"""
+Record the time spent in Git subprocesses, HTTP requests and workflow steps.
+
+Profiling is enabled with `mgit --profile` or the `MGIT_PROFILE` environment
+variable. Events can be printed as a summary table or written in the Chrome
+trace event format, which can be opened in chrome://tracing or Perfetto.
+"""
+import contextlib
+import functools
+import os
+import threading
+import time
+
+SUBPROCESS = "subprocess"
+HTTP = "http"
+STEP = "step"
+
+_enabled = False
+_events = []
+_lock = threading.Lock()
+_origin = time.perf_counter()
+
+
+def enable(enabled: bool = True):
+    """ Enable or disable profiling and discard the events recorded so far. """
+    global _enabled, _origin
+    with _lock:
+        _enabled = enabled
+        _events.clear()
+        _origin = time.perf_counter()
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def events() -> list:
+    """ Get a copy of the events recorded so far, in the order they started. """
+    with _lock:
+        return sorted(_events, key=lambda event: event["start"])
+
+
+@contextlib.contextmanager
+def span(category: str, name: str, **args):
+    """
+    Record the wall time of the block as an event.
+
+    The yielded dict can be updated with details known only at the end, e.g.
+    the exit code or the number of bytes transferred.
+
+    >>> with span(SUBPROCESS, "git status") as details:
+    ...     details["exit_code"] = 0
+    """
+    if not _enabled:
+        yield args
+        return
+
+    start = time.perf_counter()
+    try:
+        yield args
+    finally:
+        end = time.perf_counter()
+        event = {
+            "category": category,
+            "name": name,
+            "start": start - _origin,
+            "duration": end - start,
+            "thread": threading.get_ident(),
+            "args": args,
+        }
+        with _lock:
+            _events.append(event)
+
+
+def profiled(name: str):
+    """ Decorator that records each call of the function as a workflow step. """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(STEP, name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def command_name(command) -> str:
+    """ Get a readable name for a subprocess command. """
+    return command if isinstance(command, str) else " ".join(command)
+
+
+def summary() -> list:
+    """
+    Get the subprocess and HTTP events with their details.
+
+    :return: Rows of (category, name, seconds, exit code or status, bytes).
+    """
+    rows = []
+    for event in events():
+        if event["category"] == STEP:
+            continue
+        args = event["args"]
+        result = args.get("exit_code", args.get("status", ""))
+        rows.append(
+            (
+                event["category"],
+                event["name"],
+                event["duration"],
+                "" if result is None else result,
+                args.get("bytes", ""),
+            )
+        )
+    return rows
+
+
+def totals() -> dict:
+    """ Get the number of events and the seconds spent per category. """
+    totals = {}
+    for event in events():
+        count, seconds = totals.get(event["category"], (0, 0.0))
+        totals[event["category"]] = (count + 1, seconds + event["duration"])
+    return totals
+
+
+def write_trace(path: str):
+    """ Write the events in the Chrome trace event format. """
+    import json
+
+    pid = os.getpid()
+    trace_events = [
+        {
+            "name": event["name"],
+            "cat": event["category"],
+            "ph": "X",
+            "ts": round(event["start"] * 1_000_000),
+            "dur": round(event["duration"] * 1_000_000),
+            "pid": pid,
+            "tid": event["thread"],
+            "args": event["args"],
+        }
+        for event in events()
+    ]
+    with open(path, "w") as outfile:
+        json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, outfile)
@@ -0,0 +1,219 @@
+"""
+Run mgit workflows across many Git repos at once.
+
+Git commands and relative paths such as `.git` and `mgit.json` are resolved
+from the repo of the current context instead of the process's working
+directory, so each worker thread can drive a different repo.
+
+>>> paths = find("~/services/*")
+>>> results = run(paths, lambda path: git.current_branch())
+"""
+import collections
+import contextlib
+import contextvars
+import glob
+import os
+import time
+
+from mgit import profiler
+
+# Maximum number of repos worked on at the same time.
+DEFAULT_JOBS = 8
+
+# Directory of the repo the current thread or task works on. Empty for the
+# process's working directory.
+_directory = contextvars.ContextVar("mgit_directory", default="")
+
+# Repo found from each directory, kept for the life of the process or daemon.
+_locations = {}
+
+Location = collections.namedtuple("Location", ["top_level", "git_dir", "common_dir"])
+Location.__doc__ = """
+Where a repo lives, as absolute paths.
+
+- `top_level`: The root of the working tree, where `mgit.json` is.
+- `git_dir`: The repo's .git folder, which holds HEAD. For a worktree or a
+  submodule, the folder the `.git` file points to.
+- `common_dir`: The folder holding refs and config. Worktrees share the one of
+  the main repo; it is `git_dir` otherwise.
+"""
+
+
+class RepoError(Exception):
+    """ Raised by a workflow step that failed in one repo. """
+
+
+def directory() -> str:
+    """ Get the directory of the current repo, or empty string for the process's. """
+    return _directory.get()
+
+
+def path(*parts) -> str:
+    """
+    Resolve a path relative to the current repo.
+
+    >>> with inside("/src/api"):
+    ...     path(".git")
+    /src/api/.git
+    """
+    return os.path.join(_directory.get(), *parts)
+
+
+@contextlib.contextmanager
+def inside(directory: str):
+    """ Resolve Git commands and relative paths from the directory within the block. """
+    token = _directory.set(os.path.abspath(directory))
+    try:
+        yield
+    finally:
+        _directory.reset(token)
+
+
+def locate():
+    """
+    Find the repo containing the current directory, like `git rev-parse
+    --show-toplevel --git-dir --git-common-dir` but without starting Git.
+
+    Parent folders are searched up to `GIT_CEILING_DIRECTORIES`. A `.git` file,
+    as used by worktrees and submodules, is followed to the Git folder it
+    points to. `GIT_DIR` and `GIT_WORK_TREE` are honored. The result is cached
+    per directory, so deeply nested tools pay for the search once.
+
+    :return: `Location`, or None outside of a repo.
+    """
+    start = os.path.abspath(_directory.get() or os.curdir)
+    env = (os.getenv("GIT_DIR"), os.getenv("GIT_WORK_TREE"))
+    key = (start, os.getenv("GIT_CEILING_DIRECTORIES")) + env
+    location = _locations.get(key)
+    if location is None or not os.path.isdir(location.git_dir):
+        location = _locations[key] = _locate(start, *env)
+    return location
+
+
+def root() -> str:
+    """ Get the top level folder of the current repo, or the current directory. """
+    location = locate()
+    return location.top_level if location else path()
+
+
+def find(spec: str) -> list:
+    """
+    Find the Git repos matching a glob pattern or listed in a manifest file.
+
+    A manifest has one path or pattern per line, relative to the manifest.
+    Blank lines and lines starting with "#" are skipped. Directories that are
+    not Git repos are left out.
+
+    >>> find("~/services/*")
+    ['/home/me/services/api', '/home/me/services/web']
+
+    :return: Absolute paths in the given order, without duplicates.
+    :raises: RepoError if no Git repo is found.
+    """
+    spec = os.path.expanduser(spec)
+    if os.path.isfile(spec):
+        base = os.path.dirname(os.path.abspath(spec))
+        with open(spec) as infile:
+            lines = [line.strip() for line in infile]
+        patterns = [
+            os.path.join(base, os.path.expanduser(line))
+            for line in lines
+            if line and not line.startswith("#")
+        ]
+    else:
+        patterns = [spec]
+
+    paths = []
+    for pattern in patterns:
+        for match in sorted(glob.glob(pattern)):
+            if os.path.exists(os.path.join(match, ".git")):
+                paths.append(os.path.abspath(match))
+    if not paths:
+        raise RepoError(f"No Git repos found in {spec}")
+    return list(dict.fromkeys(paths))
+
+
+def run(paths: list, function, jobs: int = DEFAULT_JOBS) -> dict:
+    """
+    Call the function in every repo concurrently, inside that repo.
+
+    Exceptions, including `SystemExit` from an aborted step, are caught so one
+    failing repo doesn't stop the others.
+
+    :param function: Callable taking the repo path.
+    :param jobs: Maximum number of repos worked on at the same time.
+    :return: (value returned or exception raised, seconds) for each path, in
+        the given order.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        futures = {path: executor.submit(_run_inside, path, function) for path in paths}
+    return {path: future.result() for path, future in futures.items()}
+
+
+# Helpers
+
+
+def _locate(start: str, git_dir_env=None, work_tree_env=None):
+    if git_dir_env:
+        git_dir = os.path.abspath(os.path.join(start, git_dir_env))
+        if not os.path.isdir(git_dir):
+            return None
+        top_level = os.path.abspath(os.path.join(start, work_tree_env or "."))
+        return Location(top_level, git_dir, _common_dir(git_dir))
+
+    ceilings = {
+        os.path.abspath(ceiling)
+        for ceiling in (os.getenv("GIT_CEILING_DIRECTORIES") or "").split(os.pathsep)
+        if ceiling
+    }
+    directory = start
+    while True:
+        git_dir = _git_dir(os.path.join(directory, ".git"))
+        if git_dir:
+            top_level = os.path.abspath(os.path.join(start, work_tree_env or directory))
+            return Location(top_level, git_dir, _common_dir(git_dir))
+
+        parent = os.path.dirname(directory)
+        if parent == directory or parent in ceilings:
+            return None
+        directory = parent
+
+
+def _git_dir(dot_git: str):
+    """ Get the Git folder of a `.git` folder or `gitdir: <path>` file, or None. """
+    if os.path.isdir(dot_git):
+        return dot_git
+    try:
+        with open(dot_git) as infile:
+            content = infile.read().strip()
+    except OSError:
+        return None
+
+    if not content.startswith("gitdir: "):
+        return None
+    git_dir = os.path.join(os.path.dirname(dot_git), content[len("gitdir: ") :])
+    git_dir = os.path.normpath(git_dir)
+    return git_dir if os.path.isdir(git_dir) else None
+
+
+def _common_dir(git_dir: str) -> str:
+    """ Follow the `commondir` file of a worktree to the main repo's Git folder. """
+    try:
+        with open(os.path.join(git_dir, "commondir")) as infile:
+            common_dir = infile.read().strip()
+    except OSError:
+        return git_dir
+    return os.path.normpath(os.path.join(git_dir, common_dir))
+
+
+def _run_inside(directory: str, function):
+    start = time.perf_counter()
+    name = f"repo.{os.path.basename(directory)}"
+    with inside(directory), profiler.span(profiler.STEP, name):
+        try:
+            result = function(directory)
+        except (Exception, SystemExit) as e:
+            result = e
+    return result, time.perf_counter() - start
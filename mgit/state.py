@@ -0,0 +1,51 @@
+from mgit import backends
+
+
+class RepoState:
+    def __init__(self, backend):
+        """
+        Snapshot of the repo facts mgit needs during a single invocation.
+
+        Each fact is gathered on first use with one batched backend call and
+        reused until `git.invalidate` discards the snapshot after a mutating
+        Git command.
+
+        :param backend: Object from `mgit.backends` used to gather the facts.
+        """
+        self._backend = backend
+        self._current_branch = None
+        self._refs = None
+        self._configs = {}
+
+    @property
+    def current_branch(self) -> str:
+        if self._current_branch is None:
+            self._current_branch = self._backend.current_branch()
+        return self._current_branch
+
+    @property
+    def refs(self) -> set:
+        """ Get the names of all refs, e.g. "refs/heads/master". """
+        if self._refs is None:
+            self._refs = self._backend.refs()
+        return self._refs
+
+    def ref_exists(self, ref: str) -> bool:
+        """ Check if the ref exists using the same lookup order as `git rev-parse`. """
+        if not ref or backends.REVISION_SYNTAX.search(ref):
+            return self._backend.ref_exists(ref)
+
+        # HEAD and pseudo-refs like ORIG_HEAD are files in the Git folder.
+        if ref == "HEAD" or ref.endswith("_HEAD"):
+            return self._backend.ref_exists(ref)
+
+        if backends.OBJECT_NAME.match(ref):
+            return self._backend.ref_exists(ref)
+
+        return any(rule.format(ref) in self.refs for rule in backends.REF_RULES)
+
+    def config(self, key: str, scope: str = "") -> str:
+        """ Get a config value or empty string. """
+        if scope not in self._configs:
+            self._configs[scope] = self._backend.config_list(scope)
+        return self._configs[scope].get(backends.normalize_key(key), "")
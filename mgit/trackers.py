@@ -0,0 +1,535 @@
+"""
+Issue tracker backends.
+
+Every backend answers the same two questions, so the rest of mgit doesn't
+depend on the tracker's API:
+
+- `get(issue_id)`: the summary of one issue.
+- `get_many(issue_ids)`: the summaries of many issues, with as few requests
+  as the API allows.
+
+The GitHub, GitLab, Jira and file backends can also `search(query)` for the
+summaries of the issues matching a tracker query.
+
+They can also be asked to update an issue, which `mgit.outbox` does in the
+background. The generic tracker can't, so the settings that queue updates
+are rejected for it:
+
+- `comment(issue_id, body, key)`: add a comment. The key of the update is
+  stored with it, hidden, and a comment with the same key isn't added twice.
+- `transition(issue_id, state, key)`: move the issue to a workflow state, e.g.
+  "In Review". Trackers without workflows use a label instead, and remove the
+  labels of the other states in the settings.
+
+>>> tracker = for_config(configs.settings())
+>>> tracker.get_many(["JIR-1", "JIR-2"])
+{'JIR-1': 'Update readme file', 'JIR-2': 'Add login page'}
+"""
+import contextlib
+import json
+import os
+from urllib.parse import quote, unquote, urlparse
+
+# Maximum number of issues requested at once from batch endpoints.
+BATCH_SIZE = 100
+# Hidden marker added to Markdown comments with the key of the update.
+COMMENT_MARKER = "<!-- mgit-update: {key} -->"
+
+
+class IssueNotFound(LookupError):
+    """ Raised when a backend without HTTP responses can't find an issue. """
+
+
+class TransitionNotFound(LookupError):
+    """ Raised when an issue can't be moved to the requested state. """
+
+
+class Tracker:
+    """
+    Generic issue tracker that serves `GET <issue_tracker_api>/<issue ID>`
+    with a JSON "title". Batches and searches are not supported.
+    """
+
+    # Whether the tracker is reached over HTTP and its issues worth caching.
+    remote = True
+
+    def __init__(self, config, tracker_client=None):
+        """
+        :param config: `configs.Settings` object.
+        :param tracker_client: `issues.IssueTrackerClient` used for requests.
+        """
+        self._config = config
+        self._api = (config.issue_tracker_api or "").strip("/")
+        self._client = tracker_client
+
+    def issue_url(self, issue_id: str) -> str:
+        """ Get the API URL of the issue, which is also its cache key. """
+        return f"{self._api}/{issue_id}"
+
+    def fetch(self, issue_id: str, headers=None):
+        """ Request the issue. Conditional request headers can be passed. """
+        return self._request(self.issue_url(issue_id), headers=headers)
+
+    def summary(self, data: dict) -> str:
+        """ Get the summary from the JSON of an issue. """
+        return data.get("title", "")
+
+    def get(self, issue_id: str) -> str:
+        """
+        Get the summary of an issue.
+
+        :raises: requests.exceptions.HTTPError, requests.exceptions.Timeout
+        """
+        res = self.fetch(issue_id)
+        res.raise_for_status()
+        return self.summary(res.json())
+
+    def get_many(self, issue_ids: list) -> dict:
+        """
+        Get the summaries of many issues. Issues that don't exist are left out.
+
+        :raises: requests.exceptions.RequestException
+        """
+        return {}
+
+    # Helpers
+
+    def _state_labels(self, state: str) -> list:
+        """ Get the labels of the states in the settings other than this one. """
+        states = (self._config.commit_issue_state, self._config.pr_issue_state)
+        return sorted({s for s in states if s and s.lower() != state.lower()})
+
+    def _add_marked_comment(self, url: str, body: str, key: str):
+        """
+        Post a Markdown comment with the marker of the key, unless a comment
+        with the marker was posted by an earlier attempt.
+        """
+        if key:
+            marker = COMMENT_MARKER.format(key=key)
+            for res in self._pages(url, {"per_page": BATCH_SIZE}):
+                if any(marker in (c.get("body") or "") for c in res.json()):
+                    return
+            body = f"{body}\n\n{marker}"
+        self._get_json(url, method="POST", json={"body": body})
+
+    def _request(self, url: str, method: str = "GET", headers=None, **kwargs):
+        headers = dict(self._headers(), **(headers or {}))
+        return self._client.request(
+            method, url, auth=self._auth(), headers=headers, **kwargs
+        )
+
+    def _get_json(self, url: str, **kwargs):
+        res = self._request(url, **kwargs)
+        res.raise_for_status()
+        return res
+
+    def _pages(self, url: str, params: dict):
+        """ Yield the responses of a paginated endpoint using `Link` headers. """
+        while url:
+            res = self._get_json(url, params=params)
+            yield res
+            url = (res.links or {}).get("next", {}).get("url")
+            params = None
+
+    def _headers(self) -> dict:
+        return {"content-type": "application/json"}
+
+    def _auth(self):
+        return None
+
+
+class GitHubTracker(Tracker):
+    """
+    GitHub issues. Batches use a single GraphQL query with one aliased field
+    per issue when a token is set, and the paginated issue list otherwise.
+    """
+
+    def get_many(self, issue_ids: list) -> dict:
+        numbers = sorted({id for id in issue_ids if id.isdigit()}, key=int)
+        if not numbers:
+            return {}
+        if not _github_token():
+            return self._list(numbers)
+
+        owner, _, name = self._repo().partition("/")
+        summaries = {}
+        for start in range(0, len(numbers), BATCH_SIZE):
+            batch = numbers[start : start + BATCH_SIZE]
+            fields = " ".join(f"i{n}: issue(number: {n}) {{ title }}" for n in batch)
+            query = (
+                "query($owner: String!, $name: String!) "
+                f"{{ repository(owner: $owner, name: $name) {{ {fields} }} }}"
+            )
+            res = self._get_json(
+                self._graphql_url(),
+                method="POST",
+                json={"query": query, "variables": {"owner": owner, "name": name}},
+            )
+            repository = (res.json().get("data") or {}).get("repository") or {}
+            for number in batch:
+                if repository.get(f"i{number}"):
+                    summaries[number] = repository[f"i{number}"]["title"]
+        return summaries
+
+    def search(self, query: str, limit: int = BATCH_SIZE) -> dict:
+        """
+        Get the summaries of the issues matching the query, in GitHub's search
+        syntax, e.g. "is:open label:bug".
+
+        :raises: requests.exceptions.RequestException
+        """
+        url = f"{self._api.split('/repos/')[0]}/search/issues"
+        params = {"q": f"repo:{self._repo()} {query}", "per_page": min(limit, 100)}
+        summaries = {}
+        for res in self._pages(url, params):
+            for item in res.json().get("items", []):
+                summaries[str(item["number"])] = item.get("title", "")
+            if len(summaries) >= limit:
+                break
+        return dict(list(summaries.items())[:limit])
+
+    def comment(self, issue_id: str, body: str, key: str = ""):
+        self._add_marked_comment(f"{self.issue_url(issue_id)}/comments", body, key)
+
+    def transition(self, issue_id: str, state: str, key: str = ""):
+        """
+        "open" and "closed" change the state. Anything else adds a label and
+        removes the labels of the other states in the settings.
+        """
+        url = self.issue_url(issue_id)
+        if state.lower() in ("open", "closed"):
+            self._get_json(url, method="PATCH", json={"state": state.lower()})
+            return
+
+        self._get_json(f"{url}/labels", method="POST", json={"labels": [state]})
+        for label in self._state_labels(state):
+            res = self._request(f"{url}/labels/{quote(label, safe='')}", "DELETE")
+            # 404 Not Found when the issue doesn't have the label.
+            if res.status_code != 404:
+                res.raise_for_status()
+
+    # Helpers
+
+    def _list(self, numbers: list) -> dict:
+        """
+        Page through the issues, newest first, until every wanted issue was
+        seen or the issues are older than the oldest wanted one.
+        """
+        wanted = set(numbers)
+        oldest = int(numbers[0])
+        params = {"state": "all", "sort": "created", "direction": "desc"}
+        params["per_page"] = BATCH_SIZE
+
+        summaries = {}
+        for res in self._pages(self._api, params):
+            page = res.json()
+            for item in page:
+                number = str(item.get("number"))
+                if number in wanted:
+                    summaries[number] = item.get("title", "")
+                    wanted.discard(number)
+
+            # Issue numbers only go down from here.
+            if not wanted or not page or page[-1].get("number", 0) < oldest:
+                break
+        return summaries
+
+    def _repo(self) -> str:
+        """ Get "owner/repo" from the API URL. """
+        return self._api.split("/repos/", 1)[-1].split("/issues")[0]
+
+    def _graphql_url(self) -> str:
+        base = self._api.split("/repos/")[0]
+        if base.endswith("/api/v3"):
+            # GitHub Enterprise serves GraphQL at /api/graphql.
+            return f"{base[: -len('/v3')]}/graphql"
+        return f"{base}/graphql"
+
+    def _headers(self) -> dict:
+        headers = super()._headers()
+        if _github_token() and not os.getenv("MGIT_GITHUB_USERNAME"):
+            headers["Authorization"] = f"bearer {_github_token()}"
+        return headers
+
+    def _auth(self):
+        if os.getenv("MGIT_GITHUB_USERNAME"):
+            return (os.getenv("MGIT_GITHUB_USERNAME"), _github_token())
+        return None
+
+
+class JiraTracker(Tracker):
+    """
+    Jira issues, e.g. "https://example.atlassian.net/rest/api/2/issue".
+    Batches use a JQL `key in (...)` search.
+    """
+
+    def fetch(self, issue_id: str, headers=None):
+        return self._request(
+            self.issue_url(issue_id), headers=headers, params={"fields": "summary"}
+        )
+
+    def summary(self, data: dict) -> str:
+        return (data.get("fields") or {}).get("summary", "")
+
+    def get_many(self, issue_ids: list) -> dict:
+        keys = sorted({id.upper() for id in issue_ids})
+        summaries = {}
+        for start in range(0, len(keys), BATCH_SIZE):
+            batch = keys[start : start + BATCH_SIZE]
+            jql = "key in ({})".format(", ".join(json.dumps(key) for key in batch))
+            summaries.update(self._search(jql, len(batch)))
+        return summaries
+
+    def search(self, query: str, limit: int = BATCH_SIZE) -> dict:
+        """ Get the summaries of the issues matching the JQL query. """
+        return self._search(query, limit)
+
+    def comment(self, issue_id: str, body: str, key: str = ""):
+        """ The key is stored in the "mgit" property of the comment. """
+        url = f"{self.issue_url(issue_id)}/comment"
+        data = {"body": body}
+        if key:
+            if key in self._comment_keys(url):
+                return
+            data["properties"] = [{"key": "mgit", "value": {"update": key}}]
+        self._get_json(url, method="POST", json=data)
+
+    def transition(self, issue_id: str, state: str, key: str = ""):
+        """ The state is the name of a transition or of the status it leads to. """
+        url = self.issue_url(issue_id)
+        fields = self._get_json(url, params={"fields": "status"}).json()["fields"]
+        if (fields.get("status") or {}).get("name", "").lower() == state.lower():
+            return
+
+        data = self._get_json(f"{url}/transitions").json()
+        for transition in data.get("transitions", []):
+            names = (transition.get("name", ""), transition.get("to", {}).get("name"))
+            if state.lower() in (name.lower() for name in names if name):
+                body = {"transition": {"id": transition["id"]}}
+                self._get_json(f"{url}/transitions", method="POST", json=body)
+                return
+        raise TransitionNotFound(f"{issue_id} can't be moved to {state}")
+
+    # Helpers
+
+    def _comment_keys(self, url: str) -> set:
+        """ Get the update keys in the properties of the issue's comments. """
+        keys = set()
+        start = 0
+        while True:
+            params = {"expand": "properties", "startAt": start}
+            params["maxResults"] = BATCH_SIZE
+            data = self._get_json(url, params=params).json()
+            comments = data.get("comments", [])
+            for comment in comments:
+                for prop in comment.get("properties") or []:
+                    if prop.get("key") == "mgit":
+                        keys.add((prop.get("value") or {}).get("update"))
+            start += len(comments)
+            if not comments or start >= data.get("total", 0):
+                return keys
+
+    def _search(self, jql: str, limit: int) -> dict:
+        url = f"{self._api.split('/rest/')[0]}/rest/api/2/search"
+        summaries = {}
+        while len(summaries) < limit:
+            params = {
+                "jql": jql,
+                "fields": "summary",
+                "startAt": len(summaries),
+                "maxResults": min(limit - len(summaries), BATCH_SIZE),
+                # Don't fail the whole batch because one key doesn't exist.
+                "validateQuery": "warn",
+            }
+            data = self._get_json(url, params=params).json()
+            for issue in data.get("issues", []):
+                summaries[issue["key"]] = self.summary(issue)
+            if not data.get("issues") or len(summaries) >= data.get("total", 0):
+                break
+        return summaries
+
+    def _auth(self):
+        if os.getenv("MGIT_JIRA_USERNAME"):
+            return (os.getenv("MGIT_JIRA_USERNAME"), os.getenv("MGIT_JIRA_API_TOKEN"))
+        return None
+
+
+class GitLabTracker(Tracker):
+    """
+    GitLab project issues, e.g. "https://gitlab.com/api/v4/projects/42/issues".
+    Batches use the `iids[]` filter of the issue list.
+    """
+
+    def get_many(self, issue_ids: list) -> dict:
+        iids = sorted({id for id in issue_ids if id.isdigit()}, key=int)
+        summaries = {}
+        for start in range(0, len(iids), BATCH_SIZE):
+            params = {"iids[]": iids[start : start + BATCH_SIZE]}
+            params["per_page"] = BATCH_SIZE
+            summaries.update(self._collect(params))
+        return summaries
+
+    def search(self, query: str, limit: int = BATCH_SIZE) -> dict:
+        """ Get the summaries of the issues whose title or description match. """
+        params = {"search": query, "per_page": min(limit, BATCH_SIZE)}
+        return dict(list(self._collect(params, limit).items())[:limit])
+
+    def comment(self, issue_id: str, body: str, key: str = ""):
+        self._add_marked_comment(f"{self.issue_url(issue_id)}/notes", body, key)
+
+    def transition(self, issue_id: str, state: str, key: str = ""):
+        """
+        "opened" and "closed" change the state. Anything else adds a label and
+        removes the labels of the other states in the settings.
+        """
+        events = {"opened": "reopen", "closed": "close"}
+        if state.lower() in events:
+            body = {"state_event": events[state.lower()]}
+        else:
+            body = {"add_labels": state}
+            if self._state_labels(state):
+                body["remove_labels"] = ",".join(self._state_labels(state))
+        self._get_json(self.issue_url(issue_id), method="PUT", json=body)
+
+    # Helpers
+
+    def _collect(self, params: dict, limit=None) -> dict:
+        summaries = {}
+        for res in self._pages(self._api, params):
+            for issue in res.json():
+                summaries[str(issue["iid"])] = issue.get("title", "")
+            if limit and len(summaries) >= limit:
+                break
+        return summaries
+
+    def _headers(self) -> dict:
+        headers = super()._headers()
+        if os.getenv("MGIT_GITLAB_API_TOKEN"):
+            headers["PRIVATE-TOKEN"] = os.getenv("MGIT_GITLAB_API_TOKEN")
+        return headers
+
+
+class FileTracker(Tracker):
+    """
+    Issues in a local JSON file, for air-gapped use and tests, e.g.
+    "file:///srv/issues.json" containing {"JIR-1": "Update readme file"}.
+    Values can also be objects with a "title" or "summary".
+    """
+
+    remote = False
+
+    def issue_url(self, issue_id: str) -> str:
+        return f"{self._api}#{issue_id}"
+
+    def get(self, issue_id: str) -> str:
+        """ :raises: IssueNotFound if the file can't be read or lacks the issue. """
+        issues = self._load()
+        for key in (issue_id, issue_id.upper()):
+            if key in issues:
+                return issues[key]
+        raise IssueNotFound(f"{issue_id} was not found in {self._path()}")
+
+    def get_many(self, issue_ids: list) -> dict:
+        issues = self._load()
+        return {id: issues[id.upper()] for id in issue_ids if id.upper() in issues}
+
+    def search(self, query: str, limit: int = BATCH_SIZE) -> dict:
+        """ Get the summaries of the issues whose ID or summary contain the query. """
+        query = query.lower()
+        matches = {
+            id: summary
+            for id, summary in self._load().items()
+            if query in id.lower() or query in summary.lower()
+        }
+        return dict(list(matches.items())[:limit])
+
+    def comment(self, issue_id: str, body: str, key: str = ""):
+        """
+        Append the comment to the "comments" of the issue in the file, and its
+        key to the "update_keys".
+        """
+        with self._editing(issue_id) as issue:
+            if key and key in issue.get("update_keys", []):
+                return
+            issue.setdefault("comments", []).append(body)
+            if key:
+                issue.setdefault("update_keys", []).append(key)
+
+    def transition(self, issue_id: str, state: str, key: str = ""):
+        """ Set the "state" of the issue in the file. """
+        with self._editing(issue_id) as issue:
+            issue["state"] = state
+
+    # Helpers
+
+    @contextlib.contextmanager
+    def _editing(self, issue_id: str):
+        """
+        Yield the issue as an object and atomically write the file afterwards.
+
+        :raises: IssueNotFound if the file can't be read or doesn't contain
+            the issue.
+        """
+        data = self._read()
+        keys = {str(id).upper(): id for id in data}
+        if issue_id.upper() not in keys:
+            raise IssueNotFound(f"{issue_id} was not found in {self._path()}")
+
+        key = keys[issue_id.upper()]
+        if not isinstance(data[key], dict):
+            data[key] = {"title": data[key]}
+        yield data[key]
+
+        temp_path = f"{self._path()}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as outfile:
+            json.dump(data, outfile, indent=2)
+        os.replace(temp_path, self._path())
+
+    def _path(self) -> str:
+        return unquote(urlparse(self._config.issue_tracker_api).path)
+
+    def _read(self) -> dict:
+        """
+        Get the JSON object in the file.
+
+        :raises: IssueNotFound if the file is missing or isn't a JSON object.
+        """
+        try:
+            with open(self._path()) as infile:
+                data = json.load(infile)
+        except (OSError, ValueError) as e:
+            raise IssueNotFound(f"{self._path()} could not be read: {e}")
+        if not isinstance(data, dict):
+            raise IssueNotFound(f"{self._path()} must contain a JSON object")
+        return data
+
+    def _load(self) -> dict:
+        """ Get the summary of each issue, keyed by the upper case ID. """
+        data = self._read()
+        issues = {}
+        for id, value in data.items():
+            if isinstance(value, dict):
+                value = value.get("title") or value.get("summary") or ""
+            issues[str(id).upper()] = value
+        return issues
+
+
+TRACKERS = {
+    "github": GitHubTracker,
+    "gitlab": GitLabTracker,
+    "jira": JiraTracker,
+    "file": FileTracker,
+}
+
+
+def for_config(config, tracker_client=None) -> Tracker:
+    """ Get the backend for the issue tracker in the config. """
+    cls = TRACKERS.get(config.issue_tracker_kind, Tracker)
+    return cls(config, tracker_client)
+
+
+# Helpers
+
+
+def _github_token() -> str:
+    return os.getenv("MGIT_GITHUB_API_TOKEN") or os.getenv("GITHUB_TOKEN") or ""
@@ -4,7 +4,7 @@ import click  # https://click.palletsprojects.com/en/7.x/
 MESSAGES = {
     "create_branch_warning": "This will create a branch off {base_branch} named {new_branch}.",
     "issue_tracker_api_prompt": "Enter the API URL for your issue tracker",
-    "hub_cli_missing": "This script relies on GitHub's 'hub' command line tool.\nVisit https://github.com/github/hub to install it",
+    "hub_cli_missing": "This script relies on GitHub's 'hub' command line tool.\nVisit https://github.com/github/hub to install it or set MGIT_GITHUB_API_TOKEN to use the GitHub API",
 }
 
 
@@ -40,6 +40,35 @@ Visit https://github.com/github/hub to install it"""
         # return MESSAGES["create_branch_warning"].format(self.green(base_branch), self.green(new_branch))
         return f"This will create a branch off {self.green(base_branch)} named {self.green(new_branch)}."
 
+    def create_branches_warning(self, base_branch, new_branches):
+        branches = "\n".join(f"    - {self.green(name)}" for name in new_branches)
+        return f"""This will create the following branches off {self.green(base_branch)}:
+{branches}"""
+
+    def base_branch_not_fetched(self, base_branch):
+        return (
+            f"{self.yellow(base_branch)} could not be fetched from origin, "
+            "the branches are created off the local branch."
+        )
+
+    def branch_results(self, rows):
+        """ Format (issue ID, branch, created, error) rows as a table. """
+        id_width = max([len("Issue")] + [len(row[0]) for row in rows])
+        branch_width = max([len("Branch")] + [len(row[1]) for row in rows])
+        lines = [f"{'Issue':<{id_width}}  {'Branch':<{branch_width}}  Status"]
+        for issue_id, branch, created, error in rows:
+            status = self.green("created") if created else self.red(error or "failed")
+            lines.append(f"{issue_id:<{id_width}}  {branch:<{branch_width}}  {status}")
+        return "\n".join(lines)
+
+    def branch_index(self, rows):
+        """ Format (issue ID, branch) rows as a table. """
+        id_width = max([len("Issue")] + [len(row[0]) for row in rows])
+        lines = [f"{'Issue':<{id_width}}  Branch"]
+        for issue_id, branch in rows:
+            lines.append(f"{self.green(f'{issue_id:<{id_width}}')}  {branch}")
+        return "\n".join(lines)
+
     def branch_has_no_issue_id(self, current_branch):
         # TODO: Add MESSAGES constant dictionary with
         # return MESSAGES["branch_has_no_issue_id"].format(current_branch)
@@ -49,15 +78,45 @@ Please use a different branch or provide the --message option to provide a custo
     def closes_issue_id(self, id):
         return f"\n\nCloses #{id}"
 
-    def commit_warning(self, message):
+    def commit_warning(self, message, changes=None):
+        """
+        :param changes: `git.Change` for each file to commit. The files aren't
+            listed when None.
+        """
         # TODO:
         # return MESSAGES["commit_warning"].format(self.green(message))
 
+        if changes is None:
+            files = "Add all uncommitted files"
+        elif changes:
+            files = f"Add {self.changes_summary(changes)}"
+        else:
+            return f"""This will do the following:
+    - Skip the commit, there are no changes
+    - Push the changes to origin"""
+
         return f"""This will do the following:
-    - Add all uncommitted files
+    - {files}
     - Create a commit with the message "{self.green(message)}"
     - Push the changes to origin"""
 
+    def changes_summary(self, changes):
+        """ Count the changed files by kind, e.g. "3 files (2 modified, 1 added)". """
+        kinds = {"modified": 0, "added": 0, "deleted": 0, "renamed": 0}
+        for change in changes:
+            if change.code == "??" or change.code[0] == "A":
+                kinds["added"] += 1
+            elif "D" in change.code:
+                kinds["deleted"] += 1
+            elif change.code[0] in "RC":
+                kinds["renamed"] += 1
+            else:
+                kinds["modified"] += 1
+        counts = ", ".join(f"{count} {kind}" for kind, count in kinds.items() if count)
+        size = sum(change.size for change in changes)
+        files = "file" if len(changes) == 1 else "files"
+        return f"{len(changes)} {files} ({counts}), {size} bytes"
+
     def pull_request_warning(self, message, base_branch, title):
         return f"""This will do the following:
     - Add all uncommitted files
@@ -69,6 +128,53 @@ Please use a different branch or provide the --message option to provide a custo
     def update_base_branch_confirmation(self, base_branch):
         return f"Would you like to update the {self.green(base_branch)} branch first and rebase your commits?"
 
+    def rebase_failed(self, base_branch):
+        return (
+            f"The rebase onto {self.red(base_branch)} stopped, nothing was pushed. "
+            "Resolve it with `git rebase --continue` or `git rebase --abort`, "
+            "then run the command again."
+        )
+
+    def create_branch_repos_warning(self, new_branch, rows):
+        """ Format (repo, base branch) rows. """
+        repos = "\n".join(f"    - {repo} off {self.green(base)}" for repo, base in rows)
+        return f"""This will create a branch named {self.green(new_branch)} in these repos:
+{repos}"""
+
+    def commit_repos_warning(self, rows):
+        """ Format (repo, branch, message) rows. """
+        repos = "\n".join(
+            f"    - {repo} ({branch}): {self.green(message)}" for repo, branch, message in rows
+        )
+        return f"""This will add all uncommitted files, commit and push to origin in these repos:
+{repos}"""
+
+    def pull_request_repos_warning(self, rows):
+        """ Format (repo, base branch, title) rows. """
+        repos = "\n".join(
+            f"    - {repo} to {self.green(base)}: {self.green(title)}" for repo, base, title in rows
+        )
+        return f"""This will commit, push and create a pull request in these repos:
+{repos}"""
+
+    def update_base_branch_repos_confirmation(self):
+        return "Would you like to update the base branches first and rebase your commits?"
+
+    def no_base_branch(self):
+        return "No base branch was found, use the --base-branch option"
+
+    def branch_not_created(self, new_branch):
+        return f"The {new_branch} branch was not created"
+
+    def repo_results(self, rows):
+        """ Format (repo, seconds, succeeded, detail) rows as a table. """
+        width = max([len("Repo")] + [len(row[0]) for row in rows])
+        lines = [f"{'Repo':<{width}}  {'Time':>7}  Status"]
+        for repo, seconds, succeeded, detail in rows:
+            status = self.green(detail or "done") if succeeded else self.red(detail or "failed")
+            lines.append(f"{repo:<{width}}  {seconds:>6.2f}s  {status}")
+        return "\n".join(lines)
+
     def pull_request_body(self, title, issue_tracker, id, url):
         return f"""{title}
 
@@ -87,6 +193,105 @@ Please use a different branch or provide the --message option to provide a custo
 - [] Updated CHANGELOG.md
 - [] Updated internal/external documentation"""
 
+    def pull_request_created(self, url):
+        return f"Created the pull request {self.green(url)}"
+
+    def step_timings(self, timings):
+        steps = ", ".join(f"{step} {seconds:.3f}s" for step, seconds in timings.items())
+        return f"Timings: {steps}, {sum(timings.values()):.3f}s total"
+
+    def push_summary(self, result):
+        branches = result["branches"]
+        return (
+            f"Push: {sum(branches.values())}/{len(branches)} branches, "
+            f"{result['bytes']} bytes, {result['seconds']:.3f}s"
+        )
+
+    def tracker_stats(self, stats):
+        average = stats["seconds"] / stats["requests"] if stats["requests"] else 0
+        return (
+            f"Issue tracker: {stats['requests']} requests, {stats['retries']} retries, "
+            f"{stats['seconds']:.3f}s total, {average:.3f}s average"
+        )
+
+    def profile_summary(self, rows, totals):
+        """ Format (category, name, seconds, result, bytes) rows and totals. """
+        if not rows:
+            return "Profile: no Git commands or HTTP requests were run."
+        header = f"{'Seconds':>8}  {'Result':>6}  {'Bytes':>8}  {'Command'}"
+        lines = [header]
+        for _, name, seconds, result, size in rows:
+            lines.append(f"{seconds:>8.3f}  {result!s:>6}  {size!s:>8}  {name}")
+        for category, (count, seconds) in sorted(totals.items()):
+            lines.append(f"{category}: {count} calls, {seconds:.3f}s total")
+        return "\n".join(lines)
+
+    def profile_written(self, path):
+        return f"Wrote the profile trace to {self.green(path)}."
+
+    def prefetch_results(self, count, failed):
+        lines = [f"Cached {self.green(str(count - len(failed)))} of {count} issues."]
+        for issue_id, error in failed.items():
+            lines.append(f"{issue_id}: {self.red(str(error))}")
+        return "\n".join(lines)
+
+    def cache_stats(self, stats):
+        return f"""Issue cache:
+    - Entries: {stats["entries"]}
+    - Hits: {stats["hits"]}
+    - Revalidated: {stats["revalidated"]}
+    - Misses: {stats["misses"]}
+    - Evictions: {stats["evictions"]}
+    - Hit rate: {self.green(f"{stats['hit_rate']:.0%}")}
+    - Size: {stats["size"]} bytes"""
+
+    def cache_cleared(self, path):
+        return f"Cleared the issue cache at {path}."
+
+    def outbox_status(self, stats, updates):
+        oldest = "" if stats["oldest"] is None else f" (oldest {stats['oldest']:.0f}s)"
+        worker = "running" if stats["worker"] else "not running"
+        lines = [
+            f"Issue updates in {stats['path']}:",
+            f"    - Pending: {stats['pending']}{oldest}",
+            f"    - Failed: {self.red(str(stats['failed'])) if stats['failed'] else 0}",
+            f"    - Worker: {worker}",
+        ]
+        for update in updates:
+            line = f"{update['issue_id']} {update['action']} {update['value']!r}"
+            if update["error"]:
+                line += f", attempt {update['attempts']}: {self.red(update['error'])}"
+            lines.append(f"    {line}")
+        return "\n".join(lines)
+
+    def outbox_flushed(self, counts):
+        return f"Sent {counts['sent']} issue updates, {counts['failed']} failed."
+
+    def issue_updates_queued(self, issue_id, path):
+        return f"Queued the updates of {issue_id} in {path}."
+
+    def hook_installed(self, path):
+        return f"Installed the commit message hook at {self.green(path)}."
+
+    def hook_exists(self, path):
+        return f"{path} already exists, use --force to replace it."
+
+    def daemon_started(self, path):
+        return f"The mgit daemon is listening on {self.green(path)}."
+
+    def daemon_failed_to_start(self, path):
+        return f"The mgit daemon failed to start listening on {self.red(path)}."
+
+    def daemon_stopped(self, was_running):
+        if was_running:
+            return "The mgit daemon stopped."
+        return "The mgit daemon is not running."
+
+    def daemon_status(self, running, path):
+        if running:
+            return f"The mgit daemon is running on {self.green(path)}."
+        return "The mgit daemon is not running."
+
     # Colors
 
     def blue(self, message):
@@ -12,14 +12,14 @@ setup(
     long_description_content_type="text/markdown",
     url="https://github.com/greganswer/mgit",
     license="MIT",
-    use_scm_version=True,
+    use_scm_version={"write_to": "mgit/version.py"},
     setup_requires=["setuptools_scm"],
     packages=find_packages(),
     include_package_data=True,
-    install_requires=["Click", "setuptools_scm"],
+    install_requires=["Click", "inflection", "requests"],
     entry_points="""
         [console_scripts]
-        mgit=mgit.cli:cli
+        mgit=mgit.client:main
     """,
     classifiers=[
         "Programming Language :: Python :: 3",
@@ -0,0 +1,135 @@
+import os
+import tempfile
+import unittest
+import mock
+
+from mgit import backends
+from mgit import state
+
+SHA = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+CONFIG = """
+[core]
+\tbare = false
+[user]
+\thandle = fake_user ; trailing comment
+[branch "JIR-123-Update"]
+\tremote = origin
+\tmerge = refs/heads/JIR-123-Update
+[remote "origin"]
+\turl = "git@github.com:fake_user/fake_repo.git"
+[color]
+\tui
+"""
+
+
+class FileBackendTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.git_dir = os.path.join(self.directory.name, ".git")
+        self.write("HEAD", "ref: refs/heads/jir-123-update-readme\n")
+        self.write("refs/heads/jir-123-update-readme", SHA)
+        self.write("refs/remotes/origin/HEAD", "ref: refs/remotes/origin/master")
+        self.write(
+            "packed-refs",
+            f"# pack-refs with: peeled fully-peeled sorted\n"
+            f"{SHA} refs/heads/develop\n"
+            f"{SHA} refs/tags/v1.0.0\n"
+            f"^{SHA}\n",
+        )
+        self.write("config", CONFIG)
+        self.backend = backends.FileBackend(self.git_dir)
+
+    def write(self, name, content):
+        path = os.path.join(self.git_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as outfile:
+            outfile.write(content)
+
+    def test_current_branch(self):
+        self.assertEqual("jir-123-update-readme", self.backend.current_branch())
+
+        # Test detached HEAD
+        self.write("HEAD", SHA)
+        self.assertEqual("HEAD", self.backend.current_branch())
+
+    def test_ref_exists(self):
+        # Loose refs
+        self.assertTrue(self.backend.ref_exists("jir-123-update-readme"))
+        self.assertTrue(self.backend.ref_exists("origin"))
+        self.assertTrue(self.backend.ref_exists("refs/heads/jir-123-update-readme"))
+
+        # Packed refs
+        self.assertTrue(self.backend.ref_exists("develop"))
+        self.assertTrue(self.backend.ref_exists("v1.0.0"))
+
+        self.assertFalse(self.backend.ref_exists("master"))
+        self.assertFalse(self.backend.ref_exists("dev"))
+
+    def test_packed_refs_reloaded_when_changed(self):
+        self.assertFalse(self.backend.ref_exists("master"))
+        self.write("packed-refs", f"{SHA} refs/heads/master\n")
+        os.utime(os.path.join(self.git_dir, "packed-refs"), ns=(1, 1))
+        self.assertTrue(self.backend.ref_exists("master"))
+
+    def test_state_ref_exists(self):
+        repo_state = state.RepoState(self.backend)
+        self.assertTrue(repo_state.ref_exists("develop"))
+        self.assertTrue(repo_state.ref_exists("HEAD"))
+        self.assertFalse(repo_state.ref_exists("ORIG_HEAD"))
+
+        # Test that pseudo-refs are looked up in the Git folder, not the refs
+        self.write("ORIG_HEAD", SHA)
+        self.assertTrue(repo_state.ref_exists("ORIG_HEAD"))
+
+    @mock.patch("mgit.backends.SubprocessBackend.ref_exists")
+    def test_ref_exists_falls_back_for_revisions(self, mock_ref_exists):
+        mock_ref_exists.return_value = True
+        self.assertTrue(self.backend.ref_exists("HEAD~1"))
+        self.assertTrue(self.backend.ref_exists(SHA[:7]))
+        self.assertEqual(2, mock_ref_exists.call_count)
+
+    def test_config(self):
+        self.assertEqual("fake_user", self.backend.config("user.handle", "local"))
+        self.assertEqual(
+            "origin", self.backend.config("branch.JIR-123-Update.remote", "local")
+        )
+        self.assertEqual(
+            "git@github.com:fake_user/fake_repo.git",
+            self.backend.config("REMOTE.origin.URL", "local"),
+        )
+        self.assertEqual("true", self.backend.config("color.ui", "local"))
+        self.assertEqual("", self.backend.config("user.missing", "local"))
+
+    @mock.patch("mgit.backends.SubprocessBackend.config_list")
+    def test_config_falls_back_for_includes(self, mock_config_list):
+        mock_config_list.return_value = {"user.handle": "included_user"}
+        self.write("config", "[include]\n\tpath = other.config\n")
+        self.assertEqual("included_user", self.backend.config("user.handle", "local"))
+        mock_config_list.assert_called_with("local")
+
+    def test_refs(self):
+        self.assertEqual(
+            {
+                "refs/heads/jir-123-update-readme",
+                "refs/remotes/origin/HEAD",
+                "refs/heads/develop",
+                "refs/tags/v1.0.0",
+            },
+            self.backend.refs(),
+        )
+
+    def test_parse_config(self):
+        self.assertIsNone(backends.parse_config('[includeIf "gitdir:~/"]\n'))
+        self.assertEqual(
+            {"alias.co": "checkout # not a comment", "user.name": "Jane Doe"},
+            backends.parse_config(
+                '[alias]\n\tco = "checkout # not a comment"\n'
+                "[user]name = Jane \\\nDoe\n"
+            ),
+        )
+
+
+# Run the tests
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import os
+import tempfile
+import unittest
+import mock
+
+from mgit import cache
+
+URL = "https://api.github.com/repos/fake_user/fake_repo/issues"
+
+
+class IssueCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "issues.json")
+
+    def test_store_and_get(self):
+        issue_cache = cache.IssueCache(self.path)
+        issue_cache.store(f"{URL}/7", "update readme file", {"ETag": '"abc"'})
+
+        # Test that the entry is persisted to disk
+        entry = cache.IssueCache(self.path).get(f"{URL}/7")
+        self.assertEqual("update readme file", entry["summary"])
+        self.assertEqual('"abc"', entry["etag"])
+        self.assertIsNone(cache.IssueCache(self.path).get(f"{URL}/8"))
+
+    def test_fresh(self):
+        issue_cache = cache.IssueCache(self.path, ttl=60)
+        issue_cache.store(f"{URL}/7", "update readme file")
+        entry = issue_cache.get(f"{URL}/7")
+        self.assertTrue(issue_cache.fresh(entry))
+
+        with mock.patch("mgit.cache.time.time", return_value=entry["fetched_at"] + 61):
+            self.assertFalse(issue_cache.fresh(entry))
+
+    def test_validators(self):
+        issue_cache = cache.IssueCache(self.path)
+        entry = {"etag": '"abc"', "last_modified": "Mon, 01 Jan 2024 00:00:00 GMT"}
+        self.assertEqual(
+            {
+                "If-None-Match": '"abc"',
+                "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT",
+            },
+            issue_cache.validators(entry),
+        )
+        self.assertEqual({}, issue_cache.validators({}))
+
+    def test_eviction(self):
+        issue_cache = cache.IssueCache(self.path, max_entries=2)
+        with mock.patch("mgit.cache.time.time", side_effect=[1, 2, 3, 4, 5]):
+            issue_cache.store(f"{URL}/1", "one")
+            issue_cache.store(f"{URL}/2", "two")
+            issue_cache.hit(f"{URL}/1")
+            issue_cache.store(f"{URL}/3", "three")
+
+        # Test that the least recently used entry is evicted
+        self.assertIsNotNone(issue_cache.get(f"{URL}/1"))
+        self.assertIsNone(issue_cache.get(f"{URL}/2"))
+        self.assertEqual(1, issue_cache.stats()["evictions"])
+
+    def test_store_many(self):
+        issue_cache = cache.IssueCache(self.path, max_entries=2)
+        with mock.patch.object(issue_cache, "save", wraps=issue_cache.save) as save:
+            issue_cache.store_many({f"{URL}/{i}": str(i) for i in range(3)})
+        save.assert_called_once()
+
+        stats = cache.IssueCache(self.path).stats()
+        self.assertEqual(2, stats["entries"])
+        self.assertEqual(0, stats["misses"])
+        self.assertEqual(1, stats["evictions"])
+
+    def test_hit_many(self):
+        issue_cache = cache.IssueCache(self.path)
+        issue_cache.store_many({f"{URL}/{i}": str(i) for i in range(3)})
+        with mock.patch.object(issue_cache, "save", wraps=issue_cache.save) as save:
+            issue_cache.hit_many([f"{URL}/0", f"{URL}/1", f"{URL}/2"])
+        save.assert_called_once()
+
+        # Test that entries removed by another process are ignored
+        other_cache = cache.IssueCache(self.path)
+        other_cache.clear()
+        other_cache.store(f"{URL}/0", "0")
+        issue_cache.hit_many([f"{URL}/0", f"{URL}/1"])
+        issue_cache.revalidated(f"{URL}/2")
+        self.assertEqual(1, cache.IssueCache(self.path).stats()["hits"])
+
+    def test_stats_and_clear(self):
+        issue_cache = cache.IssueCache(self.path)
+        issue_cache.store(f"{URL}/7", "update readme file")
+        issue_cache.hit(f"{URL}/7")
+        issue_cache.revalidated(f"{URL}/7")
+
+        stats = issue_cache.stats()
+        self.assertEqual(1, stats["entries"])
+        self.assertEqual(1, stats["misses"])
+        self.assertAlmostEqual(2 / 3, stats["hit_rate"])
+
+        issue_cache.clear()
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(0, cache.IssueCache(self.path).stats()["entries"])
+
+    def test_corrupt_file_is_ignored(self):
+        with open(self.path, "w") as outfile:
+            outfile.write("{not json")
+        self.assertIsNone(cache.IssueCache(self.path).get(f"{URL}/7"))
+
+    @mock.patch.dict(os.environ, {"MGIT_CACHE_DIR": "/tmp/mgit-cache"})
+    def test_directory(self):
+        self.assertEqual("/tmp/mgit-cache", cache.directory())
+
+
+# Run the tests
+if __name__ == "__main__":
+    unittest.main()
@@ -5,6 +5,8 @@ References:
 - https://click.palletsprojects.com/en/7.x/testing
 - https://docs.python.org/3/library/unittest.html
 """
+import os
+import tempfile
 import unittest
 import mock
 from click.testing import CliRunner
@@ -12,8 +14,10 @@ from requests.exceptions import Timeout, HTTPError
 from subprocess import DEVNULL, CalledProcessError as ProcessError
 
 from mgit.cli import cli
+from mgit import complete
 from mgit import configs
 from mgit import git
+from mgit import repos
 
 BASE_BRANCH = "my_base_branch"
 NEW_BRANCH = "jir-472-update-readme-file"
@@ -22,44 +26,76 @@ ISSUE_TITLE = "JIR-472: Update Readme File"
 ISSUE_TRACKER_API = "https://api.github.com/repos/fake_user/fake_repo/issues"
 REQUEST_TIMEOUT = Timeout("HTTP Request Timeout")
 REQUEST_HTTP_ERROR = HTTPError("HTTP Request Error")
+CHANGES = [
+    git.Change(".M", "README.md", "", 2048),
+    git.Change("??", "docs/new.md", "", 100),
+]
+PUSH_RESULT = {"branches": {NEW_BRANCH: True}, "bytes": 1024, "seconds": 0.5}
 
 
 class GitTestCase(unittest.TestCase):
     def setUp(self):
         self.runner = CliRunner()
 
+        # Keep the issue cache out of the real .git folder.
+        self.cache_dir = tempfile.TemporaryDirectory()
+        patcher = mock.patch.dict(os.environ, {"MGIT_CACHE_DIR": self.cache_dir.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.cache_dir.cleanup)
+
+        # Use `hub` unless a test sets a GitHub token.
+        os.environ.pop("MGIT_GITHUB_API_TOKEN", None)
+        os.environ.pop("GITHUB_TOKEN", None)
+
     def test_cli(self):
         result = self.runner.invoke(cli)
         self.assertIn("Usage: mgit [OPTIONS] COMMAND [ARGS]...", result.output)
         self.assertEqual(0, result.exit_code)
 
     @mock.patch("mgit.git.create_branch")
-    @mock.patch("mgit.issues.requests")
-    def test_branch(self, mock_requests, mock_create_branch):
+    @mock.patch("requests.Session.get")
+    def test_branch(self, mock_get, mock_create_branch):
         # Create a new Mock to imitate a Response
         mock_response = mock.Mock(
-            **{"status_code": 200, "json.return_value": {"title": "update readme file"}}
+            **{
+                "status_code": 200,
+                "headers": {},
+                "json.return_value": {"title": "update readme file"},
+            }
         )
 
         # Test successful HTTP request
-        mock_requests.get.return_value = mock_response
+        mock_get.return_value = mock_response
+        mock_create_branch.return_value = {"fetch": 0.25, "checkout": 0.5}
         result = self.runner.invoke(cli, ["branch", ISSUE_ID], input="yes")
 
         expected = f"This will create a branch off master named {NEW_BRANCH}"
         self.assertIn(expected, result.output, msg=result.exception)
         self.assertEqual(0, result.exit_code)
-        mock_create_branch.assert_called_with("master", NEW_BRANCH)
+        mock_create_branch.assert_called_with("master", NEW_BRANCH, switch=True)
+
+        # Test that the timings are logged in verbose mode
+        args = ["--verbose", "--log-file", "-", "branch", ISSUE_ID, "--no-switch"]
+        result = self.runner.invoke(cli, args, input="yes")
+        self.assertEqual(0, result.exit_code, msg=result.exception)
+        self.assertIn("fetch 0.250s, checkout 0.500s, 0.750s total", result.output)
+        mock_create_branch.assert_called_with("master", NEW_BRANCH, switch=False)
 
     @mock.patch("mgit.git.create_branch")
-    @mock.patch("mgit.issues.requests")
-    def test_branch_with_base_branch(self, mock_requests, mock_create_branch):
+    @mock.patch("requests.Session.get")
+    def test_branch_with_base_branch(self, mock_get, mock_create_branch):
         # Create a new Mock to imitate a Response
         mock_response = mock.Mock(
-            **{"status_code": 200, "json.return_value": {"title": "update readme file"}}
+            **{
+                "status_code": 200,
+                "headers": {},
+                "json.return_value": {"title": "update readme file"},
+            }
         )
 
         # Test successful HTTP request
-        mock_requests.get.return_value = mock_response
+        mock_get.return_value = mock_response
         result = self.runner.invoke(
             cli, ["branch", ISSUE_ID, "--base-branch", BASE_BRANCH], input="yes"
         )
@@ -67,7 +103,102 @@ class GitTestCase(unittest.TestCase):
         expected = f"This will create a branch off {BASE_BRANCH} named {NEW_BRANCH}"
         self.assertIn(expected, result.output, msg=result.exception)
         self.assertEqual(0, result.exit_code)
-        mock_create_branch.assert_called_with(BASE_BRANCH, NEW_BRANCH)
+        mock_create_branch.assert_called_with(BASE_BRANCH, NEW_BRANCH, switch=True)
+
+    @mock.patch("mgit.git.fetch_base_branch", return_value="master")
+    @mock.patch("mgit.git.create_branches")
+    @mock.patch("requests.Session.get")
+    def test_branch_many(self, mock_get, mock_create_branches, mock_fetch):
+        def get(url, **kwargs):
+            if url.endswith("/JIR-404"):
+                return mock.Mock(
+                    **{"raise_for_status.side_effect": HTTPError("404 Not Found")}
+                )
+            return mock.Mock(
+                **{
+                    "status_code": 200,
+                    "headers": {},
+                    "json.return_value": {"title": "update readme file"},
+                }
+            )
+
+        mock_get.side_effect = get
+        mock_create_branches.side_effect = lambda base, names, update: {
+            name: True for name in names
+        }
+        result = self.runner.invoke(
+            cli, ["branch", ISSUE_ID, "JIR-473", "JIR-404"], input="yes"
+        )
+
+        self.assertIn("This will create the following branches", result.output)
+        self.assertIn(NEW_BRANCH, result.output, msg=result.exception)
+        self.assertIn("jir-473-update-readme-file", result.output)
+        self.assertIn("404 Not Found", result.output)
+        self.assertIn("master could not be fetched from origin", result.output)
+        self.assertEqual(1, result.exit_code)
+        mock_fetch.assert_called_once_with("master")
+        mock_create_branches.assert_called_with(
+            "master", [NEW_BRANCH, "jir-473-update-readme-file"], update=False
+        )
+
+    @mock.patch("mgit.app.App.branch_many")
+    def test_branch_from_file(self, mock_branch_many):
+        with self.runner.isolated_filesystem():
+            with open("sprint.txt", "w") as outfile:
+                outfile.write(f"# Sprint 12\n{ISSUE_ID}\n\nJIR-473\n{ISSUE_ID}\n")
+
+            # The command runs outside of the repo, so skip App validation.
+            with mock.patch("mgit.app.App.__init__", return_value=None), mock.patch(
+                "mgit.app.App.repo_paths", new_callable=mock.PropertyMock
+            ) as mock_repo_paths:
+                mock_repo_paths.return_value = []
+                result = self.runner.invoke(
+                    cli, ["branch", "--from-file", "sprint.txt", "-j", "2"]
+                )
+
+        self.assertEqual(0, result.exit_code, msg=result.exception)
+        mock_branch_many.assert_called_with([ISSUE_ID, "JIR-473"], None, 2)
+
+    @mock.patch("mgit.git.branch_exists", return_value=True)
+    @mock.patch("mgit.git.default_base_branch", return_value="master")
+    @mock.patch("mgit.git.create_branch")
+    @mock.patch("requests.Session.get")
+    def test_branch_repos(self, mock_get, mock_create_branch, *mocks):
+        mock_get.return_value = mock.Mock(
+            status_code=200,
+            headers={},
+            **{"json.return_value": {"title": "update readme file"}},
+        )
+        directories = []
+        mock_create_branch.side_effect = lambda *args, **kwargs: directories.append(
+            repos.directory()
+        )
+
+        with tempfile.TemporaryDirectory() as directory:
+            for name in ["api", "web"]:
+                os.makedirs(os.path.join(directory, name, ".git"))
+            os.makedirs(os.path.join(directory, "docs"))
+            pattern = os.path.join(directory, "*")
+
+            args = ["--repos", pattern, "branch", ISSUE_ID]
+            result = self.runner.invoke(cli, args, input="yes")
+            self.assertEqual(0, result.exit_code, msg=result.exception)
+            self.assertIn(f"branch named {NEW_BRANCH} in these repos", result.output)
+            self.assertIn("api off master", result.output)
+            self.assertNotIn("docs", result.output)
+            paths = [os.path.join(directory, name) for name in ["api", "web"]]
+            self.assertEqual(paths, sorted(directories))
+            mock_create_branch.assert_called_with("master", NEW_BRANCH, switch=True)
+
+            # Test that the issue was fetched once for every repo
+            self.assertEqual(1, mock_get.call_count)
+
+            # Test that other commands and many issue IDs are refused
+            result = self.runner.invoke(cli, ["--repos", pattern, "branches"])
+            self.assertIn("--repos only works with branch, commit, pr", result.output)
+            args = ["--repos", pattern, "branch", ISSUE_ID, "JIR-473"]
+            result = self.runner.invoke(cli, args)
+            self.assertIn("--repos only works with a single ISSUE_ID", result.output)
 
     def test_branch_missing_issue_id(self):
         result = self.runner.invoke(cli, ["branch"])
@@ -75,16 +206,16 @@ class GitTestCase(unittest.TestCase):
         self.assertIn(expected, result.output, msg=result.exception)
         self.assertEqual(2, result.exit_code)
 
-    @mock.patch("mgit.issues.requests")
-    def test_branch_exceptions(self, mock_requests):
+    @mock.patch("requests.Session.get")
+    def test_branch_exceptions(self, mock_get):
         # Test output with request Timeout
-        mock_requests.get.side_effect = REQUEST_TIMEOUT
+        mock_get.side_effect = REQUEST_TIMEOUT
         result = self.runner.invoke(cli, ["branch", ISSUE_ID])
         self.assertIn(str(REQUEST_TIMEOUT), result.output, msg=result.exception)
         self.assertEqual(1, result.exit_code)
 
         # Test output with request HTTPError
-        mock_requests.get.side_effect = REQUEST_HTTP_ERROR
+        mock_get.side_effect = REQUEST_HTTP_ERROR
         result = self.runner.invoke(cli, ["branch", ISSUE_ID])
         self.assertIn(str(REQUEST_HTTP_ERROR), result.output, msg=result.exception)
         self.assertEqual(1, result.exit_code)
@@ -92,6 +223,8 @@ class GitTestCase(unittest.TestCase):
     @mock.patch("mgit.app.git")
     def test_commit(self, mock_git):
         mock_git.current_branch.return_value = NEW_BRANCH
+        mock_git.push.return_value = PUSH_RESULT
+        mock_git.status.return_value = CHANGES
 
         result = self.runner.invoke(cli, ["commit"], input="yes")
 
@@ -99,13 +232,58 @@ class GitTestCase(unittest.TestCase):
             "Create a commit with the message", result.output, msg=result.exception
         )
         self.assertIn("Update Readme File", result.output, msg=result.exception)
+        self.assertIn("2 files (1 modified, 1 added), 2148 bytes", result.output)
         self.assertEqual(0, result.exit_code)
-        mock_git.commit_all.assert_called_with(f"{ISSUE_TITLE}")
+        mock_git.commit_all.assert_called_with(ISSUE_TITLE, CHANGES)
         mock_git.push.assert_called_with(NEW_BRANCH)
 
+    @mock.patch("requests.Session.get")
+    @mock.patch("mgit.app.git")
+    def test_prefetch(self, mock_git, mock_get):
+        mock_git.refs.return_value = {
+            f"refs/remotes/origin/{NEW_BRANCH}",
+            "refs/remotes/origin/7-fix-typo",
+        }
+        mock_git.current_branch.return_value = NEW_BRANCH
+        mock_git.push.return_value = PUSH_RESULT
+        mock_git.status.return_value = CHANGES
+        issues_json = [{"number": 7, "title": "fix the typo"}]
+        mock_get.side_effect = [
+            mock.Mock(
+                status_code=200,
+                headers={},
+                links={},
+                **{"json.return_value": issues_json},
+            ),
+            mock.Mock(
+                status_code=200,
+                headers={},
+                **{"json.return_value": {"title": "update the README file"}},
+            ),
+        ]
+
+        result = self.runner.invoke(cli, ["prefetch"])
+        self.assertEqual(0, result.exit_code, msg=result.exception)
+        self.assertIn("of 2 issues", result.output)
+
+        # Test that the completion index has the cached titles
+        with open(complete.path()) as infile:
+            index = infile.read()
+        self.assertIn("issue\tJIR-472\tUpdate The Readme File\n", index)
+        self.assertIn(f"branch\torigin/{NEW_BRANCH}\t{ISSUE_ID}: Update The", index)
+
+        # Test that commit uses the cached title without a request
+        result = self.runner.invoke(cli, ["commit"], input="yes")
+        self.assertEqual(0, result.exit_code, msg=result.exception)
+        message = "JIR-472: Update The Readme File"
+        mock_git.commit_all.assert_called_with(message, CHANGES)
+        self.assertEqual(2, mock_get.call_count)
+
     @mock.patch("mgit.app.git")
     def test_commit_with_message(self, mock_git):
         mock_git.current_branch.return_value = NEW_BRANCH
+        mock_git.push.return_value = PUSH_RESULT
+        mock_git.status.return_value = CHANGES
         message = "My new commit message"
 
         result = self.runner.invoke(cli, ["commit", "-m", message], input="yes")
@@ -115,21 +293,27 @@ class GitTestCase(unittest.TestCase):
         )
         self.assertIn(message, result.output, msg=result.exception)
         self.assertEqual(0, result.exit_code)
-        mock_git.commit_all.assert_called_with(message)
+        mock_git.commit_all.assert_called_with(message, CHANGES)
         mock_git.push.assert_called_with(NEW_BRANCH)
 
     @mock.patch("mgit.app.git")
-    @mock.patch("mgit.issues.requests")
-    def test_commit_with_issue_id(self, mock_requests, mock_git):
+    @mock.patch("requests.Session.get")
+    def test_commit_with_issue_id(self, mock_get, mock_git):
         mock_git.current_branch.return_value = NEW_BRANCH
+        mock_git.push.return_value = PUSH_RESULT
+        mock_git.status.return_value = CHANGES
 
         # Create a new Mock to imitate a Response
         mock_response = mock.Mock(
-            **{"status_code": 200, "json.return_value": {"title": "update readme file"}}
+            **{
+                "status_code": 200,
+                "headers": {},
+                "json.return_value": {"title": "update readme file"},
+            }
         )
 
         # Test successful HTTP request
-        mock_requests.get.return_value = mock_response
+        mock_get.return_value = mock_response
         result = self.runner.invoke(
             cli, ["commit", "--issue-id", ISSUE_ID], input="yes"
         )
@@ -139,13 +323,13 @@ class GitTestCase(unittest.TestCase):
         )
         self.assertIn(ISSUE_TITLE, result.output, msg=result.exception)
         self.assertEqual(0, result.exit_code)
-        mock_git.commit_all.assert_called_with(f"{ISSUE_TITLE}")
+        mock_git.commit_all.assert_called_with(ISSUE_TITLE, CHANGES)
         mock_git.push.assert_called_with(NEW_BRANCH)
 
-    @mock.patch("mgit.issues.requests")
-    def test_commit_exceptions(self, mock_requests):
+    @mock.patch("requests.Session.get")
+    def test_commit_exceptions(self, mock_get):
         # Test output with request Timeout
-        mock_requests.get.side_effect = REQUEST_TIMEOUT
+        mock_get.side_effect = REQUEST_TIMEOUT
         result = self.runner.invoke(
             cli, ["commit", "--issue-id", ISSUE_ID], input="yes"
         )
@@ -153,13 +337,94 @@ class GitTestCase(unittest.TestCase):
         self.assertEqual(1, result.exit_code)
 
         # Test output with request HTTPError
-        mock_requests.get.side_effect = REQUEST_HTTP_ERROR
+        mock_get.side_effect = REQUEST_HTTP_ERROR
         result = self.runner.invoke(
             cli, ["commit", "--issue-id", ISSUE_ID], input="yes"
         )
         self.assertIn(str(REQUEST_HTTP_ERROR), result.output, msg=result.exception)
         self.assertEqual(1, result.exit_code)
 
+    @mock.patch("requests.Session.get")
+    def test_commit_with_cached_issue_id(self, mock_get):
+        mock_response = mock.Mock(
+            **{
+                "status_code": 200,
+                "headers": {},
+                "json.return_value": {"title": "update readme file"},
+            }
+        )
+        mock_get.return_value = mock_response
+
+        with mock.patch("mgit.app.git"):
+            self.runner.invoke(cli, ["commit", "--issue-id", ISSUE_ID], input="yes")
+            result = self.runner.invoke(
+                cli, ["commit", "--issue-id", ISSUE_ID], input="yes"
+            )
+
+        self.assertIn(ISSUE_TITLE, result.output, msg=result.exception)
+        self.assertEqual(1, mock_get.call_count)
+
+    @mock.patch("mgit.outbox.start_worker")
+    @mock.patch("mgit.app.git")
+    def test_commit_queues_issue_updates(self, mock_git, mock_start_worker):
+        mock_git.current_branch.return_value = NEW_BRANCH
+        mock_git.push.return_value = PUSH_RESULT
+        mock_git.status.return_value = CHANGES
+
+        env = {"MGIT_COMMIT_ISSUE_STATE": "In Progress"}
+        with mock.patch.dict(os.environ, env):
+            result = self.runner.invoke(cli, ["commit", "-m", "Fix"], input="yes")
+        self.assertEqual(0, result.exit_code, msg=result.exception)
+        mock_start_worker.assert_called_once_with()
+
+        result = self.runner.invoke(cli, ["outbox", "status"])
+        self.assertIn("Pending: 1", result.output, msg=result.exception)
+        self.assertIn("JIR-472 transition 'In Progress'", result.output)
+
+        with mock.patch("mgit.trackers.GitHubTracker.transition") as mock_transition:
+            result = self.runner.invoke(cli, ["outbox", "flush"])
+        self.assertIn("Sent 1 issue updates, 0 failed.", result.output)
+        self.assertEqual(0, result.exit_code, msg=result.exception)
+        mock_transition.assert_called_once_with("JIR-472", "In Progress", key=mock.ANY)
+
+    def test_cache_stats(self):
+        result = self.runner.invoke(cli, ["cache", "stats"])
+        self.assertIn("Issue cache:", result.output, msg=result.exception)
+        self.assertIn("Entries: 0", result.output, msg=result.exception)
+        self.assertEqual(0, result.exit_code)
+
+    def test_cache_clear(self):
+        result = self.runner.invoke(cli, ["cache", "clear"])
+        self.assertIn("Cleared the issue cache", result.output, msg=result.exception)
+        self.assertEqual(0, result.exit_code)
+
+    def test_completion(self):
+        result = self.runner.invoke(cli, ["completion", "bash"])
+        self.assertIn("mgit __complete bash --", result.output, msg=result.exception)
+        self.assertEqual(0, result.exit_code)
+
+        # Test that the commands completed without importing click are current
+        self.assertEqual(sorted(cli.commands), complete.COMMANDS)
+        for name, command in cli.commands.items():
+            if hasattr(command, "commands"):
+                self.assertEqual(sorted(command.commands), complete.SUBCOMMANDS[name])
+
+    @mock.patch("mgit.app.git")
+    def test_hooks_install(self, mock_git):
+        mock_git.hooks_directory.return_value = self.cache_dir.name
+        result = self.runner.invoke(cli, ["hooks", "install"])
+        self.assertIn("Installed the commit message hook", result.output)
+        self.assertEqual(0, result.exit_code, msg=result.exception)
+
+        # Test that a hook not installed by mgit is only replaced with --force
+        with open(os.path.join(self.cache_dir.name, "prepare-commit-msg"), "w") as f:
+            f.write("#!/bin/sh\n")
+        result = self.runner.invoke(cli, ["hooks", "install"])
+        self.assertIn("use --force to replace it", result.output)
+        self.assertEqual(1, result.exit_code)
+        result = self.runner.invoke(cli, ["hooks", "install", "--force"])
+        self.assertEqual(0, result.exit_code, msg=result.exception)
+
     # TODO: Mock the "issue_tracker_api" instance attribute
     # @mock.patch("mgit.configs.Config")
     # # @mock.patch.object(configs.Config, "issue_tracker_api")
@@ -178,20 +443,111 @@ class GitTestCase(unittest.TestCase):
     #     result = self.runner.invoke(cli, ["open"])
     #     mock_webbrowser.open.assert_called_with(url)
 
+    @mock.patch("mgit.app.git")
+    def test_branches(self, mock_git):
+        mock_git.refs.return_value = {
+            "refs/heads/master",
+            f"refs/heads/{NEW_BRANCH}",
+            f"refs/remotes/origin/{NEW_BRANCH}",
+            "refs/remotes/origin/HEAD",
+        }
+
+        result = self.runner.invoke(cli, ["branches"])
+        self.assertEqual(0, result.exit_code, msg=result.exception)
+        expected = f"{NEW_BRANCH}\nmaster\norigin/{NEW_BRANCH}\n"
+        self.assertEqual(expected, result.output)
+
+        result = self.runner.invoke(cli, ["branches", "--issues"])
+        self.assertEqual(0, result.exit_code, msg=result.exception)
+        self.assertIn(f"{ISSUE_ID}  {NEW_BRANCH}", result.output)
+        self.assertIn(f"{ISSUE_ID}  origin/{NEW_BRANCH}", result.output)
+        self.assertNotIn("master", result.output)
+
     @mock.patch("mgit.app.git")
     def test_pull_request(self, mock_git):
         mock_git.current_branch.return_value = NEW_BRANCH
+        mock_git.push.return_value = PUSH_RESULT
         mock_git.default_base_branch.return_value = "master"
 
-        result = self.runner.invoke(cli, ["pr"], input="yes")
+        mock_git.assignee.return_value = "octocat"
+
+        args = ["pr", "--label", "bug", "--label", "docs"]
+        result = self.runner.invoke(cli, args, input="yes\nyes")
 
         self.assertIn(
             "Create a pull request to the", result.output, msg=result.exception,
         )
         self.assertIn("Update Readme File", result.output, msg=result.exception)
         self.assertEqual(0, result.exit_code)
+        mock_git.fetch_base_branch.assert_called_once_with("master")
+        mock_git.rebase.assert_called_once_with(
+            "master", update=False, interactive=False, update_refs=False
+        )
+        mock_git.push.assert_called_once_with(NEW_BRANCH)
+        mock_git.pull_request.assert_called_once_with(
+            "master", mock.ANY, "octocat", labels=["bug", "docs"]
+        )
+
+    @mock.patch("mgit.app.git")
+    def test_pull_request_rebase_conflict(self, mock_git):
+        mock_git.current_branch.return_value = NEW_BRANCH
+        mock_git.default_base_branch.return_value = "master"
+        mock_git.rebase.side_effect = ProcessError(1, ["git", "rebase"])
+
+        result = self.runner.invoke(cli, ["pr"], input="yes\nyes")
+
+        self.assertEqual(1, result.exit_code, msg=result.exception)
+        self.assertIn("git rebase --continue", result.output)
+        mock_git.push.assert_not_called()
+        mock_git.pull_request.assert_not_called()
+
+    @mock.patch("mgit.app.git")
+    def test_pull_request_without_rebase(self, mock_git):
+        mock_git.current_branch.return_value = NEW_BRANCH
+        mock_git.push.return_value = PUSH_RESULT
+        mock_git.default_base_branch.return_value = "master"
+
+        result = self.runner.invoke(cli, ["pr"], input="yes\nno")
+
+        self.assertEqual(0, result.exit_code, msg=result.exception)
+        mock_git.commit_all.assert_called_once()
+        mock_git.fetch_base_branch.assert_not_called()
+        mock_git.rebase.assert_not_called()
+        mock_git.push.assert_called_once_with(NEW_BRANCH)
         mock_git.pull_request.assert_called_once()
-        mock_git.push.assert_called_once
+
+    @mock.patch("webbrowser.open")
+    @mock.patch("mgit.app.github.create_pull_request")
+    @mock.patch("mgit.app.git")
+    def test_pull_request_with_github_api(self, mock_git, mock_create, mock_open):
+        mock_git.current_branch.return_value = NEW_BRANCH
+        mock_git.push.return_value = PUSH_RESULT
+        mock_git.default_base_branch.return_value = "master"
+        mock_git.assignee.return_value = "octocat"
+        url = "https://github.com/greganswer/mgit/pull/12"
+        mock_create.return_value = {"number": 12, "html_url": url}
+        os.environ["MGIT_GITHUB_API_TOKEN"] = "secret"
+
+        args = ["pr", "--label", "docs"]
+        result = self.runner.invoke(cli, args, input="yes\nno")
+
+        self.assertEqual(0, result.exit_code, msg=result.exception)
+        self.assertIn(url, result.output)
+        mock_git.pull_request.assert_not_called()
+        mock_open.assert_called_once_with(url)
+        args, kwargs = mock_create.call_args
+        self.assertEqual(
+            ("greganswer/mgit", "master", NEW_BRANCH, "Update Readme File"), args[:4]
+        )
+        self.assertIn("[GitHub ticket JIR-472]", args[4])
+        self.assertEqual(["octocat"], kwargs["assignees"])
+        self.assertEqual(["docs"], kwargs["labels"])
+
+        # Test that GitHub's error is shown
+        mock_create.side_effect = HTTPError("422 Client Error: Validation Failed")
+        result = self.runner.invoke(cli, ["pr"], input="yes\nno")
+        self.assertEqual(1, result.exit_code)
+        self.assertIn("Validation Failed", result.output)
 
     @mock.patch("mgit.app.git")
     def test_pull_request_exceptions(self, mock_git):
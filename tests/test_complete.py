@@ -0,0 +1,86 @@
+import io
+import os
+import tempfile
+import time
+import unittest
+import mock
+from contextlib import redirect_stdout
+
+from mgit import complete
+
+INDEX = [
+    "issue\tJIR-12\tUpdate Readme File\n",
+    "issue\tJIR-13\tAdd Login Page\n",
+    "issue\tJIR-2\t\n",
+    "branch\tjir-12-update-readme-file\tJIR-12: Update Readme File\n",
+    "branch\tmain\t\n",
+    "branch\torigin/main\t\n",
+]
+
+
+class CompleteTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        patcher = mock.patch.dict(os.environ, {"MGIT_CACHE_DIR": self.directory.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("mgit.complete.start_rebuild")
+        self.mock_start_rebuild = patcher.start()
+        self.addCleanup(patcher.stop)
+        complete._index = None
+        self.addCleanup(setattr, complete, "_index", None)
+        complete.write_index(INDEX)
+
+    def test_commands(self):
+        expected = [("branch", ""), ("branches", "")]
+        self.assertEqual(expected, complete.candidates(["br"]))
+        self.assertEqual(
+            [("start", ""), ("status", "")], complete.candidates(["daemon", "sta"])
+        )
+        self.assertEqual([], complete.candidates(["daemon", "start", ""]))
+
+    def test_issue_ids(self):
+        expected = [("JIR-12", "Update Readme File"), ("JIR-13", "Add Login Page")]
+        self.assertEqual(expected, complete.candidates(["commit", "--id", "jir-1"]))
+        self.assertEqual(expected, complete.candidates(["branch", "JIR-2", "JIR-1"]))
+        self.assertEqual([], complete.candidates(["branch", "--sw"]))
+
+    def test_branch_names(self):
+        self.assertEqual(
+            [("main", "")], complete.candidates(["pr", "--base-branch", "ma"])
+        )
+        self.assertEqual(
+            [("jir-12-update-readme-file", "JIR-12: Update Readme File")],
+            complete.candidates(["branch", "--base-branch", "jir"]),
+        )
+        self.assertEqual(
+            [("origin/main", "")], complete.candidates(["branch", "-b", "o"])
+        )
+
+    def test_main(self):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            complete.main(["zsh", "--", "open", "--id", "JIR"])
+        expected = "JIR-12:Update Readme File\nJIR-13:Add Login Page\nJIR-2\n"
+        self.assertEqual(expected, output.getvalue())
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            complete.main(["fish", "--", "open", "--id", "JIR-13"])
+        self.assertEqual("JIR-13\tAdd Login Page\n", output.getvalue())
+
+    def test_stale(self):
+        self.assertFalse(complete.stale(complete.path()))
+        self.assertTrue(complete.stale(os.path.join(self.directory.name, "missing")))
+
+        # Test that the index is rebuilt when the issue cache changed
+        issues_path = os.path.join(self.directory.name, "issues.json")
+        with open(issues_path, "w") as outfile:
+            outfile.write("{}")
+        os.utime(issues_path, (time.time() + 1, time.time() + 1))
+        self.assertTrue(complete.stale(complete.path()))
+
+        # Test that the previous index is used while it is rebuilt
+        self.assertEqual(3, len(complete.load_index()["branch"]))
+        self.mock_start_rebuild.assert_called_once_with()
@@ -0,0 +1,119 @@
+import json
+import os
+import tempfile
+import unittest
+import mock
+
+from mgit import configs
+
+ISSUE_TRACKER_API = "https://api.github.com/repos/fake_user/fake_repo/issues"
+
+
+class SettingsTestCase(unittest.TestCase):
+    def test_values_are_validated(self):
+        config = configs.Settings(
+            issue_tracker_api=f"{ISSUE_TRACKER_API}/", cache_ttl="60"
+        )
+        self.assertEqual(ISSUE_TRACKER_API, config.issue_tracker_api)
+        self.assertEqual(60, config.cache_ttl)
+        self.assertIsNone(config.read_timeout)
+        self.assertTrue(config.issue_tracker_is_github)
+
+    def test_invalid_values(self):
+        for values in [
+            {"issue_tracker_api": "api.github.com"},
+            {"cache_ttl": "soon"},
+            {"cache_max_entries": 0},
+            {"read_timeout": True},
+            {"unknown": 1},
+            {"issue_tracker_api": "https://example.com/api", "pr_issue_state": "Done"},
+            {"commit_issue_state": "In Progress"},
+        ]:
+            with self.assertRaises(configs.ConfigError):
+                configs.Settings(**values)
+
+    def test_issue_updates(self):
+        config = configs.Settings(
+            issue_tracker_api="https://example.com/issues",
+            issue_tracker_type="jira",
+            commit_issue_state="In Progress",
+        )
+        self.assertEqual("In Progress", config.commit_issue_state)
+
+    def test_read_only(self):
+        config = configs.Settings(issue_tracker_api=ISSUE_TRACKER_API)
+        with self.assertRaises(AttributeError):
+            config.issue_tracker_api = "https://example.com"
+        with self.assertRaises(AttributeError):
+            config.other = 1
+
+
+class ResolveTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        cwd = os.getcwd()
+        os.chdir(self.directory.name)
+        self.addCleanup(os.chdir, cwd)
+
+        self.user_path = os.path.join(self.directory.name, "user.json")
+        env = {"MGIT_CONFIG": self.user_path}
+        patcher = mock.patch.dict(os.environ, env)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for key in configs.ALLOWED_ATTRIBUTES:
+            os.environ.pop(f"MGIT_{key.upper()}", None)
+
+    def write(self, path, data):
+        with open(path, "w") as outfile:
+            json.dump(data, outfile)
+
+    def test_layers(self):
+        self.write(self.user_path, {"cache_ttl": 10, "max_retries": 1})
+        self.write(
+            configs.FILENAME, {"issue_tracker_api": ISSUE_TRACKER_API, "cache_ttl": 20}
+        )
+        os.environ["MGIT_MAX_RETRIES"] = "5"
+
+        config = configs.settings()
+        self.assertEqual(ISSUE_TRACKER_API, config.issue_tracker_api)
+        self.assertEqual(20, config.cache_ttl)
+        self.assertEqual(5, config.max_retries)
+
+    def test_resolved_once(self):
+        self.write(configs.FILENAME, {"issue_tracker_api": ISSUE_TRACKER_API})
+        config = configs.settings()
+
+        with mock.patch("mgit.configs.load") as mock_load:
+            self.assertIs(config, configs.settings())
+            mock_load.assert_not_called()
+
+        # Test that the file is read again once it changes
+        self.write(configs.FILENAME, {"issue_tracker_api": "https://example.com"})
+        os.utime(configs.FILENAME, ns=(0, 0))
+        self.assertEqual("https://example.com", configs.settings().issue_tracker_api)
+
+    def test_invalid_file(self):
+        self.write(configs.FILENAME, {"cache_ttl": "soon"})
+        with self.assertRaisesRegex(configs.ConfigError, "mgit.json: cache_ttl"):
+            configs.settings()
+
+    def test_save(self):
+        self.write(configs.FILENAME, {"issue_tracker_api": ISSUE_TRACKER_API, "x": 1})
+        configs.save({"cache_ttl": 30, "read_timeout": 5})
+
+        with open(configs.FILENAME) as infile:
+            data = json.load(infile)
+        self.assertEqual(
+            {
+                "issue_tracker_api": ISSUE_TRACKER_API,
+                "x": 1,
+                "cache_ttl": 30,
+                "read_timeout": 5.0,
+            },
+            data,
+        )
+        self.assertEqual([configs.FILENAME], os.listdir("."))
+
+        with self.assertRaises(configs.ConfigError):
+            configs.save({"cache_ttl": -1})
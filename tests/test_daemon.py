@@ -0,0 +1,113 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from mgit import client
+from mgit import daemon
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FORWARD = (
+    "import sys; from mgit import client; "
+    "code = client.forward(sys.argv[1:]); sys.exit(99 if code is None else code)"
+)
+
+
+class DaemonTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "mgit.sock")
+        self.env = dict(
+            os.environ, MGIT_DAEMON_SOCKET=self.path, MGIT_CACHE_DIR=self.directory.name
+        )
+
+    def forward(self, *args):
+        return subprocess.run(
+            [sys.executable, "-c", FORWARD] + list(args),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            env=self.env,
+        )
+
+    def test_subcommand(self):
+        self.assertEqual("daemon", daemon.subcommand(["-v", "daemon", "stop"]))
+        self.assertEqual("branch", daemon.subcommand(["branch", "daemon"]))
+        self.assertEqual(
+            "commit", daemon.subcommand(["--repos", "daemon", "-l", "log", "commit"])
+        )
+        self.assertEqual(
+            "daemon", daemon.subcommand(["--repos-jobs", "2", "daemon", "status"])
+        )
+        self.assertEqual("", daemon.subcommand(["--version"]))
+
+    def test_forward_without_daemon(self):
+        self.assertIsNone(client.forward(["--help"], self.path))
+        self.assertFalse(daemon.running(self.path))
+        self.assertFalse(daemon.stop(self.path))
+
+    def test_forward_to_daemon(self):
+        self.assertTrue(daemon.start(self.path))
+        self.addCleanup(daemon.stop, self.path)
+        self.assertTrue(daemon.running(self.path))
+
+        # Test that output goes to the client's stdout and exit codes are returned
+        result = self.forward("cache", "stats")
+        self.assertEqual(0, result.returncode, msg=result.stdout)
+        self.assertIn(b"Issue cache:", result.stdout)
+
+        result = self.forward("branch")
+        self.assertEqual(2, result.returncode, msg=result.stdout)
+        self.assertIn(b"Missing argument", result.stdout)
+
+        # Test that the client runs the daemon commands itself
+        result = self.forward("--repos-jobs", "2", "daemon", "status")
+        self.assertEqual(99, result.returncode, msg=result.stdout)
+
+        # Test that the daemon is still running after a failed command
+        self.assertTrue(daemon.running(self.path))
+        self.assertTrue(daemon.stop(self.path))
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_client_hang_up(self):
+        self.assertTrue(daemon.start(self.path))
+        self.addCleanup(daemon.stop, self.path)
+        repo = os.path.join(self.directory.name, "repo")
+        subprocess.run(["git", "init", "-q", repo], check=True)
+
+        # Start a command that waits for an answer to a prompt
+        waiting = subprocess.Popen(
+            [sys.executable, "-c", FORWARD, "commit", "-m", "Fix typo"],
+            cwd=repo,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            env=dict(self.env, PYTHONPATH=ROOT),
+        )
+        self.addCleanup(waiting.communicate)
+        self.addCleanup(waiting.kill)
+        self.assertIn(b"issue tracker API", waiting.stdout.readline())
+
+        # Test that status is answered and other commands are sent back
+        self.assertTrue(daemon.running(self.path))
+        self.assertEqual(99, self.forward("cache", "stats").returncode)
+
+        # Test that the command is interrupted when the client hangs up
+        waiting.kill()
+        self.assertTrue(self.wait_for(lambda: self.forward("cache", "stats"), 0))
+
+    def wait_for(self, forward, returncode: int) -> bool:
+        """ Forward a command until it exits with the return code. """
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            if forward().returncode == returncode:
+                return True
+            time.sleep(0.05)
+        return False
+
+
+# Run the tests
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import subprocess
+import sys
+import time
+import unittest
+import mock
+
+from mgit import execute
+
+
+def python(code: str) -> list:
+    return [sys.executable, "-c", code]
+
+
+class ExecuteTestCase(unittest.TestCase):
+    def test_call(self):
+        self.assertEqual(0, execute.call(python("pass")))
+        self.assertEqual(3, execute.call(python("exit(3)"), abort=False))
+        with self.assertRaises(SystemExit) as context:
+            execute.call(python("exit(3)"))
+        self.assertEqual(3, context.exception.code)
+
+    def test_call_timeout(self):
+        start = time.monotonic()
+        code = execute.call(
+            python("import time; time.sleep(10)"), abort=False, timeout=0.2
+        )
+        self.assertEqual(execute.TIMEOUT_EXIT_CODE, code)
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_output(self):
+        command = python("import sys; print('a'); sys.stderr.write('b\\n')")
+        with mock.patch("sys.stderr") as mock_stderr:
+            self.assertEqual("a\n", execute.output(command))
+        mock_stderr.write.assert_called_with("b\n")
+        self.assertEqual("", execute.output(python("exit(1)"), abort=False))
+
+    @mock.patch.dict("os.environ", {"MGIT_COMMAND_TIMEOUT": "0.2"})
+    def test_output_default_timeout(self):
+        command = python("import time; print('a', flush=True); time.sleep(10)")
+        self.assertEqual("", execute.output(command, abort=False))
+
+    def test_stream(self):
+        code = "import sys\nfor i in range(3000):\n    print(i)\nsys.exit(2)"
+        lines = execute.stream(python(code))
+        self.assertEqual(("stdout", "0\n"), next(lines))
+        rest = []
+        with self.assertRaises(subprocess.CalledProcessError) as context:
+            for line in lines:
+                rest.append(line)
+        self.assertEqual(2999, len(rest))
+        self.assertEqual(2, context.exception.returncode)
+
+        # Test that the command is killed when the generator is closed early
+        command = python("import time; print('a', flush=True); time.sleep(10)")
+        lines = execute.stream(command)
+        start = time.monotonic()
+        self.assertEqual(("stdout", "a\n"), next(lines))
+        lines.close()
+        self.assertLess(time.monotonic() - start, 5)
+
+    @mock.patch("mgit.execute.CHUNK_SIZE", 1000)
+    def test_stream_chunked(self):
+        code = "import sys; sys.stdout.write('é\\0' * 3000)"
+        chunks = list(execute.stream(python(code), chunked=True))
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(chunk) <= 1000 for _, chunk in chunks))
+        self.assertEqual("é\0" * 3000, "".join(chunk for _, chunk in chunks))
+
+    def test_stream_timeout(self):
+        lines = execute.stream(python("import time; time.sleep(10)"), timeout=0.2)
+        with self.assertRaises(subprocess.TimeoutExpired):
+            list(lines)
@@ -2,41 +2,83 @@ import unittest
 import mock
 from subprocess import DEVNULL, CalledProcessError as ProcessError
 
+from mgit import backends
 from mgit import git
+from mgit import repos
 
 BASE_BRANCH = "my_base_branch"
 
+# Keyword arguments of the `subprocess.call` made for every Git command.
+CALL = {"shell": False, "timeout": None, "cwd": None}
+
 # TODO: Add descriptions for each function.
 class GitTestCase(unittest.TestCase):
-    @mock.patch("mgit.git.os.path.isdir")
-    def test_initialized(self, mock_isdir):
-        mock_isdir.return_value = False
+    def setUp(self):
+        git.invalidate()
+
+    @mock.patch("mgit.repos.locate")
+    def test_initialized(self, mock_locate):
+        mock_locate.return_value = None
         self.assertFalse(git.initialized())
-        mock_isdir.assert_called_with(".git")
 
-        mock_isdir.return_value = True
+        mock_locate.return_value = repos.Location("/src", "/src/.git", "/src/.git")
         self.assertTrue(git.initialized())
-        mock_isdir.assert_called_with(".git")
 
-    @mock.patch("mgit.git.subprocess.check_output")
+    @mock.patch("mgit.git.backend", backends.SubprocessBackend)
+    @mock.patch("mgit.backends.subprocess.check_output")
     def test_current_branch(self, mock_check_output):
         mock_check_output.return_value = b"my_branch_name"
         self.assertEqual("my_branch_name", git.current_branch())
         args = ["git", "rev-parse", "--abbrev-ref", "HEAD"]
-        mock_check_output.assert_called_with(args)
+        mock_check_output.assert_called_with(args, cwd=None)
 
-    @mock.patch("mgit.git.subprocess.check_call")
-    def test_branch_exists_true(self, mock_check_call):
+    @mock.patch("mgit.git.backend", backends.SubprocessBackend)
+    @mock.patch("mgit.backends.subprocess.check_output")
+    def test_branch_exists_true(self, mock_check_output):
+        mock_check_output.return_value = f"refs/heads/{BASE_BRANCH}\n".encode()
         self.assertTrue(git.branch_exists(BASE_BRANCH))
-        args = ["git", "rev-parse", "--quiet", "--verify", BASE_BRANCH]
-        mock_check_call.assert_called_with(args, stdout=DEVNULL)
+        args = ["git", "for-each-ref", "--format=%(refname)"]
+        mock_check_output.assert_called_with(args, cwd=None)
 
-    @mock.patch("mgit.git.subprocess.check_call")
-    def test_branch_exists_false(self, mock_check_call):
-        args = ["git", "rev-parse", "--quiet", "--verify", BASE_BRANCH]
-        mock_check_call.side_effect = ProcessError(returncode=17, cmd="".join(args))
+    @mock.patch("mgit.git.backend", backends.SubprocessBackend)
+    @mock.patch("mgit.backends.subprocess.check_output")
+    def test_branch_exists_false(self, mock_check_output):
+        mock_check_output.return_value = b"refs/heads/master\n"
         self.assertFalse(git.branch_exists(BASE_BRANCH))
-        mock_check_call.assert_called_with(args, stdout=DEVNULL)
+
+    @mock.patch("mgit.git.backend", backends.SubprocessBackend)
+    @mock.patch("mgit.backends.subprocess.check_call")
+    def test_branch_exists_revision(self, mock_check_call):
+        args = ["git", "rev-parse", "--quiet", "--verify", "HEAD~1"]
+        mock_check_call.side_effect = ProcessError(returncode=17, cmd="".join(args))
+        self.assertFalse(git.branch_exists("HEAD~1"))
+        mock_check_call.assert_called_with(args, stdout=DEVNULL, cwd=None)
+
+    @mock.patch("mgit.git.backend", backends.SubprocessBackend)
+    @mock.patch("mgit.backends.subprocess.check_output")
+    def test_state_is_reused_until_invalidated(self, mock_check_output):
+        mock_check_output.return_value = b"my_branch_name"
+        git.current_branch()
+        git.current_branch()
+        self.assertEqual(1, mock_check_output.call_count)
+
+        git.invalidate()
+        git.current_branch()
+        self.assertEqual(2, mock_check_output.call_count)
+
+    @mock.patch("mgit.git.backend", backends.SubprocessBackend)
+    @mock.patch("mgit.backends.subprocess.check_output")
+    def test_assignee(self, mock_check_output):
+        mock_check_output.return_value = b"user.name\nJane\0user.handle\njane\0"
+        self.assertEqual("jane", git.assignee())
+        args = ["git", "config", "--list", "-z", "--global"]
+        mock_check_output.assert_called_with(args, cwd=None)
+
+    @mock.patch.dict("os.environ", {"MGIT_GIT_BACKEND": "subprocess"})
+    @mock.patch.dict("mgit.git._backends", clear=True)
+    def test_backend(self):
+        self.assertIsInstance(git.backend(), backends.SubprocessBackend)
+        self.assertNotIsInstance(git.backend(), backends.FileBackend)
 
     @mock.patch("mgit.git.branch_exists")
     def test_default_base_branch(self, mock_branch_exists):
@@ -50,42 +92,228 @@ class GitTestCase(unittest.TestCase):
             mock_branch_exists.side_effect = side_effect
             self.assertEqual(branch, git.default_base_branch())
 
-    @mock.patch("mgit.git.subprocess.call")
-    def test_create_branch(self, mock_call):
+    @mock.patch("mgit.git.invalidate")
+    @mock.patch("mgit.execute.subprocess.call", return_value=0)
+    def test_create_branch(self, mock_call, mock_invalidate):
         new_branch = "my_new_branch"
-        git.create_branch(BASE_BRANCH, new_branch)
+        timings = git.create_branch(BASE_BRANCH, new_branch)
         mock_call.assert_has_calls(
             [
-                mock.call(["git", "checkout", BASE_BRANCH]),
-                mock.call(["git", "pull"]),
-                mock.call(["git", "checkout", "-b", new_branch]),
+                mock.call(["git", "fetch", "origin", BASE_BRANCH], **CALL),
+                mock.call(
+                    [
+                        "git",
+                        "checkout",
+                        "--no-track",
+                        "-b",
+                        new_branch,
+                        f"origin/{BASE_BRANCH}",
+                    ],
+                    **CALL,
+                ),
             ]
         )
+        self.assertEqual(2, mock_call.call_count)
+        self.assertEqual(["fetch", "checkout"], list(timings))
+        mock_invalidate.assert_called()
 
-    @mock.patch("mgit.git.subprocess.call")
-    def test_commit_all(self, mock_call):
-        message = "Add new files"
-        git.commit_all(message)
+    @mock.patch("mgit.git.invalidate")
+    @mock.patch("mgit.execute.subprocess.call")
+    def test_create_branch_without_switching(self, mock_call, mock_invalidate):
+        # Test that the local base branch is used when it can't be fetched
+        mock_call.side_effect = [128, 0]
+        timings = git.create_branch(BASE_BRANCH, "my_new_branch", switch=False)
+        mock_call.assert_called_with(
+            ["git", "branch", "--no-track", "my_new_branch", BASE_BRANCH], **CALL
+        )
+        self.assertEqual(["fetch", "branch"], list(timings))
+
+    @mock.patch("mgit.execute.subprocess.call")
+    def test_create_branches(self, mock_call):
+        mock_call.side_effect = [0, 0, 128]
+        results = git.create_branches(BASE_BRANCH, ["new_1", "new_2"])
+        self.assertEqual({"new_1": True, "new_2": False}, results)
         mock_call.assert_has_calls(
             [
-                mock.call(["git", "add", "."], shell=False),
-                mock.call(f'git commit -m "{message}"', shell=True),
+                mock.call(["git", "fetch", "origin", BASE_BRANCH], **CALL),
+                mock.call(
+                    ["git", "branch", "--no-track", "new_1", f"origin/{BASE_BRANCH}"],
+                    **CALL,
+                ),
+                mock.call(
+                    ["git", "branch", "--no-track", "new_2", f"origin/{BASE_BRANCH}"],
+                    **CALL,
+                ),
             ]
         )
 
-    @mock.patch("mgit.git.subprocess.call")
-    def test_push(self, mock_call):
-        git.push(BASE_BRANCH)
+        # Test that the local base branch is used when it can't be fetched
+        mock_call.side_effect = [128, 0]
+        git.create_branches(BASE_BRANCH, ["new_1"])
+        mock_call.assert_called_with(
+            ["git", "branch", "--no-track", "new_1", BASE_BRANCH], **CALL
+        )
+
+    @mock.patch("mgit.git.version", return_value=(2, 38, 0))
+    @mock.patch("mgit.execute.subprocess.call", return_value=0)
+    def test_rebase(self, mock_call, mock_version):
+        git.rebase(BASE_BRANCH)
         mock_call.assert_has_calls(
             [
-                mock.call(["git", "push", "-f"], shell=False),
+                mock.call(["git", "fetch", "origin", BASE_BRANCH], **CALL),
                 mock.call(
-                    ["git", "push", "--set-upstream", "origin", BASE_BRANCH],
-                    shell=False,
+                    ["git", "rebase", "--autostash", f"origin/{BASE_BRANCH}"],
+                    **CALL,
                 ),
             ]
         )
+        self.assertEqual(2, mock_call.call_count)
+
+        # Test that the base branch is not fetched twice
+        mock_call.reset_mock()
+        with mock.patch("mgit.git.branch_exists", return_value=False):
+            git.rebase(
+                BASE_BRANCH, update=False, interactive=True, update_refs=True
+            )
+        mock_call.assert_called_once_with(
+            ["git", "rebase", "--interactive", "--autostash", "--update-refs"]
+            + [BASE_BRANCH],
+            **CALL,
+        )
+
+        # Test that --update-refs is skipped for older versions of Git
+        mock_version.return_value = (2, 37, 1)
+        mock_call.side_effect = [128, 0]
+        git.rebase(BASE_BRANCH, autostash=False, update_refs=True)
+        mock_call.assert_called_with(["git", "rebase", BASE_BRANCH], **CALL)
 
+        # Test that a conflict is raised
+        mock_call.side_effect = [0, 1]
+        with self.assertRaises(ProcessError):
+            git.rebase(BASE_BRANCH)
+
+    @mock.patch("mgit.execute.output")
+    def test_version(self, mock_output):
+        mock_output.return_value = "git version 2.39.5 (Apple Git-154)\n"
+        with mock.patch("mgit.git._version", None):
+            self.assertEqual((2, 39, 5), git.version())
+            self.assertEqual((2, 39, 5), git.version())
+        mock_output.assert_called_once_with(["git", "--version"], abort=False)
+
+    @mock.patch("mgit.git._file_size", return_value=10)
+    @mock.patch("mgit.execute.stream")
+    def test_status(self, mock_stream, mock_file_size):
+        mode = "N... 100644 100644 100644"
+        objects = "ce013625030ba8dba906f756967f9e9ca394464a " * 2
+        mock_stream.return_value = [
+            ("stdout", f"1 .M {mode} {objects}README.md\0? new "),
+            ("stdout", "file.txt\0"),
+            ("stdout", f"2 R. {mode} {objects}R100 docs/b.md\0docs/a.md\0"),
+            ("stderr", "warning: LF will be replaced by CRLF\n"),
+        ]
+        with mock.patch("sys.stderr"):
+            changes = git.status()
+        self.assertEqual(
+            [
+                git.Change(".M", "README.md", "", 10),
+                git.Change("??", "new file.txt", "", 10),
+                git.Change("R.", "docs/b.md", "docs/a.md", 10),
+            ],
+            changes,
+        )
+        mock_stream.assert_called_once_with(
+            ["git", "status", "--porcelain=v2", "-z", "--untracked-files=all"],
+            chunked=True,
+        )
+
+    @mock.patch("mgit.git.version", return_value=(2, 39, 5))
+    @mock.patch("mgit.execute.subprocess.run")
+    def test_commit_all(self, mock_run, mock_version):
+        mock_run.return_value.returncode = 0
+        message = 'Add "new" files'
+        changes = [
+            git.Change("R.", "b.md", "a.md", 10),
+            git.Change(".M", "README.md", "", 10),
+            git.Change("??", "new*.txt", "", 10),
+        ]
+        with mock.patch("mgit.git.repos.root", return_value="/src/api"):
+            self.assertTrue(git.commit_all(message, changes))
+
+        call = dict(CALL, cwd="/src/api")
+        add = ["git", "--literal-pathspecs", "add", "--all"]
+        add += ["--pathspec-from-file=-", "--pathspec-file-nul"]
+        commit = ["git", "commit", "--file", "-"]
+        mock_run.assert_has_calls(
+            [
+                mock.call(add, input=b"README.md\0new*.txt", **call),
+                mock.call(commit, input=message.encode(), **call),
+            ]
+        )
+
+        # Test that nothing is run when the repo is clean
+        mock_run.reset_mock()
+        with mock.patch("mgit.git.status", return_value=[]):
+            self.assertFalse(git.commit_all(message))
+        mock_run.assert_not_called()
+
+    @mock.patch("mgit.git.version", return_value=(2, 25, 0))
+    @mock.patch("mgit.execute.subprocess.call", return_value=0)
+    def test_stage(self, mock_call, mock_version):
+        paths = [f"file_{index}" for index in range(git.ADD_BATCH_SIZE + 1)]
+        git.stage(paths)
+        add = ["git", "--literal-pathspecs", "add", "--all", "--"]
+        mock_call.assert_has_calls(
+            [
+                mock.call(add + paths[:-1], **CALL),
+                mock.call(add + paths[-1:], **CALL),
+            ]
+        )
+
+    @mock.patch("mgit.git.has_upstream")
+    @mock.patch("mgit.execute.stream")
+    def test_push(self, mock_stream, mock_has_upstream):
+        mock_has_upstream.return_value = False
+        progress = "Writing objects:  50% (1/2)\rWriting objects: 100% (2/2), "
+        mock_stream.return_value = [
+            ("stderr", progress + "1.50 KiB | 1.50 MiB/s, done.\n"),
+            ("stdout", "To github.com:greganswer/mgit.git\n"),
+            ("stdout", f"*\trefs/heads/{BASE_BRANCH}:refs/heads/{BASE_BRANCH}\tnew\n"),
+            ("stdout", "!\trefs/heads/new_1:refs/heads/new_1\t[rejected]\n"),
+            ("stdout", "Done\n"),
+        ]
+        with mock.patch("sys.stderr"):
+            result = git.push(BASE_BRANCH, "new_1")
+        self.assertEqual({BASE_BRANCH: True, "new_1": False}, result["branches"])
+        self.assertEqual(1536, result["bytes"])
+        mock_stream.assert_called_once_with(
+            ["git", "push", "--porcelain", "--progress", "--force-with-lease"]
+            + ["--set-upstream", "origin"]
+            + [f"{BASE_BRANCH}:refs/heads/{BASE_BRANCH}", "new_1:refs/heads/new_1"]
+        )
+
+        # Test that the upstream is only set when a branch has none
+        mock_has_upstream.return_value = True
+        mock_stream.return_value = [("stdout", "Done\n")]
+        with mock.patch("mgit.git.current_branch", return_value=BASE_BRANCH):
+            result = git.push()
+        self.assertEqual({BASE_BRANCH: False}, result["branches"])
+        self.assertNotIn("--set-upstream", mock_stream.call_args[0][0])
+
+    @mock.patch("mgit.git.state")
+    def test_has_upstream(self, mock_state):
+        config = {"branch.new_1.remote": "origin", "branch.new_1.merge": "refs/heads/a"}
+        mock_state.return_value.config = lambda key: config.get(key, "")
+        self.assertTrue(git.has_upstream("new_1"))
+        self.assertFalse(git.has_upstream(BASE_BRANCH))
+
+    @mock.patch("mgit.execute.subprocess.call", return_value=0)
+    def test_pull_request(self, mock_call):
+        git.pull_request(BASE_BRANCH, "Body", "octocat", labels=["bug", "docs"])
+        mock_call.assert_called_once_with(
+            ["hub", "pull-request", "-fpo", "-b", BASE_BRANCH, "-m", "Body"]
+            + ["-a", "octocat", "-l", "bug,docs"],
+            **CALL,
+        )
 
 # Run the tests
 if __name__ == "__main__":
@@ -0,0 +1,154 @@
+import json
+import os
+import threading
+import unittest
+import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from requests.exceptions import HTTPError
+
+from mgit import configs
+from mgit import github
+from mgit import issues
+
+REPO = "fake_user/fake_repo"
+
+
+class FakeGitHub:
+    def __init__(self):
+        """
+        Local stand-in for the GitHub pull request API.
+
+        Every request is recorded as (method, path, JSON body, headers).
+        Creating a pull request for a branch that has one fails with a 422.
+        """
+        self.requests = []
+        self.pulls = {}
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                data = self._record()
+                if data["head"] in fake.pulls:
+                    errors = [{"message": "A pull request already exists"}]
+                    body = {"message": "Validation Failed", "errors": errors}
+                    return self._respond(422, body)
+
+                number = len(fake.pulls) + 1
+                fake.pulls[data["head"]] = number
+                html_url = f"https://github.com/{REPO}/pull/{number}"
+                self._respond(201, {"number": number, "html_url": html_url})
+
+            def do_PATCH(self):
+                self._record()
+                self._respond(200, {})
+
+            def _record(self):
+                length = int(self.headers.get("Content-Length", 0))
+                data = json.loads(self.rfile.read(length) or b"{}")
+                fake.requests.append((self.command, self.path, data, self.headers))
+                return data
+
+            def _respond(self, status, data):
+                body = json.dumps(data).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+class GitHubTestCase(unittest.TestCase):
+    def setUp(self):
+        self.github = FakeGitHub().__enter__()
+        self.addCleanup(self.github.__exit__)
+        env = {"MGIT_GITHUB_API": self.github.url, "MGIT_GITHUB_API_TOKEN": "secret"}
+        patcher = mock.patch.dict(os.environ, env)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = issues.IssueTrackerClient(max_retries=0)
+
+    def test_create_pull_request(self):
+        pull = github.create_pull_request(
+            REPO,
+            "master",
+            "jir-7-update-readme",
+            "Update Readme",
+            "Closes #7",
+            assignees=["octocat", ""],
+            labels=["docs"],
+            tracker_client=self.client,
+        )
+
+        self.assertEqual(1, pull["number"])
+        (post, path, data, headers), patch = self.github.requests
+        self.assertEqual(("POST", f"/repos/{REPO}/pulls"), (post, path))
+        self.assertEqual(
+            {
+                "title": "Update Readme",
+                "head": "jir-7-update-readme",
+                "base": "master",
+                "body": "Closes #7",
+            },
+            data,
+        )
+        self.assertEqual("token secret", headers["Authorization"])
+        self.assertEqual(
+            ("PATCH", f"/repos/{REPO}/issues/1"), (patch[0], patch[1]),
+        )
+        self.assertEqual({"assignees": ["octocat"], "labels": ["docs"]}, patch[2])
+
+        # Test that both requests went through the pooled client
+        self.assertEqual(2, self.client.stats["requests"])
+
+    def test_create_pull_request_without_assignees_or_labels(self):
+        github.create_pull_request(
+            REPO, "master", "jir-7", "Title", tracker_client=self.client
+        )
+        self.assertEqual(["POST"], [request[0] for request in self.github.requests])
+
+    def test_create_pull_request_errors(self):
+        github.create_pull_request(
+            REPO, "master", "jir-7", "Title", tracker_client=self.client
+        )
+        with self.assertRaisesRegex(HTTPError, "A pull request already exists"):
+            github.create_pull_request(
+                REPO, "master", "jir-7", "Title", tracker_client=self.client
+            )
+
+    def test_repository(self):
+        config = configs.Settings(
+            issue_tracker_api=f"https://api.github.com/repos/{REPO}/issues"
+        )
+        self.assertEqual(REPO, github.repository(config))
+
+        config = configs.Settings(issue_tracker_api="https://jira.example.com/issue")
+        for remote_url in [
+            f"git@github.com:{REPO}.git",
+            f"https://github.com/{REPO}.git",
+            f"https://github.com/{REPO}",
+        ]:
+            self.assertEqual(REPO, github.repository(config, remote_url))
+        self.assertEqual("", github.repository(config, "git@gitlab.com:a/b.git"))
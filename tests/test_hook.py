@@ -0,0 +1,95 @@
+import os
+import subprocess
+import tempfile
+import unittest
+import mock
+
+from mgit import hook
+
+ENV = {
+    "GIT_AUTHOR_NAME": "mgit",
+    "GIT_AUTHOR_EMAIL": "mgit@example.com",
+    "GIT_COMMITTER_NAME": "mgit",
+    "GIT_COMMITTER_EMAIL": "mgit@example.com",
+}
+BRANCH = "jir-12-update-readme"
+INDEX = f"branch\tmain\t\nbranch\t{BRANCH}\tJIR-12: Update The Readme File\n"
+
+
+class HookTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.repo = os.path.join(self.directory.name, "repo")
+        self.cache_dir = os.path.join(self.directory.name, "cache")
+        patcher = mock.patch.dict(os.environ, dict(ENV, MGIT_CACHE_DIR=self.cache_dir))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        os.makedirs(self.cache_dir)
+        with open(os.path.join(self.cache_dir, "completion.tsv"), "w") as outfile:
+            outfile.write(INDEX)
+        subprocess.run(["git", "init", "-q", "-b", BRANCH, self.repo], check=True)
+        self.git_dir = os.path.join(self.repo, ".git")
+
+    def test_install(self):
+        hooks_dir = os.path.join(self.git_dir, "hooks")
+        path = hook.install(hooks_dir)
+        self.assertEqual(os.path.join(hooks_dir, hook.NAME), path)
+        self.assertTrue(os.access(path, os.X_OK))
+
+        # Test that the hook is updated, but other hooks are left alone
+        self.assertEqual(path, hook.install(hooks_dir))
+        with open(path, "w") as outfile:
+            outfile.write("#!/bin/sh\nexit 0\n")
+        with self.assertRaises(FileExistsError):
+            hook.install(hooks_dir)
+        hook.install(hooks_dir, force=True)
+        with open(path) as infile:
+            self.assertIn(hook.MARKER, infile.read())
+
+    def test_commit(self):
+        hook.install(os.path.join(self.git_dir, "hooks"))
+        git = ["git", "-C", self.repo]
+        commit = git + ["commit", "-q", "--allow-empty"]
+        subprocess.run(commit + ["--no-edit"], check=True)
+        subprocess.run(commit + ["-m", "Fix typo"], check=True)
+        log = subprocess.run(
+            git + ["log", "--format=%s"], stdout=subprocess.PIPE, check=True
+        )
+        messages = log.stdout.decode("utf-8").splitlines()
+        self.assertEqual(["Fix typo", "JIR-12: Update The Readme File"], messages)
+
+    def test_main(self):
+        message_path = os.path.join(self.git_dir, "COMMIT_EDITMSG")
+        with open(message_path, "w") as outfile:
+            outfile.write("\n# Please enter the commit message.\n")
+
+        with mock.patch.dict(os.environ, {"GIT_DIR": self.git_dir}):
+            self.assertEqual(0, hook.main([message_path, "message"]))
+            with open(message_path) as infile:
+                self.assertEqual("\n# Please", infile.read(9))
+
+            self.assertEqual(0, hook.main([message_path]))
+        with open(message_path) as infile:
+            message = infile.read()
+        self.assertEqual("JIR-12: Update The Readme File\n\n# Please", message[:40])
+
+    @mock.patch("mgit.hook._uncached_message")
+    def test_branch_message(self, mock_uncached_message):
+        mock_uncached_message.return_value = "JIR-13: Add Login Page"
+        self.assertEqual("", hook.branch_message("main", self.git_dir))
+        self.assertEqual("", hook.branch_message("", self.git_dir))
+        self.assertEqual(
+            "JIR-13: Add Login Page", hook.branch_message("jir-13-login", self.git_dir)
+        )
+
+        # Test that the index isn't used once the issue cache changed
+        issues_path = os.path.join(self.cache_dir, "issues.json")
+        with open(issues_path, "w") as outfile:
+            outfile.write("{}")
+        future = os.stat(issues_path).st_mtime + 1
+        os.utime(issues_path, (future, future))
+        self.assertEqual(
+            "JIR-13: Add Login Page", hook.branch_message(BRANCH, self.git_dir)
+        )
@@ -1,8 +1,12 @@
+import os
+import tempfile
 import unittest
 import mock
 from subprocess import DEVNULL, CalledProcessError as ProcessError
-from requests.exceptions import Timeout
+from requests.exceptions import ConnectionError, HTTPError, Timeout
 
+from mgit import cache
+from mgit import configs
 from mgit import issues
 
 
@@ -24,24 +28,270 @@ class IssuesTestCase(unittest.TestCase):
         record = issues.from_branch("123-update-readme-file")
         self.assertEqual(str(record), "123: Update Readme File")
 
-    @mock.patch("mgit.issues.requests")
-    def test_from_tracker(self, mock_requests):
+        # Test that prefixes and segments starting with digits are skipped
+        record = issues.from_branch("feature/2fa-jir-123-update-readme-file")
+        self.assertEqual(str(record), "JIR-123: Update Readme File")
+
+        # Test branch without an ID
+        self.assertEqual("", issues.from_branch("master").id)
+
+    def test_from_branch_with_issue_key_pattern(self):
+        config = configs.Settings(issue_key_pattern="github")
+        self.assertEqual("", issues.from_branch("jir-abc-update", config).id)
+        self.assertEqual("42", issues.from_branch("42-update", config).id)
+
+        config = configs.Settings(issue_key_pattern=r"ops\d+")
+        record = issues.from_branch("hotfix-ops7-restart-workers", config)
+        self.assertEqual(str(record), "OPS7: Restart Workers")
+
+    @mock.patch("mgit.issues.inflection")
+    def test_derived_fields_are_memoized(self, mock_inflection):
+        record = issues.Issue("JIR-123", "update readme file")
+        for _ in range(3):
+            record.branch_name
+            record.title
+        mock_inflection.parameterize.assert_called_once()
+        mock_inflection.titleize.assert_called_once()
+
+    def test_branch_index(self):
+        refs = [
+            "refs/heads/master",
+            "refs/heads/jir-123-update-readme-file",
+            "refs/heads/feature/2fa-jir-124-add-login",
+            "refs/remotes/origin/HEAD",
+            "refs/remotes/origin/jir-123-update-readme-file",
+            "refs/remotes/origin/42-fix-typo",
+            "refs/tags/jir-125-release",
+        ]
+        self.assertEqual(
+            {
+                "jir-123-update-readme-file": "JIR-123",
+                "feature/2fa-jir-124-add-login": "JIR-124",
+                "origin/jir-123-update-readme-file": "JIR-123",
+                "origin/42-fix-typo": "42",
+            },
+            issues.branch_index(refs, configs.Settings()),
+        )
+
+    @mock.patch("requests.Session.get")
+    def test_from_tracker(self, mock_get):
         # Create a new Mock to imitate a Response
         mock_response = mock.Mock(
-            **{"status_code": 200, "json.return_value": {"title": "update readme file"}}
+            **{
+                "status_code": 200,
+                "headers": {},
+                "json.return_value": {"title": "update readme file"},
+            }
         )
 
         # Test that the first request raises a Timeout
-        mock_requests.get.side_effect = Timeout
+        mock_get.side_effect = Timeout
         with self.assertRaises(Timeout):
             issues.from_tracker("JIR-123")
 
         # Test alphanumeric ID
-        mock_requests.get.side_effect = [mock_response]
+        mock_get.side_effect = [mock_response]
         record = issues.from_tracker("JIR-123")
         self.assertEqual(str(record), "JIR-123: Update Readme File")
 
         # Test numeric ID
-        mock_requests.get.side_effect = [mock_response]
+        mock_get.side_effect = [mock_response]
         record = issues.from_tracker("123")
         self.assertEqual(str(record), "123: Update Readme File")
+
+    @mock.patch("requests.Session.get")
+    def test_from_tracker_with_cache(self, mock_get):
+        mock_response = mock.Mock(
+            **{
+                "status_code": 200,
+                "headers": {"ETag": '"abc"'},
+                "json.return_value": {"title": "update readme file"},
+            }
+        )
+        mock_get.return_value = mock_response
+
+        with tempfile.TemporaryDirectory() as directory:
+            issue_cache = cache.IssueCache(os.path.join(directory, "issues.json"))
+
+            # Test that the first request is stored and the second is served from cache
+            issues.from_tracker("JIR-123", cache=issue_cache)
+            record = issues.from_tracker("JIR-123", cache=issue_cache)
+            self.assertEqual(str(record), "JIR-123: Update Readme File")
+            self.assertEqual(1, mock_get.call_count)
+
+            # Test that issue IDs typed in lower case share the entry
+            record = issues.from_tracker("jir-123", cache=issue_cache)
+            self.assertEqual(str(record), "JIR-123: Update Readme File")
+            results = issues.from_tracker_many(["jir-123"], cache=issue_cache)
+            self.assertEqual("JIR-123", results["jir-123"].id)
+            self.assertEqual(1, mock_get.call_count)
+
+    @mock.patch("requests.Session.get")
+    def test_from_tracker_revalidates_stale_cache(self, mock_get):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "issues.json")
+            issue_cache = cache.IssueCache(path, ttl=0)
+            url = f"{issues.configs.settings().issue_tracker_api}/JIR-123"
+            issue_cache.store(url, "update readme file", {"ETag": '"abc"'})
+
+            # Test that a 304 response uses the cached summary
+            mock_get.return_value = mock.Mock(status_code=304)
+            record = issues.from_tracker("JIR-123", cache=issue_cache)
+            self.assertEqual(str(record), "JIR-123: Update Readme File")
+            headers = mock_get.call_args[1]["headers"]
+            self.assertEqual('"abc"', headers["If-None-Match"])
+            self.assertEqual(1, issue_cache.stats()["revalidated"])
+
+            # Test that the stale summary is used when the tracker is unreachable
+            mock_get.side_effect = ConnectionError()
+            with mock.patch.object(issues.client(), "_max_retries", 0):
+                record = issues.from_tracker("JIR-123", cache=issue_cache)
+            self.assertEqual(str(record), "JIR-123: Update Readme File")
+            self.assertEqual(
+                "JIR-123", issues.from_cache("JIR-123", cache=issue_cache).id
+            )
+            self.assertIsNone(issues.from_cache("JIR-124", cache=issue_cache))
+
+    @mock.patch.dict(os.environ, {"MGIT_GITHUB_API_TOKEN": "", "GITHUB_TOKEN": ""})
+    @mock.patch("requests.Session.get")
+    def test_from_tracker_many(self, mock_get):
+        def page(numbers, next_url=None):
+            links = {"next": {"url": next_url}} if next_url else {}
+            issues_json = [{"number": n, "title": f"issue {n}"} for n in numbers]
+            return mock.Mock(
+                status_code=200,
+                headers={},
+                links=links,
+                **{"json.return_value": issues_json},
+            )
+
+        not_found = mock.Mock(status_code=404, headers={})
+        not_found.raise_for_status.side_effect = HTTPError("404 Not Found")
+        mock_get.side_effect = [
+            page(range(250, 150, -1), "https://next/2"),
+            page(range(150, 50, -2), "https://next/3"),
+            not_found,
+            not_found,
+        ]
+
+        with tempfile.TemporaryDirectory() as directory:
+            issue_cache = cache.IssueCache(os.path.join(directory, "issues.json"))
+            config = configs.Settings(
+                issue_tracker_api="https://api.github.com/repos/o/r/issues"
+            )
+            results = issues.from_tracker_many(
+                ["200", "120", "JIR-1", "55"], config, issue_cache, jobs=1
+            )
+
+            self.assertEqual("Issue 200", results["200"].title)
+            self.assertEqual("Issue 120", results["120"].title)
+            self.assertIsInstance(results["JIR-1"], HTTPError)
+            self.assertIsInstance(results["55"], HTTPError)
+
+            # Test that paging stops at the oldest wanted issue and the rest is
+            # fetched one by one
+            self.assertEqual("https://next/2", mock_get.call_args_list[1][0][0])
+            self.assertEqual(4, mock_get.call_count)
+            self.assertEqual(2, issue_cache.stats()["entries"])
+            cached = issues.from_cache("120", config, issue_cache)
+            self.assertEqual("Issue 120", cached.title)
+
+            # Test that fresh entries are used without a request
+            results = issues.from_tracker_many(["200", "120"], config, issue_cache)
+            self.assertEqual("Issue 200", results["200"].title)
+            self.assertEqual(4, mock_get.call_count)
+
+    def test_client(self):
+        api = "https://example.atlassian.net/rest/api/2/issue"
+        config = configs.Settings(issue_tracker_api=api, read_timeout=5)
+        same_config = configs.Settings(issue_tracker_api=api, read_timeout="5")
+        other_config = configs.Settings(issue_tracker_api=api, max_retries=0)
+
+        # Test that repos with other timeouts or retries get their own client
+        self.assertIs(issues.client(config), issues.client(same_config))
+        self.assertIsNot(issues.client(config), issues.client(other_config))
+        timeout = (issues.DEFAULT_CONNECT_TIMEOUT, 5.0)
+        self.assertEqual(timeout, issues.client(config)._timeout)
+        self.assertEqual(0, issues.client(other_config)._max_retries)
+
+
+@mock.patch("mgit.issues.time.sleep")
+@mock.patch("requests.Session.get")
+class IssueTrackerClientTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = issues.IssueTrackerClient(max_retries=2, backoff=0.5)
+
+    def test_get(self, mock_get, mock_sleep):
+        mock_get.return_value = mock.Mock(status_code=200, headers={})
+        self.assertEqual(200, self.client.get("http://example.com/7").status_code)
+        mock_get.assert_called_with("http://example.com/7", timeout=(3.05, 10))
+        mock_sleep.assert_not_called()
+        self.assertEqual(1, self.client.stats["requests"])
+
+    def test_get_retries_with_backoff(self, mock_get, mock_sleep):
+        unavailable = mock.Mock(status_code=503, headers={})
+        mock_get.side_effect = [ConnectionError(), unavailable, unavailable]
+        self.assertEqual(503, self.client.get("http://example.com/7").status_code)
+        mock_sleep.assert_has_calls([mock.call(0.5), mock.call(1.0)])
+        self.assertEqual(3, self.client.stats["requests"])
+        self.assertEqual(2, self.client.stats["retries"])
+
+    def test_get_honors_retry_after(self, mock_get, mock_sleep):
+        mock_get.side_effect = [
+            mock.Mock(status_code=429, headers={"Retry-After": "3"}),
+            mock.Mock(status_code=200, headers={}),
+        ]
+        self.assertEqual(200, self.client.get("http://example.com/7").status_code)
+        mock_sleep.assert_called_once_with(3.0)
+
+    @mock.patch("mgit.issues.time.time", return_value=1000)
+    def test_get_honors_rate_limit_reset(self, mock_time, mock_get, mock_sleep):
+        rate_limited = mock.Mock(
+            status_code=403,
+            headers={"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "1002"},
+        )
+        mock_get.side_effect = [rate_limited, mock.Mock(status_code=200, headers={})]
+        self.assertEqual(200, self.client.get("http://example.com/7").status_code)
+        mock_sleep.assert_called_once_with(2.0)
+
+        # Test that long waits are not retried
+        rate_limited.headers["X-RateLimit-Reset"] = "5000"
+        mock_get.side_effect = [rate_limited]
+        self.assertEqual(403, self.client.get("http://example.com/7").status_code)
+
+    def test_get_ignores_malformed_rate_limit_headers(self, mock_get, mock_sleep):
+        throttled = mock.Mock(status_code=429, headers={"Retry-After": "soon"})
+        rate_limited = mock.Mock(
+            status_code=403,
+            headers={"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "never"},
+        )
+        ok = mock.Mock(status_code=200, headers={})
+        mock_get.side_effect = [throttled, rate_limited, ok]
+        self.assertEqual(200, self.client.get("http://example.com/7").status_code)
+        mock_sleep.assert_has_calls([mock.call(0.5), mock.call(1.0)])
+
+    def test_get_does_not_retry_timeouts(self, mock_get, mock_sleep):
+        mock_get.side_effect = Timeout
+        with self.assertRaises(Timeout):
+            self.client.get("http://example.com/7")
+        self.assertEqual(1, mock_get.call_count)
+
+    @mock.patch("requests.Session.post")
+    def test_post_is_only_retried_when_throttled(
+        self, mock_post, mock_get, mock_sleep
+    ):
+        unavailable = mock.Mock(status_code=503, headers={})
+        mock_post.side_effect = [unavailable]
+        res = self.client.request("POST", "http://example.com/pulls", json={})
+        self.assertEqual(503, res.status_code)
+
+        mock_post.side_effect = [ConnectionError()]
+        with self.assertRaises(ConnectionError):
+            self.client.request("POST", "http://example.com/pulls", json={})
+
+        throttled = mock.Mock(status_code=429, headers={"Retry-After": "1"})
+        mock_post.side_effect = [throttled, mock.Mock(status_code=201, headers={})]
+        res = self.client.request("POST", "http://example.com/pulls", json={})
+        self.assertEqual(201, res.status_code)
+        self.assertEqual(4, mock_post.call_count)
+        mock_sleep.assert_called_once_with(1.0)
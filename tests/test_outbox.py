@@ -0,0 +1,123 @@
+import os
+import tempfile
+import time
+import unittest
+import mock
+
+from mgit import outbox
+from mgit import trackers
+
+
+class FakeTracker:
+    def __init__(self, error=None):
+        self.sent = []
+        self.error = error
+
+    def comment(self, issue_id, body, key=""):
+        self.send("comment", issue_id, body, key)
+
+    def transition(self, issue_id, state, key=""):
+        self.send("transition", issue_id, state, key)
+
+    def send(self, *update):
+        if self.error:
+            raise self.error
+        self.sent.append(update)
+
+
+class OutboxTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        patcher = mock.patch.dict(os.environ, {"MGIT_CACHE_DIR": self.directory.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_flush(self):
+        comment = outbox.enqueue("comment", "JIR-1", "Pull request: #8")
+        outbox.enqueue("transition", "JIR-1", "In Progress")
+        review = outbox.enqueue("transition", "jir-1", "In Review")
+        outbox.enqueue("transition", "JIR-2", "In Review")
+        self.assertEqual(4, len(outbox.updates()))
+        with self.assertRaises(ValueError):
+            outbox.enqueue("delete", "JIR-1", "")
+
+        tracker = FakeTracker()
+        self.assertEqual({"sent": 3, "failed": 0}, outbox.flush(tracker))
+
+        # Test that only the last transition of an issue is sent
+        self.assertEqual(
+            [
+                ("comment", "JIR-1", "Pull request: #8", comment),
+                ("transition", "jir-1", "In Review", review),
+                ("transition", "JIR-2", "In Review", mock.ANY),
+            ],
+            tracker.sent,
+        )
+        self.assertEqual([], outbox.updates())
+        self.assertIsNone(outbox.next_retry())
+
+        # Test that the journal was compacted
+        self.assertEqual(0, os.path.getsize(outbox.path()))
+        self.assertEqual({"sent": 0, "failed": 0}, outbox.flush(tracker))
+
+    def test_retry(self):
+        key = outbox.enqueue("comment", "JIR-1", "Started")
+        error = ConnectionError("Tracker is down")
+        self.assertEqual({"sent": 0, "failed": 1}, outbox.flush(FakeTracker(error)))
+
+        (update,) = outbox.updates()
+        self.assertEqual(key, update["key"])
+        self.assertEqual((1, "Tracker is down"), (update["attempts"], update["error"]))
+        self.assertFalse(outbox.due(update))
+        self.assertTrue(outbox.due(update, now=time.time() + outbox.BACKOFF))
+        self.assertGreater(outbox.next_retry(), 0)
+
+        # Test that updates waiting for a retry are only sent when forced
+        tracker = FakeTracker()
+        self.assertEqual({"sent": 0, "failed": 0}, outbox.flush(tracker))
+        self.assertEqual({"sent": 1, "failed": 0}, outbox.flush(tracker, force=True))
+        self.assertEqual([], outbox.updates())
+
+    def test_permanent_error(self):
+        outbox.enqueue("transition", "JIR-1", "Done")
+        error = trackers.TransitionNotFound("JIR-1 can't be moved to Done")
+        outbox.flush(FakeTracker(error))
+
+        (update,) = outbox.updates()
+        self.assertEqual(outbox.MAX_ATTEMPTS, update["attempts"])
+        self.assertFalse(outbox.due(update, now=time.time() + 10 ** 6))
+        self.assertIsNone(outbox.next_retry())
+
+        stats = outbox.stats()
+        self.assertEqual((0, 1), (stats["pending"], stats["failed"]))
+        self.assertFalse(stats["worker"])
+
+    def test_unsupported_update(self):
+        outbox.enqueue("comment", "JIR-1", "Started")
+        tracker = trackers.Tracker(mock.Mock(issue_tracker_api="https://x.com/1"))
+        self.assertEqual({"sent": 0, "failed": 1}, outbox.flush(tracker))
+
+        (update,) = outbox.updates()
+        self.assertEqual("Tracker doesn't support comment updates", update["error"])
+        self.assertFalse(outbox.due(update, now=time.time() + 10 ** 6))
+
+    def test_flush_while_worker_runs(self):
+        outbox.enqueue("comment", "JIR-1", "Started")
+        with outbox._lock(outbox.WORKER_LOCK_FILENAME):
+            self.assertIsNone(outbox.flush(FakeTracker()))
+        self.assertEqual(1, len(outbox.updates()))
+
+    def test_truncated_line(self):
+        outbox.enqueue("comment", "JIR-1", "Started")
+        with open(outbox.path(), "a") as outfile:
+            outfile.write('{"event": "sent", "ke')
+        outbox.enqueue("comment", "JIR-2", "Started")
+        self.assertEqual(["JIR-1", "JIR-2"], [u["issue_id"] for u in outbox.updates()])
+
+    @mock.patch("mgit.outbox.subprocess.Popen")
+    def test_start_worker(self, mock_popen):
+        outbox.start_worker()
+        (command,), kwargs = mock_popen.call_args
+        self.assertEqual(["-m", "mgit.outbox"], command[1:])
+        self.assertTrue(kwargs["start_new_session"])
@@ -0,0 +1,52 @@
+import threading
+import unittest
+
+from mgit import pipeline
+
+
+class PipelineTestCase(unittest.TestCase):
+    def test_run_in_dependency_order(self):
+        order = []
+        steps = pipeline.Pipeline()
+        steps.add("fetch", lambda: order.append("fetch"))
+        steps.add("commit", lambda: order.append("commit") or "abc123")
+        steps.add(
+            "rebase", lambda: order.append("rebase"), requires=["fetch", "commit"]
+        )
+        steps.add("push", lambda: order.append("push"), requires=["rebase"])
+
+        results = steps.run()
+
+        self.assertEqual("abc123", results["commit"])
+        self.assertEqual(["rebase", "push"], order[2:])
+        self.assertCountEqual(["fetch", "commit"], order[:2])
+
+    def test_independent_steps_overlap(self):
+        # Each step waits for the other one to start.
+        barrier = threading.Barrier(2, timeout=5)
+        steps = pipeline.Pipeline(jobs=2)
+        steps.add("fetch", barrier.wait)
+        steps.add("assignee", barrier.wait)
+
+        self.assertCountEqual([0, 1], steps.run().values())
+
+    def test_failure_skips_dependent_steps(self):
+        def fail():
+            raise RuntimeError("commit failed")
+
+        pushed = []
+        steps = pipeline.Pipeline()
+        steps.add("commit", fail)
+        steps.add("push", lambda: pushed.append(True), requires=["commit"])
+
+        with self.assertRaisesRegex(RuntimeError, "commit failed"):
+            steps.run()
+        self.assertEqual([], pushed)
+
+    def test_add_validates_steps(self):
+        steps = pipeline.Pipeline()
+        steps.add("commit", lambda: None)
+        with self.assertRaises(ValueError):
+            steps.add("commit", lambda: None)
+        with self.assertRaises(ValueError):
+            steps.add("push", lambda: None, requires=["rebase"])
@@ -0,0 +1,84 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+import mock
+
+from mgit import execute
+from mgit import profiler
+
+
+class ProfilerTestCase(unittest.TestCase):
+    def setUp(self):
+        profiler.enable()
+        self.addCleanup(profiler.enable, False)
+
+    def test_disabled(self):
+        profiler.enable(False)
+        with profiler.span(profiler.SUBPROCESS, "git status") as details:
+            details["exit_code"] = 0
+        self.assertEqual([], profiler.events())
+
+    def test_span(self):
+        with profiler.span(profiler.SUBPROCESS, "git status") as details:
+            details["exit_code"] = 0
+
+        events = profiler.events()
+        self.assertEqual(1, len(events))
+        self.assertEqual("git status", events[0]["name"])
+        self.assertEqual({"exit_code": 0}, events[0]["args"])
+        self.assertGreaterEqual(events[0]["duration"], 0)
+
+    def test_span_records_failures(self):
+        with self.assertRaises(ValueError):
+            with profiler.span(profiler.HTTP, "GET https://example.com"):
+                raise ValueError()
+        self.assertEqual(1, len(profiler.events()))
+
+    def test_profiled(self):
+        @profiler.profiled("git.push")
+        def push():
+            return 7
+
+        self.assertEqual(7, push())
+        self.assertEqual(profiler.STEP, profiler.events()[0]["category"])
+
+    @mock.patch("mgit.execute.subprocess.Popen")
+    @mock.patch("mgit.execute.subprocess.call", return_value=1)
+    def test_summary(self, mock_call, mock_popen):
+        mock_popen.return_value = mock.Mock(
+            stdout=io.BytesIO(b"master\n"),
+            stderr=io.BytesIO(b""),
+            **{"poll.return_value": 0, "wait.return_value": 0},
+        )
+        self.assertEqual(1, execute.call(["git", "pull"], abort=False))
+        execute.output(["git", "rev-parse", "HEAD"])
+        with profiler.span(profiler.STEP, "git.commit_all"):
+            pass
+
+        rows = [row[:2] + row[3:] for row in profiler.summary()]
+        self.assertEqual(
+            [
+                (profiler.SUBPROCESS, "git pull", 1, ""),
+                (profiler.SUBPROCESS, "git rev-parse HEAD", 0, 7),
+            ],
+            rows,
+        )
+        self.assertEqual(2, profiler.totals()[profiler.SUBPROCESS][0])
+        self.assertEqual(1, profiler.totals()[profiler.STEP][0])
+
+    def test_write_trace(self):
+        with profiler.span(profiler.HTTP, "GET https://example.com") as details:
+            details["status"] = 200
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "trace.json")
+            profiler.write_trace(path)
+            with open(path) as infile:
+                trace = json.load(infile)
+
+        event = trace["traceEvents"][0]
+        self.assertEqual("X", event["ph"])
+        self.assertEqual(profiler.HTTP, event["cat"])
+        self.assertEqual({"status": 200}, event["args"])
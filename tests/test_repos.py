@@ -0,0 +1,115 @@
+import os
+import subprocess
+import tempfile
+import unittest
+import mock
+
+from mgit import configs
+from mgit import execute
+from mgit import git
+from mgit import repos
+
+
+class ReposTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.root = os.path.realpath(self.directory.name)
+
+    def make_repo(self, name: str, branch: str) -> str:
+        path = os.path.join(self.root, name)
+        os.makedirs(path)
+        command = ["git", "init", "--quiet", "--initial-branch", branch, path]
+        subprocess.check_call(command)
+        return path
+
+    def test_inside(self):
+        self.assertEqual(".git", repos.path(".git"))
+        with repos.inside(self.root):
+            self.assertEqual(self.root, repos.directory())
+            self.assertEqual(os.path.join(self.root, ".git"), repos.path(".git"))
+        self.assertEqual("", repos.directory())
+
+    def test_find(self):
+        api = self.make_repo("api", "master")
+        web = self.make_repo("web", "master")
+        os.makedirs(os.path.join(self.root, "docs"))
+
+        self.assertEqual([api, web], repos.find(os.path.join(self.root, "*")))
+
+        manifest = os.path.join(self.root, "repos.txt")
+        with open(manifest, "w") as outfile:
+            outfile.write("# Services\nweb\n\ndocs\n*\n")
+        self.assertEqual([web, api], repos.find(manifest))
+
+        with self.assertRaises(repos.RepoError):
+            repos.find(os.path.join(self.root, "docs"))
+
+    def test_run(self):
+        paths = [self.make_repo("api", "master"), self.make_repo("web", "develop")]
+        git.invalidate()
+
+        def function(path):
+            if path.endswith("web"):
+                git_dir = execute.output(["git", "rev-parse", "--git-dir"])
+                return git.current_branch(), git_dir
+            raise repos.RepoError("failed")
+
+        results = repos.run(paths, function, jobs=2)
+        self.assertEqual(paths, list(results))
+        error, seconds = results[paths[0]]
+        self.assertIsInstance(error, repos.RepoError)
+        self.assertGreaterEqual(seconds, 0)
+
+        # Test that Git ran in the repo and its state is kept apart
+        self.assertEqual(("develop", ".git\n"), results[paths[1]][0])
+        self.assertNotEqual("develop", git.current_branch())
+
+    def test_locate(self):
+        path = self.make_repo("api", "master")
+        nested = os.path.join(path, "src", "app")
+        os.makedirs(nested)
+        git_dir = os.path.join(path, ".git")
+
+        with repos.inside(nested):
+            self.assertEqual(repos.Location(path, git_dir, git_dir), repos.locate())
+            self.assertEqual(path, repos.root())
+            self.assertEqual(os.path.join(path, "mgit.json"), configs.project_path())
+            self.assertTrue(git.initialized())
+
+            # Test that the result is cached per directory
+            with mock.patch("mgit.repos._locate") as mock_locate:
+                repos.locate()
+            mock_locate.assert_not_called()
+
+            env = {"GIT_CEILING_DIRECTORIES": os.path.join(path, "src")}
+            with mock.patch.dict(os.environ, env):
+                self.assertIsNone(repos.locate())
+
+            with mock.patch.dict(os.environ, {"GIT_DIR": git_dir}):
+                location = repos.locate()
+            self.assertEqual((nested, git_dir), location[:2])
+
+        with repos.inside(self.root):
+            self.assertIsNone(repos.locate())
+            self.assertFalse(git.initialized())
+
+    def test_locate_worktree(self):
+        path = self.make_repo("api", "master")
+        env = dict(os.environ, GIT_AUTHOR_NAME="a", GIT_AUTHOR_EMAIL="a@example.com")
+        env.update(GIT_COMMITTER_NAME="a", GIT_COMMITTER_EMAIL="a@example.com")
+        commit = ["git", "-C", path, "commit", "--quiet", "--allow-empty", "-m", "a"]
+        subprocess.check_call(commit, env=env)
+        worktree = os.path.join(self.root, "api-jir-1")
+        command = ["git", "-C", path, "worktree", "add", "--quiet", "-b", "jir-1"]
+        subprocess.check_call(command + [worktree])
+
+        with repos.inside(worktree):
+            location = repos.locate()
+            self.assertEqual(worktree, location.top_level)
+            self.assertEqual(os.path.join(path, ".git"), location.common_dir)
+            self.assertNotEqual(location.common_dir, location.git_dir)
+
+            git.invalidate()
+            self.assertEqual("jir-1", git.current_branch())
+            self.assertTrue(git.branch_exists("master"))
@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+import unittest
+
+# Cumulative import time budget for `mgit.cli` in microseconds.
+IMPORT_BUDGET = int(os.getenv("MGIT_IMPORT_BUDGET", 100_000))
+HEAVY_MODULES = ["requests", "setuptools_scm", "webbrowser", "mgit._version"]
+# Modules shell completion can't afford on every TAB.
+COMPLETION_HEAVY_MODULES = HEAVY_MODULES + ["click", "inflection", "mgit.issues"]
+
+
+def import_times(module: str) -> dict:
+    """ Get the cumulative import time in microseconds of each module. """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        stderr=subprocess.PIPE,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.decode("utf-8").splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+class StartupTestCase(unittest.TestCase):
+    def test_heavy_modules_are_not_imported(self):
+        times = import_times("mgit.cli")
+        for module in HEAVY_MODULES:
+            self.assertNotIn(module, times, msg=f"{module} is imported at startup")
+
+    def test_completion_imports(self):
+        times = import_times("mgit.complete")
+        for module in COMPLETION_HEAVY_MODULES:
+            self.assertNotIn(module, times, msg=f"{module} is imported to complete")
+
+    def test_hook_imports(self):
+        times = import_times("mgit.hook")
+        for module in COMPLETION_HEAVY_MODULES + ["mgit.configs", "mgit.repos"]:
+            self.assertNotIn(module, times, msg=f"{module} is imported by the hook")
+
+    def test_import_time_budget(self):
+        # Use the best of a few runs to avoid noise from a cold disk cache.
+        cumulative = min(import_times("mgit.cli")["mgit.cli"] for _ in range(3))
+        self.assertLess(
+            cumulative,
+            IMPORT_BUDGET,
+            msg=f"Importing mgit.cli took {cumulative}us (budget {IMPORT_BUDGET}us)",
+        )
+
+
+# Run the tests
+if __name__ == "__main__":
+    unittest.main()
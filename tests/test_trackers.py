@@ -0,0 +1,257 @@
+import json
+import os
+import tempfile
+import unittest
+import mock
+
+from mgit import configs
+from mgit import issues
+from mgit import trackers
+
+
+def response(data, links=None):
+    return mock.Mock(
+        status_code=200, headers={}, links=links or {}, **{"json.return_value": data}
+    )
+
+
+class TrackersTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = issues.IssueTrackerClient(max_retries=0)
+        patcher = mock.patch.dict(os.environ, {"MGIT_GITHUB_API_TOKEN": "secret"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tracker(self, issue_tracker_api, **values):
+        config = configs.Settings(issue_tracker_api=issue_tracker_api, **values)
+        return trackers.for_config(config, self.client)
+
+    def test_for_config(self):
+        for url, cls in [
+            ("https://api.github.com/repos/o/r/issues", trackers.GitHubTracker),
+            ("https://gitlab.com/api/v4/projects/42/issues", trackers.GitLabTracker),
+            ("https://x.atlassian.net/rest/api/2/issue", trackers.JiraTracker),
+            ("file:///tmp/issues.json", trackers.FileTracker),
+            ("https://example.com/issues", trackers.Tracker),
+        ]:
+            self.assertIs(cls, type(self.tracker(url)))
+
+        tracker = self.tracker("https://example.com/issues", issue_tracker_type="jira")
+        self.assertIsInstance(tracker, trackers.JiraTracker)
+
+    @mock.patch("requests.Session.post")
+    def test_github_get_many(self, mock_post):
+        mock_post.return_value = response(
+            {"data": {"repository": {"i7": {"title": "Update readme"}, "i9": None}}}
+        )
+        tracker = self.tracker("https://api.github.com/repos/o/r/issues")
+
+        self.assertEqual({"7": "Update readme"}, tracker.get_many(["9", "7", "JIR-1"]))
+        (url,), kwargs = mock_post.call_args
+        self.assertEqual("https://api.github.com/graphql", url)
+        self.assertIn("i7: issue(number: 7) { title }", kwargs["json"]["query"])
+        self.assertEqual({"owner": "o", "name": "r"}, kwargs["json"]["variables"])
+        self.assertEqual("bearer secret", kwargs["headers"]["Authorization"])
+
+        # Test that enterprise servers use /api/graphql
+        tracker = self.tracker("https://ghe.example.com/api/v3/repos/o/r/issues")
+        tracker.get_many(["7"])
+        url = mock_post.call_args[0][0]
+        self.assertEqual("https://ghe.example.com/api/graphql", url)
+
+    @mock.patch("requests.Session.get")
+    def test_jira(self, mock_get):
+        mock_get.side_effect = [
+            response({"total": 3, "issues": [{"key": "JIR-1", "fields": {}}]}),
+            response(
+                {
+                    "total": 3,
+                    "issues": [
+                        {"key": "JIR-2", "fields": {"summary": "Add login"}},
+                        {"key": "JIR-3", "fields": {"summary": "Fix logout"}},
+                    ],
+                }
+            ),
+            response({"fields": {"summary": "Update readme"}}),
+        ]
+        tracker = self.tracker("https://x.atlassian.net/rest/api/2/issue")
+
+        summaries = tracker.get_many(["jir-1", "JIR-2", "JIR-3"])
+        self.assertEqual(
+            {"JIR-1": "", "JIR-2": "Add login", "JIR-3": "Fix logout"}, summaries
+        )
+        (url,), kwargs = mock_get.call_args_list[0]
+        params = kwargs["params"]
+        self.assertEqual("https://x.atlassian.net/rest/api/2/search", url)
+        self.assertEqual('key in ("JIR-1", "JIR-2", "JIR-3")', params["jql"])
+        self.assertEqual(1, mock_get.call_args_list[1][1]["params"]["startAt"])
+
+        self.assertEqual("Update readme", tracker.get("JIR-1"))
+        self.assertEqual({"fields": "summary"}, mock_get.call_args[1]["params"])
+
+    @mock.patch("requests.Session.get")
+    def test_gitlab(self, mock_get):
+        next_page = {"next": {"url": "https://gitlab.com/next"}}
+        mock_get.side_effect = [
+            response([{"iid": 3, "title": "Add login"}], next_page),
+            response([{"iid": 1, "title": "Update readme"}]),
+        ]
+        with mock.patch.dict(os.environ, {"MGIT_GITLAB_API_TOKEN": "gl"}):
+            tracker = self.tracker("https://gitlab.com/api/v4/projects/42/issues")
+            summaries = tracker.get_many(["1", "3"])
+
+        self.assertEqual({"1": "Update readme", "3": "Add login"}, summaries)
+        kwargs = mock_get.call_args_list[0][1]
+        self.assertEqual(["1", "3"], kwargs["params"]["iids[]"])
+        self.assertEqual("gl", kwargs["headers"]["PRIVATE-TOKEN"])
+        self.assertEqual("https://gitlab.com/next", mock_get.call_args[0][0])
+
+    @mock.patch("requests.Session.delete")
+    @mock.patch("requests.Session.get")
+    @mock.patch("requests.Session.post")
+    @mock.patch("requests.Session.patch")
+    def test_github_updates(self, mock_patch, mock_post, mock_get, mock_delete):
+        mock_post.return_value = mock_patch.return_value = response({})
+        mock_get.return_value = response([{"body": "Looks good"}])
+        mock_delete.return_value = mock.Mock(status_code=404)
+        tracker = self.tracker(
+            "https://api.github.com/repos/o/r/issues",
+            commit_issue_state="In Progress",
+            pr_issue_state="In Review",
+        )
+
+        tracker.comment("7", "Pull request: https://github.com/o/r/pull/8", key="k1")
+        (url,), kwargs = mock_post.call_args
+        self.assertEqual("https://api.github.com/repos/o/r/issues/7/comments", url)
+        body = "Pull request: https://github.com/o/r/pull/8\n\n<!-- mgit-update: k1 -->"
+        self.assertEqual({"body": body}, kwargs["json"])
+
+        # Test that a comment posted by an earlier attempt isn't posted again
+        mock_get.return_value = response([{"body": body}])
+        tracker.comment("7", "Pull request: https://github.com/o/r/pull/8", key="k1")
+        self.assertEqual(1, mock_post.call_count)
+
+        # Test that GitHub issues get a label, or are closed
+        tracker.transition("7", "In Review")
+        (url,), kwargs = mock_post.call_args
+        self.assertEqual("https://api.github.com/repos/o/r/issues/7/labels", url)
+        self.assertEqual({"labels": ["In Review"]}, kwargs["json"])
+        url = mock_delete.call_args[0][0]
+        self.assertEqual(
+            "https://api.github.com/repos/o/r/issues/7/labels/In%20Progress", url
+        )
+        tracker.transition("7", "Closed")
+        self.assertEqual({"state": "closed"}, mock_patch.call_args[1]["json"])
+
+    @mock.patch("requests.Session.put")
+    def test_gitlab_transition(self, mock_put):
+        mock_put.return_value = response({})
+        tracker = self.tracker(
+            "https://gitlab.com/api/v4/projects/42/issues",
+            commit_issue_state="In Progress",
+            pr_issue_state="In Review",
+        )
+
+        tracker.transition("7", "In Review")
+        (url,), kwargs = mock_put.call_args
+        self.assertEqual("https://gitlab.com/api/v4/projects/42/issues/7", url)
+        expected = {"add_labels": "In Review", "remove_labels": "In Progress"}
+        self.assertEqual(expected, kwargs["json"])
+        tracker.transition("7", "closed")
+        self.assertEqual({"state_event": "close"}, mock_put.call_args[1]["json"])
+
+    @mock.patch("requests.Session.post")
+    @mock.patch("requests.Session.get")
+    def test_jira_comment(self, mock_get, mock_post):
+        mock_get.return_value = response({"total": 0, "comments": []})
+        mock_post.return_value = response({})
+        tracker = self.tracker("https://x.atlassian.net/rest/api/2/issue")
+
+        tracker.comment("JIR-1", "Started", key="k1")
+        (url,), kwargs = mock_post.call_args
+        self.assertEqual("https://x.atlassian.net/rest/api/2/issue/JIR-1/comment", url)
+        properties = [{"key": "mgit", "value": {"update": "k1"}}]
+        self.assertEqual({"body": "Started", "properties": properties}, kwargs["json"])
+
+        # Test that a comment posted by an earlier attempt isn't posted again
+        comments = [{"body": "Started", "properties": properties}]
+        mock_get.return_value = response({"total": 1, "comments": comments})
+        tracker.comment("JIR-1", "Started", key="k1")
+        self.assertEqual(1, mock_post.call_count)
+
+    @mock.patch("requests.Session.post")
+    @mock.patch("requests.Session.get")
+    def test_jira_transition(self, mock_get, mock_post):
+        transitions = {
+            "transitions": [
+                {"id": "11", "name": "Start", "to": {"name": "In Progress"}},
+                {"id": "21", "name": "Review", "to": {"name": "In Review"}},
+            ]
+        }
+        mock_get.side_effect = [
+            response({"fields": {"status": {"name": "To Do"}}}),
+            response(transitions),
+            response({"fields": {"status": {"name": "In Review"}}}),
+            response({"fields": {"status": {"name": "To Do"}}}),
+            response(transitions),
+        ]
+        mock_post.return_value = response({})
+        tracker = self.tracker("https://x.atlassian.net/rest/api/2/issue")
+
+        tracker.transition("JIR-1", "in review", key="k1")
+        (url,), kwargs = mock_post.call_args
+        self.assertEqual(
+            "https://x.atlassian.net/rest/api/2/issue/JIR-1/transitions", url
+        )
+        self.assertEqual({"transition": {"id": "21"}}, kwargs["json"])
+
+        # Test that nothing is sent when the issue is already in the state
+        tracker.transition("JIR-1", "In Review")
+        self.assertEqual(1, mock_post.call_count)
+
+        with self.assertRaises(trackers.TransitionNotFound):
+            tracker.transition("JIR-1", "Done")
+
+        # Test that the generic tracker can't update issues
+        self.assertFalse(hasattr(self.tracker("https://example.com/issues"), "comment"))
+
+    def test_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "issues.json")
+            with open(path, "w") as outfile:
+                data = {"JIR-1": "Update readme", "JIR-2": {"title": "Add login"}}
+                json.dump(data, outfile)
+            tracker = self.tracker(f"file://{path}")
+
+            self.assertEqual("Update readme", tracker.get("jir-1"))
+            self.assertEqual({"JIR-2": "Add login"}, tracker.get_many(["JIR-2", "X-1"]))
+            self.assertEqual({"JIR-2": "Add login"}, tracker.search("LOGIN"))
+            with self.assertRaises(trackers.IssueNotFound):
+                tracker.get("JIR-3")
+
+            config = configs.Settings(issue_tracker_api=f"file://{path}")
+            issue = issues.from_tracker("JIR-2", config, tracker_client=self.client)
+            self.assertEqual("JIR-2: Add Login", str(issue))
+
+            # Test that updates are written to the file
+            tracker.comment("jir-1", "Started", key="k1")
+            tracker.comment("JIR-1", "Started", key="k1")
+            tracker.transition("JIR-1", "In Progress")
+            with open(path) as infile:
+                issue = json.load(infile)["JIR-1"]
+            self.assertEqual(["Started"], issue["comments"])
+            self.assertEqual("In Progress", issue["state"])
+            self.assertEqual("Update readme", tracker.get("JIR-1"))
+            with self.assertRaises(trackers.IssueNotFound):
+                tracker.comment("JIR-3", "Started")
+
+            # Test that unreadable files are reported like missing issues
+            with open(path, "w") as outfile:
+                outfile.write("{")
+            with self.assertRaises(trackers.IssueNotFound):
+                tracker.get_many(["JIR-1"])
+            missing = self.tracker(f"file://{directory}/missing.json")
+            with self.assertRaises(trackers.IssueNotFound):
+                missing.get("JIR-1")
+            results = issues.from_tracker_many(["JIR-1", "JIR-2"], config)
+            self.assertIsInstance(results["JIR-1"], trackers.IssueNotFound)